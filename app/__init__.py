@@ -58,6 +58,34 @@ def create_app(test_config=None):
     from app.utils.database import configure_db
     db = configure_db(app)
     
+    # Configure the in-memory reference-table catalog
+    from app.utils.reference_catalog import configure_reference_catalog
+    configure_reference_catalog(app)
+    
+    # Configure the in-process model registry
+    from app.utils.model_registry import configure_model_registry
+    configure_model_registry(app)
+    
+    # Configure the prediction result cache
+    from app.utils.prediction_cache import configure_prediction_cache
+    configure_prediction_cache(app)
+    
+    # Configure the optional multi-process inference pool
+    from app.utils.inference_pool import configure_inference_pool
+    configure_inference_pool(app)
+    
+    # Configure micro-batching of concurrent single predictions
+    from app.utils.micro_batcher import configure_micro_batcher
+    configure_micro_batcher(app)
+    
+    # Configure buffered persistence of prediction history
+    from app.utils.prediction_log import configure_prediction_log
+    configure_prediction_log(app)
+    
+    # Configure the crawler (asyncio pipeline by default)
+    from app.utils.crawler import configure_crawler
+    configure_crawler(app)
+    
     # Register blueprints
     from app.routes import main_bp
     app.register_blueprint(main_bp)
@@ -104,6 +132,10 @@ def create_app(test_config=None):
     
     # Run status check when app starts
     with app.app_context():
+        # Thêm các cột mới (nullable) vào bảng đã có, vd giá dự đoán của model native categorical
+        from app.models import CarPrediction
+        from app.utils.database import add_missing_columns
+        add_missing_columns(CarPrediction)
         check_crawler_status()
         app.logger.info("Application initialized")
     
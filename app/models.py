@@ -142,6 +142,8 @@ class CarPrediction(db.Model):
     predicted_price_lr = db.Column(db.Integer)
     predicted_price_rf = db.Column(db.Integer)
     predicted_price_xgb = db.Column(db.Integer)
+    # Model native categorical (NULL với dự đoán từ version chưa có model này)
+    predicted_price_cat = db.Column(db.Integer, nullable=True)
     
     prediction_time = db.Column(db.DateTime, default=datetime.utcnow)
     
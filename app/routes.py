@@ -347,8 +347,9 @@ MODEL_COLUMNS_PATH = os.path.join(MODEL_DIR, 'model_columns.pkl')
 @main_bp.route('/api/get-models/<int:brand_id>')
 def get_models(brand_id):
     """API để lấy các model xe dựa vào brand_id."""
+    from app.utils.reference_catalog import reference_catalog
     try:
-        models = Model.query.filter_by(brand_id=brand_id).all()
+        models = reference_catalog.get().models_for_brand(brand_id)
         return jsonify({
             'success': True,
             'models': [{'id': model.id, 'name': model.name} for model in models]
@@ -361,8 +362,9 @@ def get_models(brand_id):
 @main_bp.route('/api/get-car-types/<int:model_id>')
 def get_car_types(model_id):
     """API để lấy các car_type dựa vào model_id."""
+    from app.utils.reference_catalog import reference_catalog
     try:
-        car_types = CarType.query.filter_by(model_id=model_id).all()
+        car_types = reference_catalog.get().car_types_for_model(model_id)
         return jsonify({
             'success': True,
             'car_types': [{'id': car_type.id, 'name': car_type.category} for car_type in car_types]
@@ -371,20 +373,47 @@ def get_car_types(model_id):
         current_app.logger.error(f"Error getting car types for model {model_id}: {e}")
         return jsonify({'success': False, 'error': str(e)})
 
+# API trả toàn bộ cây brand -> model -> car_type và các bảng tham chiếu trong một lần gọi
+@main_bp.route('/api/catalog')
+def get_catalog():
+    """
+    API trả catalog tham chiếu cho dropdown ở trang dự đoán.
+
+    Có ETag mạnh theo nội dung catalog; request gửi If-None-Match trùng ETag
+    nhận 304 không có body.
+    """
+    from app.utils.reference_catalog import reference_catalog
+    try:
+        body, etag = reference_catalog.get().serialized()
+        if request.if_none_match.contains_weak(etag):
+            response = current_app.response_class(status=304)
+        else:
+            response = current_app.response_class(body, mimetype='application/json')
+        response.set_etag(etag)
+        # Trình duyệt được lưu nhưng phải hỏi lại server (conditional GET) mỗi lần dùng
+        response.headers['Cache-Control'] = 'no-cache'
+        return response
+    except Exception as e:
+        current_app.logger.error(f"Error building catalog: {e}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
 @main_bp.route('/predict', methods=['GET', 'POST'])
 def predict():
     """Trang dự đoán giá xe."""
-    # Lấy dữ liệu cho các dropdown
-    brands = Brand.query.order_by(Brand.name).all()
-    fuel_types = FuelType.query.all()
-    transmissions = Transmission.query.all()
-    years = Year.query.order_by(Year.year.desc()).all()
-    seats = Seat.query.order_by(Seat.seat).all()
-    origins = Origin.query.all()  # Thêm origins
-    
-    # Lấy các dự đoán gần đây
-    from app.models import CarPrediction
-    recent_predictions = CarPrediction.query.order_by(CarPrediction.prediction_time.desc()).limit(5).all()
+    from app.utils.reference_catalog import reference_catalog
+    
+    # Lấy dữ liệu cho các dropdown từ catalog trong bộ nhớ (chỉ query DB khi catalog được dựng lại)
+    catalog = reference_catalog.get()
+    brands = catalog.brands
+    fuel_types = catalog.fuel_types
+    transmissions = catalog.transmissions
+    years = catalog.years
+    seats = catalog.seats
+    origins = catalog.origins  # Thêm origins
+    
+    # Lấy các dự đoán gần đây từ ring buffer trong bộ nhớ
+    from app.utils.prediction_log import prediction_log
+    recent_predictions = prediction_log.recent(5)
     
     if request.method == 'POST':
         try:
@@ -399,15 +428,15 @@ def predict():
             car_type_id = request.form.get('car_type')
             seats_id = request.form.get('seats')
             
-            # Lấy thông tin chi tiết từ database
-            brand = Brand.query.get(brand_id)
-            model = Model.query.get(model_id)
-            year_obj = Year.query.get(year_id)
-            fuel_type = FuelType.query.get(fuel_type_id)
-            transmission = Transmission.query.get(transmission_id)
-            origin = Origin.query.get(origin_id)  # Lấy object Origin từ database
-            car_type = CarType.query.get(car_type_id)
-            seats_obj = Seat.query.get(seats_id)
+            # Lấy thông tin chi tiết từ catalog (tra dict, không query DB)
+            brand = catalog.brand(brand_id)
+            model = catalog.model(model_id)
+            year_obj = catalog.year(year_id)
+            fuel_type = catalog.fuel_type(fuel_type_id)
+            transmission = catalog.transmission(transmission_id)
+            origin = catalog.origin(origin_id)
+            car_type = catalog.car_type(car_type_id)
+            seats_obj = catalog.seat(seats_id)
             
             # Kiểm tra dữ liệu
             if not all([brand, model, year_obj, fuel_type, transmission, origin, car_type, seats_obj, mileage]):
@@ -447,9 +476,9 @@ def predict():
                                       origins=origins,  # Thêm origins
                                       recent_predictions=recent_predictions)
             
-            # Lưu kết quả dự đoán vào database
+            # Lưu kết quả dự đoán (ghi xuống database theo lô ở thread nền)
             try:
-                new_prediction = CarPrediction(
+                prediction_log.record(
                     brand=brand.name,
                     model=model.name,
                     year=year_obj.year,
@@ -461,13 +490,12 @@ def predict():
                     seats=seats_obj.seat,
                     predicted_price_lr=prediction_result['lr'],
                     predicted_price_rf=prediction_result['rf'],
-                    predicted_price_xgb=prediction_result['xgb']
+                    predicted_price_xgb=prediction_result['xgb'],
+                    predicted_price_cat=prediction_result.get('cat')
                 )
-                db.session.add(new_prediction)
-                db.session.commit()
                 
                 # Cập nhật lại danh sách dự đoán gần đây
-                recent_predictions = CarPrediction.query.order_by(CarPrediction.prediction_time.desc()).limit(5).all()
+                recent_predictions = prediction_log.recent(5)
             except Exception as e:
                 current_app.logger.error(f"Error saving prediction: {e}")
                 # Không cần roll back vì vẫn có thể hiển thị kết quả
@@ -519,70 +547,165 @@ def predict_price(input_data):
         input_data (dict): Thông tin xe cần dự đoán giá (brand, model, year, mileage, v.v.)
         
     Returns:
-        dict: Kết quả dự đoán từ các mô hình khác nhau {'lr': value, 'rf': value, 'xgb': value}
+        dict: Kết quả dự đoán từ các mô hình khác nhau {'lr': value, 'rf': value, 'xgb': value},
+              thêm 'cat' khi version đang dùng có model native categorical
     """
-    import pandas as pd
-    import numpy as np
-    import joblib
-    import os
     from flask import current_app
+    from app.utils.model_registry import model_registry
+    from app.utils.prediction_cache import prediction_cache
+    from app.utils.micro_batcher import micro_batcher
     
     try:
-        # Đường dẫn tới thư mục chứa các mô hình
-        model_folder = r"C:\Users\admin\Desktop\Data_Science\src\models"
-        
-        # Load model columns
-        model_columns = joblib.load(os.path.join(model_folder, 'model_columns.pkl'))
-        
-        # One-hot encode input
-        input_df = pd.DataFrame([input_data])
-        input_encoded = pd.get_dummies(input_df)
-        
-        # Tìm các cột bị thiếu
-        missing_cols = [col for col in model_columns if col not in input_encoded.columns]
-        
-        # Tạo DataFrame các cột thiếu với giá trị 0
-        missing_df = pd.DataFrame(0, index=[0], columns=missing_cols)
+        # Lấy bộ model đang dùng (chỉ load từ đĩa lần đầu hoặc khi file thay đổi)
+        models = model_registry.get()
         
-        # Gộp lại để đảm bảo có đủ các cột cần thiết
-        input_encoded = pd.concat([input_encoded, missing_df], axis=1)
+        # Tra cache theo thông số xe đã chuẩn hóa + phiên bản model
+        car = prediction_cache.normalize(input_data)
+        cache_key = prediction_cache.make_key(car)
+        cached = prediction_cache.get(cache_key, models.version)
+        if cached is not None:
+            return cached
         
-        # Đảm bảo đúng thứ tự cột
-        input_encoded = input_encoded[model_columns]
-        
-        # ------------------ Linear Regression -----------------
-        lr_model = joblib.load(os.path.join(model_folder, 'linear_regression_model.pkl'))
-        scaler_X = joblib.load(os.path.join(model_folder, 'scaler_X.pkl'))
-        scaler_y = joblib.load(os.path.join(model_folder, 'scaler_y.pkl'))
-        
-        # Scale các cột số
-        numeric_cols = ["year", "mileage", "seats"]
-        lr_input = input_encoded.copy()
-        lr_input[numeric_cols] = scaler_X.transform(lr_input[numeric_cols])
-        
-        # Dự đoán với Linear Regression
-        y_pred_scaled = lr_model.predict(lr_input)
-        lf_pred = scaler_y.inverse_transform(y_pred_scaled.reshape(-1, 1))
-        lr_result = int(round(lf_pred[0, 0]))
-        
-        # ------------------- Random Forest ------------------
-        rf_model = joblib.load(os.path.join(model_folder, 'random_forest_model.pkl'))
-        rf_pred = rf_model.predict(input_encoded)
-        rf_result = int(round(rf_pred[0]))
-        
-        # -------------------- XGBoost --------------------
-        xgb_model = joblib.load(os.path.join(model_folder, 'xgboost_model.pkl'))
-        xgb_pred = xgb_model.predict(input_encoded)
-        xgb_result = int(round(xgb_pred[0]))
+        # Tra lưới giá tính sẵn (nội suy theo số km, không gọi model)
+        preds = models.price_surface.lookup(car) if models.price_surface is not None else None
+        if preds is None:
+            # Xe nằm ngoài lưới: dự đoán chính xác với cả 3 model; khi bật micro-batching,
+            # các request đồng thời được gom lại thành một lần encode + predict vector hóa
+            preds = micro_batcher.predict(car, models)
+        elif models.cat_codes is not None and 'cat' not in preds:
+            # Surface tính từ trước khi có model native categorical: chỉ gọi riêng model này
+            from app.utils.predictor import predict_categorical
+            preds['cat'] = predict_categorical(models, models.encoder.transform_one(car).reshape(1, -1))[0]
+        lr_result = int(round(preds['lr']))
+        rf_result = int(round(preds['rf']))
+        xgb_result = int(round(preds['xgb']))
         
         current_app.logger.info(f"Price prediction results - LR: {lr_result}, RF: {rf_result}, XGB: {xgb_result}")
         
-        return {"lr": lr_result, "rf": rf_result, "xgb": xgb_result}
+        result = {"lr": lr_result, "rf": rf_result, "xgb": xgb_result}
+        if 'cat' in preds:
+            result['cat'] = int(round(preds['cat']))
+            current_app.logger.info(f"Native categorical prediction: {result['cat']}")
+        prediction_cache.put(cache_key, models.version, result)
+        return result
         
     except Exception as e:
         current_app.logger.error(f"Error in predict_price: {str(e)}")
         return None
     
+@main_bp.route('/api/prediction-cache-stats')
+def prediction_cache_stats():
+    """API xem thống kê cache dự đoán (hit/miss/eviction) để chọn kích thước cache."""
+    from app.utils.prediction_cache import prediction_cache
+    return jsonify({'success': True, 'cache': prediction_cache.stats()})
+
+@main_bp.route('/api/prediction-log-stats')
+def prediction_log_stats():
+    """API xem trạng thái hàng đợi ghi lịch sử dự đoán."""
+    from app.utils.prediction_log import prediction_log
+    return jsonify({'success': True, 'prediction_log': prediction_log.stats()})
+
+@main_bp.route('/api/micro-batch-stats')
+def micro_batch_stats():
+    """API xem thống kê micro-batching (số batch, kích thước batch trung bình)."""
+    from app.utils.micro_batcher import micro_batcher
+    return jsonify({'success': True, 'micro_batch': micro_batcher.stats()})
+
+@main_bp.route('/api/model-versions')
+def list_model_versions():
+    """API liệt kê các version model (metrics, hash dữ liệu) và version đang phục vụ."""
+    from app.utils.model_registry import model_registry
+    try:
+        store = model_registry.versions
+        snapshot = model_registry.get()
+        return jsonify({
+            'success': True,
+            'current': store.current(),
+            'serving': snapshot.release,
+            'versions': store.list_versions(),
+        })
+    except Exception as e:
+        current_app.logger.error(f"Error listing model versions: {e}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@main_bp.route('/api/model-versions/<version>/promote', methods=['POST'])
+def promote_model_version(version):
+    """API chuyển version đang phục vụ sang một version đã publish."""
+    from app.utils.model_registry import model_registry
+    try:
+        model_registry.versions.promote(version)
+    except (KeyError, ValueError) as e:
+        return jsonify({'success': False, 'error': str(e).strip("'")}), 404
+    snapshot = model_registry.reload()
+    current_app.logger.info(f"Promoted model version {version}")
+    return jsonify({'success': True, 'current': version, 'serving': snapshot.release})
+
+@main_bp.route('/api/model-versions/rollback', methods=['POST'])
+def rollback_model_version():
+    """API quay lại version trước (hoặc version chỉ định trong {"to": "v2"})."""
+    from app.utils.model_registry import model_registry
+    payload = request.get_json(silent=True) or {}
+    try:
+        version = model_registry.versions.rollback(payload.get('to'))
+    except (KeyError, ValueError) as e:
+        return jsonify({'success': False, 'error': str(e).strip("'")}), 404
+    snapshot = model_registry.reload()
+    current_app.logger.info(f"Rolled back to model version {version}")
+    return jsonify({'success': True, 'current': version, 'serving': snapshot.release})
+
+@main_bp.route('/api/predict-batch', methods=['POST'])
+def predict_batch_api():
+    """
+    API dự đoán giá cho nhiều xe cùng lúc.
+
+    Nhận một mảng JSON các xe (hoặc {"cars": [...]}) hoặc một file CSV upload
+    (field 'file') có các cột brand, model, year, mileage, fuel_type,
+    transmission, origin, car_type, seats. Trả về kết quả hoặc lỗi cho từng dòng.
+    """
+    from app.utils.model_registry import model_registry
+    from app.utils.predictor import predict_batch
+
+    try:
+        if 'file' in request.files:
+            upload = request.files['file']
+            df = pd.read_csv(upload, dtype=str, keep_default_na=False)
+            records = df.to_dict(orient='records')
+        else:
+            payload = request.get_json(silent=True)
+            if isinstance(payload, dict):
+                payload = payload.get('cars')
+            if not isinstance(payload, list):
+                return jsonify({
+                    'success': False,
+                    'error': 'Expected a JSON array of cars, {"cars": [...]} or a CSV file upload'
+                }), 400
+            records = payload
+    except Exception as e:
+        current_app.logger.error(f"Error reading batch prediction input: {e}")
+        return jsonify({'success': False, 'error': f'Invalid input: {str(e)}'}), 400
+
+    max_rows = current_app.config.get('PREDICT_BATCH_MAX_ROWS', 10000)
+    if len(records) > max_rows:
+        return jsonify({
+            'success': False,
+            'error': f'Batch too large: {len(records)} rows (max {max_rows})'
+        }), 413
+
+    try:
+        results = predict_batch(records, model_registry.get())
+    except Exception as e:
+        current_app.logger.error(f"Batch prediction error: {str(e)}")
+        current_app.logger.error(traceback.format_exc())
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+    error_count = sum(1 for r in results if not r['success'])
+    return jsonify({
+        'success': True,
+        'count': len(results),
+        'error_count': error_count,
+        'results': results
+    })
+
 @main_bp.route('/train-models', methods=['POST'])
 def train_models():
     """Đào tạo lại các mô hình dự đoán giá xe."""
@@ -592,10 +715,12 @@ def train_models():
     from datetime import datetime
     import glob
     import traceback
-    import importlib.util
     import threading
     from flask import current_app, flash, redirect, url_for
 
+    # mode=incremental: chỉ cập nhật version hiện tại bằng các dòng mới (warm start), không train lại từ đầu
+    mode = request.form.get('mode', 'full')
+
     current_dir = os.getcwd()
     project_dir = current_dir if 'app' in os.listdir(current_dir) else os.path.dirname(current_dir)
 
@@ -637,22 +762,43 @@ def train_models():
         def run_training():
             with app.app_context():
                 try:
-                    sys.path.insert(0, training_dir)
-                    sys.path.insert(0, os.path.dirname(training_dir))
-
-                    spec_lr = importlib.util.spec_from_file_location("linear_regression", os.path.join(training_dir, "linear_regression.py"))
-                    spec_rf = importlib.util.spec_from_file_location("random_forest", os.path.join(training_dir, "random_forest.py"))
-                    spec_xgb = importlib.util.spec_from_file_location("xgboost_train", os.path.join(training_dir, "xgboost_train.py"))
-
-                    lr = importlib.util.module_from_spec(spec_lr); spec_lr.loader.exec_module(lr)
-                    rf = importlib.util.module_from_spec(spec_rf); spec_rf.loader.exec_module(rf)
-                    xgb = importlib.util.module_from_spec(spec_xgb); spec_xgb.loader.exec_module(xgb)
-
-                    app.logger.info("Đào tạo Linear Regression..."); lr.linear_regression_training()
-                    app.logger.info("Đào tạo Random Forest..."); rf.random_forest_training()
-                    app.logger.info("Đào tạo XGBoost..."); xgb.xgboost_training()
-
-                    app.logger.info("✅ Hoàn tất đào tạo mô hình!")
+                    # Train song song LR / RF / XGBoost trong các process riêng, mỗi model một số core;
+                    # chỉ khi cả 3 thành công mới publish chung thành một version mới, nên các
+                    # request dự đoán không bao giờ đọc file đang ghi dở
+                    from app.utils.model_registry import model_registry
+                    from src.training.orchestrator import train_models as run_trainers, TrainingError
+                    from src.training.incremental import incremental_retrain
+                    try:
+                        if mode == 'incremental':
+                            version, report = incremental_retrain(
+                                data_path=cleaned_file,
+                                store=model_registry.versions,
+                                promote=app.config.get('MODEL_VERSIONS_AUTO_PROMOTE', True),
+                                keep=app.config.get('MODEL_VERSIONS_KEEP'),
+                                price_surface=app.config.get('PRICE_SURFACE_ENABLED', False),
+                                log=app.logger.info,
+                                data_file=os.path.basename(latest_processed_file),
+                            )
+                        else:
+                            version, report = run_trainers(
+                                data_path=cleaned_file,
+                                store=model_registry.versions,
+                                cores=app.config.get('TRAINING_CORE_BUDGETS'),
+                                max_parallel=app.config.get('TRAINING_MAX_PARALLEL'),
+                                options=app.config.get('TRAINING_OPTIONS'),
+                                promote=app.config.get('MODEL_VERSIONS_AUTO_PROMOTE', True),
+                                keep=app.config.get('MODEL_VERSIONS_KEEP'),
+                                price_surface=app.config.get('PRICE_SURFACE_ENABLED', False),
+                                log=app.logger.info,
+                                data_file=os.path.basename(latest_processed_file),
+                            )
+                    except TrainingError as e:
+                        app.logger.error(f"❌ Lỗi khi đào tạo mô hình, không publish version mới: {e}")
+                        return
+                    app.logger.info(f"✅ Hoàn tất đào tạo mô hình! Đã publish model version {version}")
+
+                    # Nạp ngay bộ model mới thay vì đợi lần kiểm tra kế tiếp
+                    model_registry.reload()
                 except Exception as e:
                     app.logger.error(f"❌ Lỗi khi đào tạo mô hình: {e}")
                     app.logger.error(traceback.format_exc())
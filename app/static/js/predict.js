@@ -21,6 +21,78 @@ document.addEventListener('DOMContentLoaded', function() {
         });
     }
     
+    // Catalog brand -> model -> car_type tải một lần cho cả trang.
+    // Server trả ETag; fetch với cache 'no-cache' gửi If-None-Match và nhận 304 khi catalog không đổi.
+    let modelsByBrand = null;
+    let carTypesByModel = null;
+    
+    const catalogReady = fetch('/api/catalog', { cache: 'no-cache' })
+        .then(response => {
+            if (!response.ok) {
+                throw new Error(`HTTP ${response.status}`);
+            }
+            return response.json();
+        })
+        .then(catalog => {
+            modelsByBrand = new Map();
+            carTypesByModel = new Map();
+            catalog.brands.forEach(([brandId, , models]) => {
+                modelsByBrand.set(String(brandId), models.map(([id, name]) => ({ id, name })));
+                models.forEach(([modelId, , carTypes]) => {
+                    carTypesByModel.set(String(modelId), carTypes.map(([id, name]) => ({ id, name })));
+                });
+            });
+        })
+        .catch(error => {
+            // Không tải được catalog: dùng lại các API theo từng lựa chọn
+            console.error('Catalog error:', error);
+        });
+    
+    // Lấy danh sách dòng xe của một hãng (từ catalog, hoặc gọi API nếu catalog không có)
+    function loadModels(brandId) {
+        return catalogReady.then(() => {
+            if (modelsByBrand) {
+                return modelsByBrand.get(String(brandId)) || [];
+            }
+            return fetch(`/api/get-models/${brandId}`)
+                .then(response => response.json())
+                .then(data => {
+                    if (!data.success) {
+                        throw new Error(data.error);
+                    }
+                    return data.models;
+                });
+        });
+    }
+    
+    // Lấy danh sách kiểu dáng của một dòng xe (từ catalog, hoặc gọi API nếu catalog không có)
+    function loadCarTypes(modelId) {
+        return catalogReady.then(() => {
+            if (carTypesByModel) {
+                return carTypesByModel.get(String(modelId)) || [];
+            }
+            return fetch(`/api/get-car-types/${modelId}`)
+                .then(response => response.json())
+                .then(data => {
+                    if (!data.success) {
+                        throw new Error(data.error);
+                    }
+                    return data.car_types;
+                });
+        });
+    }
+    
+    // Thêm các kiểu dáng mặc định khi không có dữ liệu
+    function addDefaultCarTypes() {
+        const defaultTypes = ['Sedan', 'SUV', 'Hatchback', 'Coupe', 'Pickup'];
+        defaultTypes.forEach((type, index) => {
+            const option = document.createElement('option');
+            option.value = `default_${index}`;
+            option.textContent = type;
+            carTypeSelect.appendChild(option);
+        });
+    }
+    
     // Xử lý sự kiện khi chọn hãng xe
     if (brandSelect) {
         brandSelect.addEventListener('change', function() {
@@ -33,34 +105,30 @@ document.addEventListener('DOMContentLoaded', function() {
                 // Enable model select
                 modelSelect.disabled = false;
                 
-                // Fetch models for the selected brand
-                fetch(`/api/get-models/${brandId}`)
-                    .then(response => response.json())
-                    .then(data => {
-                        if (data.success) {
-                            // Populate model select
-                            data.models.forEach(model => {
-                                const option = document.createElement('option');
-                                option.value = model.id;
-                                option.textContent = model.name;
-                                modelSelect.appendChild(option);
-                            });
-                            
-                            // If no models available
-                            if (data.models.length === 0) {
-                                const option = document.createElement('option');
-                                option.value = '';
-                                option.textContent = 'Không có dòng xe nào';
-                                modelSelect.appendChild(option);
-                            }
-                        } else {
-                            console.error('Error fetching models:', data.error);
-                            showAlert('Không thể lấy danh sách dòng xe. Vui lòng thử lại.', 'danger');
+                loadModels(brandId)
+                    .then(models => {
+                        // Bỏ qua kết quả cũ nếu người dùng đã đổi hãng
+                        if (brandSelect.value !== brandId) return;
+                        
+                        // Populate model select
+                        models.forEach(model => {
+                            const option = document.createElement('option');
+                            option.value = model.id;
+                            option.textContent = model.name;
+                            modelSelect.appendChild(option);
+                        });
+                        
+                        // If no models available
+                        if (models.length === 0) {
+                            const option = document.createElement('option');
+                            option.value = '';
+                            option.textContent = 'Không có dòng xe nào';
+                            modelSelect.appendChild(option);
                         }
                     })
                     .catch(error => {
-                        console.error('API error:', error);
-                        showAlert('Lỗi kết nối API. Vui lòng thử lại sau.', 'danger');
+                        console.error('Error fetching models:', error);
+                        showAlert('Không thể lấy danh sách dòng xe. Vui lòng thử lại.', 'danger');
                     });
             } else {
                 // Disable model select if no brand is selected
@@ -81,53 +149,29 @@ document.addEventListener('DOMContentLoaded', function() {
                 // Enable car type select
                 carTypeSelect.disabled = false;
                 
-                // Fetch car types for the selected model
-                fetch(`/api/get-car-types/${modelId}`)
-                    .then(response => response.json())
-                    .then(data => {
-                        if (data.success) {
-                            // Populate car type select
-                            data.car_types.forEach(type => {
-                                const option = document.createElement('option');
-                                option.value = type.id;
-                                option.textContent = type.name;
-                                carTypeSelect.appendChild(option);
-                            });
-                            
-                            // If no car types available, add some default options
-                            if (data.car_types.length === 0) {
-                                const defaultTypes = ['Sedan', 'SUV', 'Hatchback', 'Coupe', 'Pickup'];
-                                defaultTypes.forEach((type, index) => {
-                                    const option = document.createElement('option');
-                                    option.value = `default_${index}`;
-                                    option.textContent = type;
-                                    carTypeSelect.appendChild(option);
-                                });
-                            }
-                        } else {
-                            console.error('Error fetching car types:', data.error);
-                            
-                            // Add default car types
-                            const defaultTypes = ['Sedan', 'SUV', 'Hatchback', 'Coupe', 'Pickup'];
-                            defaultTypes.forEach((type, index) => {
-                                const option = document.createElement('option');
-                                option.value = `default_${index}`;
-                                option.textContent = type;
-                                carTypeSelect.appendChild(option);
-                            });
+                loadCarTypes(modelId)
+                    .then(carTypes => {
+                        // Bỏ qua kết quả cũ nếu người dùng đã đổi dòng xe
+                        if (modelSelect.value !== modelId) return;
+                        
+                        // Populate car type select
+                        carTypes.forEach(type => {
+                            const option = document.createElement('option');
+                            option.value = type.id;
+                            option.textContent = type.name;
+                            carTypeSelect.appendChild(option);
+                        });
+                        
+                        // If no car types available, add some default options
+                        if (carTypes.length === 0) {
+                            addDefaultCarTypes();
                         }
                     })
                     .catch(error => {
-                        console.error('API error:', error);
+                        console.error('Error fetching car types:', error);
                         
                         // Add default car types on error
-                        const defaultTypes = ['Sedan', 'SUV', 'Hatchback', 'Coupe', 'Pickup'];
-                        defaultTypes.forEach((type, index) => {
-                            const option = document.createElement('option');
-                            option.value = `default_${index}`;
-                            option.textContent = type;
-                            carTypeSelect.appendChild(option);
-                        });
+                        addDefaultCarTypes();
                     });
             } else {
                 // Disable car type select if no model is selected
@@ -0,0 +1,261 @@
+"""
+JSON-API-first crawl mode for chotot.com.
+
+Each listing page is read from the public ad-listing API
+(gateway.chotot.com/v1/public/ad-listing) instead of the HTML listing. Every
+ad is mapped straight into the CSV schema of ChototXeCrawler.init_csv through
+API_FIELDS. The HTML detail page is downloaded and parsed only for ads that
+still lack one of REQUIRED_FIELDS after mapping. Values from the detail page
+fill those gaps but never overwrite what the API gave. If the detail page
+cannot be fetched, the row is written with what the API had. Ads crawled
+within CRAWLER_SEEN_TTL_DAYS (app/utils/seen_index.py) never trigger a detail
+fetch.
+
+A listing response (20 ads) is ~120 KB, about 6 KB per car, against ~170 KB
+per detail page plus the share of an ~800 KB HTML listing page in HTML mode.
+The API mode also replaces one HTML parse per car with one json.loads per 20
+cars.
+
+Chạy kiểm tra với dữ liệu mẫu trong tests/fixtures (từ thư mục gốc project):
+    python -m app.utils.api_crawler
+"""
+import json
+import logging
+import re
+from datetime import datetime
+
+from app.utils.async_crawler import AsyncChototXeCrawler
+
+logger = logging.getLogger(__name__)
+
+# Cột CSV -> id tham số của quảng cáo trong API (trường "params", hoặc khóa cùng tên trong quảng cáo), kiểu giá trị.
+# Với kiểu str chỉ nhận nhãn chữ: khóa cấp trên cùng của quảng cáo thường là mã số (vd gearbox=1) nên bị bỏ qua.
+API_FIELDS = (
+    ("brand", "carbrand", str),
+    ("model", "carmodel", str),
+    ("year", "mfdate", int),
+    ("mileage", "mileage_v2", int),
+    ("fuel_type", "fuel", str),
+    ("transmission", "gearbox", str),
+    ("origin", "carorigin", str),
+    ("car_type", "cartype", str),
+    ("seats", "carseats", int),
+    ("condition", "condition_ad", str),
+)
+
+# Thiếu một trong các cột này (giá + các đặc trưng của model) thì tải thêm trang chi tiết
+REQUIRED_FIELDS = ("price", "brand", "model", "year", "mileage", "fuel_type",
+                   "transmission", "origin", "car_type", "seats")
+
+
+def _to_int(value):
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return int(value)
+    digits = re.sub(r'[^\d]', '', str(value or ''))
+    return int(digits) if digits else None
+
+
+def ad_to_car(ad, crawl_time=None):
+    """
+    Map one ad from the listing API into a CSV row (only the columns the ad can fill).
+
+    Args:
+        ad (dict): Một phần tử của "ads" trong phản hồi API
+        crawl_time (str): Thời điểm crawl, mặc định là bây giờ
+
+    Returns:
+        dict: Dòng theo schema CSV, hoặc None nếu quảng cáo không có list_id
+    """
+    if ad.get('list_id') is None:
+        return None
+
+    params = {p.get('id'): p.get('value') for p in ad.get('params') or [] if isinstance(p, dict)}
+    car = {
+        'id': str(ad['list_id']),
+        'title': ad.get('subject'),
+        'price': _to_int(ad.get('price')),
+        'location': ', '.join(part for part in (ad.get('ward_name'), ad.get('area_name'), ad.get('region_name'))
+                              if part) or None,
+        'post_time': f"Đăng {ad['date']}" if ad.get('date') else None,
+        'crawl_time': crawl_time or datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+    }
+    for field, param_id, kind in API_FIELDS:
+        value = params.get(param_id)
+        if value in (None, '') and isinstance(ad.get(param_id), str if kind is str else (int, float, str)):
+            value = ad.get(param_id)
+        if kind is int:
+            value = _to_int(value)
+        elif value is not None:
+            value = str(value).strip() or None
+        car[field] = value
+    return car
+
+
+def missing_fields(car):
+    """Return the REQUIRED_FIELDS the row does not have yet."""
+    return [field for field in REQUIRED_FIELDS if car.get(field) in (None, '')]
+
+
+class ApiChototXeCrawler(AsyncChototXeCrawler):
+    """Async crawler that reads listings from the JSON API and fetches HTML detail pages only for missing fields."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.api_only = 0
+        self.detail_needed = 0
+
+    def _progress_status(self):
+        total_pages = self.end_page - self.start_page + 1
+        return (f'running-api-pages-{self.pages_done}/{total_pages}'
+                f'-items-{self.urls_found}-details-{self.details_fetched}/{self.detail_needed}')
+
+    async def _listing_stage(self, url_queue, car_queue):
+        """Fetch API listing pages; complete ads go straight to the writer, the rest to the detail workers."""
+        seen = set()
+
+        async def crawl_listing(page_num):
+            api_url = self.listing_api_url(page_num)
+            logger.info(f"Crawling API page: {api_url}")
+            api_response = await self._fetch(api_url)
+            try:
+                ads = json.loads(api_response).get('ads', []) if api_response else []
+            except json.JSONDecodeError:
+                logger.error(f"Could not parse API response for page {page_num}")
+                ads = []
+
+            crawl_time = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+            cars = [car for car in (ad_to_car(ad, crawl_time) for ad in ads) if car is not None]
+            fresh, all_known = self.check_seen([car['id'] for car in cars])
+            for car in cars:
+                if car['id'] in seen:
+                    continue
+                seen.add(car['id'])
+                missing = missing_fields(car)
+                if missing and car['id'] in fresh:
+                    # Tin đã crawl gần đây: không tải lại trang chi tiết (tin đủ trường vẫn qua bộ lọc hash ở writer)
+                    self.skipped_known += 1
+                    continue
+                self.urls_found += 1
+                if missing:
+                    logger.info(f"Ad {car['id']} lacks {missing} in the API, fetching the detail page")
+                    self.detail_needed += 1
+                    await url_queue.put((f"{self.base_url}/{car['id']}.htm", car))
+                else:
+                    self.api_only += 1
+                    await car_queue.put(car)
+            logger.info(f"Found {len(ads)} cars on API page {page_num}")
+            self.pages_done += 1
+            return all_known
+
+        await self._run_listing_pages(crawl_listing, url_queue)
+
+    def crawl_pages(self):
+        total_cars = super().crawl_pages()
+        logger.info(f"API crawl: {self.api_only} cars from the API alone, "
+                    f"{self.detail_needed} needed the detail page")
+        return total_cars
+
+
+def _serve_fixtures(fixture_dir):
+    """Serve tests/fixtures like chotot: the listing API (first page only) and the recorded detail pages."""
+    import os
+    import threading
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    with open(os.path.join(fixture_dir, 'chotot_ad_listing.json'), encoding='utf-8') as f:
+        listing = f.read()
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            status, body, content_type = 404, '', 'text/plain'
+            if self.path.startswith('/v1/public/ad-listing'):
+                status, content_type = 200, 'application/json'
+                body = listing if '&o=0&' in self.path else '{"ads": []}'
+            else:
+                match = re.search(r'/(\d+)\.htm$', self.path)
+                path = match and os.path.join(fixture_dir, f'chotot_ad_detail_{match.group(1)}.html')
+                if path and os.path.exists(path):
+                    with open(path, encoding='utf-8') as f:
+                        status, body, content_type = 200, f.read(), 'text/html; charset=utf-8'
+            data = body.encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', content_type)
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+if __name__ == "__main__":
+    import contextlib
+    import csv
+    import io
+    import os
+    import tempfile
+    import time
+    from app.utils.crawler import ChototXeCrawler
+    from app.utils.http_pool import HttpPool
+
+    fixture_dir = os.path.abspath(os.path.join('tests', 'fixtures'))
+    logging.basicConfig(level=logging.WARNING)
+    with open(os.path.join(fixture_dir, 'chotot_ad_listing_expected.json'), encoding='utf-8') as f:
+        expected = {row['id']: row for row in json.load(f)}
+
+    server = _serve_fixtures(fixture_dir)
+    host = f"http://127.0.0.1:{server.server_address[1]}"
+    os.chdir(tempfile.mkdtemp())
+    crawler = ApiChototXeCrawler(1, 2, concurrency=4, http=HttpPool())
+    crawler.api_url = f"{host}/v1/public/ad-listing"
+    crawler.base_url = f"{host}/mua-ban-oto"
+    with contextlib.redirect_stdout(io.StringIO()):
+        crawler.crawl_pages()
+    server.shutdown()
+
+    # So sánh CSV với kết quả mong đợi (đọc lại như preprocessor: ô trống là thiếu)
+    with open(crawler.csv_path, encoding='utf-8-sig', newline='') as f:
+        rows = {row[0]: dict(zip(crawler.csv_writer.fieldnames, row)) for row in csv.reader(f)}
+    errors = []
+    for car_id, want in expected.items():
+        got = rows.get(car_id)
+        if got is None:
+            errors.append(f"{car_id}: missing from the CSV")
+            continue
+        for field, value in want.items():
+            if got[field] != ('' if value is None else str(value)):
+                errors.append(f"{car_id}.{field}: expected {value!r}, got {got[field]!r}")
+    if len(rows) != len(expected):
+        errors.append(f"expected {len(expected)} rows, got {len(rows)}")
+
+    print(f"{len(rows)} rows written: {crawler.api_only} from the API alone, "
+          f"{crawler.detail_needed} needed the detail page ({crawler.details_fetched} fetched)")
+    for error in errors:
+        print(f"  FAIL {error}")
+    print("Fixture check:", "FAILED" if errors else "OK")
+
+    # Chi phí parse mỗi xe: json.loads + ad_to_car so với parse HTML trang chi tiết mẫu
+    with open(os.path.join(fixture_dir, 'chotot_ad_listing.json'), encoding='utf-8') as f:
+        listing = f.read()
+    with open(os.path.join(fixture_dir, 'chotot_ad_detail_124902474.html'), encoding='utf-8') as f:
+        detail = f.read()
+    n_ads = len(json.loads(listing)['ads'])
+    repeats = 200
+    started = time.perf_counter()
+    for _ in range(repeats):
+        [ad_to_car(ad) for ad in json.loads(listing)['ads']]
+    api_ms = (time.perf_counter() - started) / (repeats * n_ads) * 1000
+    started = time.perf_counter()
+    for _ in range(repeats):
+        ChototXeCrawler.extract_car_details(crawler, detail, f"{crawler.base_url}/124902474.htm")
+    html_ms = (time.perf_counter() - started) / repeats * 1000
+    print(f"Per car: API {len(listing) / n_ads / 1000:.1f}K chars, {api_ms:.3f} ms parse | "
+          f"HTML detail fixture {len(detail) / 1000:.1f}K chars, {html_ms:.3f} ms parse "
+          f"(production detail pages are ~170 KB, so the HTML figures here are a lower bound)")
+    raise SystemExit(1 if errors else 0)
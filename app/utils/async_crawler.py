@@ -0,0 +1,316 @@
+"""
+Asyncio crawl mode for chotot.com.
+
+The listing -> detail -> parse -> write stages run as a pipeline connected by
+bounded asyncio queues, so listing pages, detail pages and parsing overlap
+instead of running strictly one after another. An asyncio.Semaphore caps the
+number of HTTP requests in flight (CRAWLER_CONCURRENCY). Throughput therefore
+grows with the concurrency limit instead of being paid per request in latency
+plus the politeness delay.
+
+The HTTP calls reuse ChototXeCrawler.get_page, which goes through the shared
+pooled session and its per-host AIMD controller (app/utils/http_pool.py).
+They run on a thread pool sized to the concurrency limit, because the project
+depends on `requests` rather than an asyncio HTTP client. A single
+writer stage owns the CSV file and the CrawlLog row. It reports progress
+every CRAWL_PROGRESS_EVERY records instead of committing once per car.
+
+Benchmark against the sequential crawler on a local server (từ thư mục gốc project):
+    python -m app.utils.async_crawler [n_pages] [items_per_page] [latency_ms]
+"""
+import asyncio
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from app.utils.crawler import ChototXeCrawler
+
+logger = logging.getLogger(__name__)
+
+# Ghi CrawlLog.records_count sau mỗi chừng này xe (và khi kết thúc)
+CRAWL_PROGRESS_EVERY = 10
+
+# Đánh dấu hết dữ liệu trong queue giữa các stage
+_DONE = object()
+
+
+class AsyncChototXeCrawler(ChototXeCrawler):
+    """ChototXeCrawler with concurrent, pipelined detail-page fetching."""
+
+    def __init__(self, start_page=1, end_page=1, log_id=None, app=None, concurrency=8, queue_size=64, http=None,
+                 parser='lxml', seen_index=None, stop_after_known_pages=1):
+        """
+        Args:
+            concurrency (int): Số request HTTP tối đa đang chạy cùng lúc
+            queue_size (int): Kích thước tối đa của mỗi queue giữa các stage
+        """
+        super().__init__(start_page, end_page, log_id, app, http, parser, seen_index, stop_after_known_pages)
+        self.concurrency = max(1, int(concurrency))
+        self.queue_size = max(1, int(queue_size))
+
+        self.pages_done = 0
+        self.urls_found = 0
+        self.details_fetched = 0
+        self.failed = 0
+        self.chars_received = 0
+
+    def _progress_status(self):
+        total_pages = self.end_page - self.start_page + 1
+        return (f'running-pages-{self.pages_done}/{total_pages}'
+                f'-items-{self.details_fetched}/{self.urls_found}')
+
+    async def _fetch(self, url):
+        """Fetch one URL on the pool, holding a semaphore slot for the whole request (delay and retries included)."""
+        async with self._semaphore:
+            text = await self._loop.run_in_executor(self._executor, self.get_page, url)
+        if text:
+            self.chars_received += len(text)
+        return text
+
+    async def _listing_stage(self, url_queue, car_queue):
+        """Fetch the listing pages and queue every detail URL not crawled recently (each URL once)."""
+        seen = set()
+
+        async def crawl_listing(page_num):
+            page_url = f"{self.base_url}?page={page_num}"
+            logger.info(f"Crawling page: {page_url}")
+            page_html = await self._fetch(page_url)
+            if not page_html:
+                logger.error(f"Could not get HTML from page {page_url}")
+                car_urls = []
+            else:
+                car_urls = self.extract_listing_urls(page_html)
+
+            # If no URLs found from HTML, try the API
+            if not car_urls:
+                logger.info("No URLs found in HTML, trying API...")
+                car_urls = self.listing_urls_from_api(await self._fetch(self.listing_api_url(page_num)))
+
+            logger.info(f"Found {len(car_urls)} cars on page {page_num}")
+            car_urls, all_known = self.skip_fresh_urls(car_urls)
+            for car_url in car_urls:
+                if car_url not in seen:
+                    seen.add(car_url)
+                    self.urls_found += 1
+                    await url_queue.put((car_url, None))
+            self.pages_done += 1
+            return all_known
+
+        await self._run_listing_pages(crawl_listing, url_queue)
+
+    async def _run_listing_pages(self, crawl_listing, url_queue):
+        """
+        Run crawl_listing page by page, then tell each detail worker to stop.
+
+        Listing pages are fetched in order so the range can stop at the first page made only of known
+        listings; the detail workers keep draining url_queue meanwhile.
+        """
+        try:
+            for page_num in range(self.start_page, self.end_page + 1):
+                all_known = await crawl_listing(page_num)
+                if self.should_stop_after(all_known) and page_num < self.end_page:
+                    logger.info(f"Page {page_num}: only known listings, stopping before page {page_num + 1}")
+                    break
+        finally:
+            for _ in range(self.concurrency):
+                await url_queue.put(_DONE)
+
+    async def _detail_stage(self, url_queue, html_queue):
+        """Worker: fetch detail pages from url_queue into html_queue."""
+        while True:
+            item = await url_queue.get()
+            if item is _DONE:
+                await html_queue.put(_DONE)
+                return
+            car_url, partial = item
+            car_html = await self._fetch(car_url)
+            self.details_fetched += 1
+            if car_html:
+                await html_queue.put((car_url, partial, car_html))
+            elif partial:
+                # Không tải được trang chi tiết: vẫn ghi phần đã có từ API
+                await html_queue.put((car_url, partial, None))
+            else:
+                self.failed += 1
+
+    async def _parse_stage(self, html_queue, car_queue):
+        """Parse detail pages (off the event loop) until every detail worker has finished."""
+        workers_left = self.concurrency
+        while workers_left:
+            item = await html_queue.get()
+            if item is _DONE:
+                workers_left -= 1
+                continue
+            car_url, partial, car_html = item
+            if car_html is None:
+                await car_queue.put(partial)
+                continue
+            try:
+                car_data = await self._loop.run_in_executor(self._executor, self.extract_car_details, car_html, car_url)
+            except Exception as e:
+                logger.error(f"Error processing car {car_url}: {e}")
+                self.failed += 1
+                continue
+            if car_data and partial:
+                # Trang chi tiết chỉ bổ sung các trường còn thiếu, giữ nguyên giá trị đã có
+                car_data = {**car_data, **{k: v for k, v in partial.items() if v not in (None, '')}}
+            if car_data:
+                await car_queue.put(car_data)
+        await car_queue.put(_DONE)
+
+    async def _write_stage(self, car_queue):
+        """Single writer: append rows to the CSV and report progress to CrawlLog."""
+        reported = 0
+        while True:
+            car_data = await car_queue.get()
+            if car_data is _DONE:
+                return
+            if self.write_car(car_data) and self.cars_count - reported >= CRAWL_PROGRESS_EVERY:
+                reported = self.cars_count
+                await self._loop.run_in_executor(
+                    self._executor,
+                    lambda: self.update_crawl_log(status=self._progress_status(), records_count=self.cars_count),
+                )
+                print(f"\rCars crawled: {self.cars_count} ({self._progress_status()})", end="", flush=True)
+
+    def write_car(self, car_data):
+        """Append one car to the CSV without touching CrawlLog (the writer stage reports in batches)."""
+        if not car_data or 'id' not in car_data:
+            logger.warning("Cannot save car: Invalid data")
+            return False
+        digest = self.seen_before_write(car_data)
+        if digest is None:
+            return False
+        try:
+            self.csv_writer.writerow(car_data)
+            self.csv_file.flush()
+            if digest:
+                self.seen_index.mark(car_data['id'], digest)
+            self.cars_count += 1
+            return True
+        except Exception as e:
+            logger.error(f"Error saving car to CSV: {e}")
+            return False
+
+    async def crawl_async(self):
+        """Run the listing -> detail -> parse -> write pipeline; returns the number of cars saved."""
+        self._loop = asyncio.get_running_loop()
+        self._semaphore = asyncio.Semaphore(self.concurrency)
+        url_queue = asyncio.Queue(self.queue_size)
+        html_queue = asyncio.Queue(self.queue_size)
+        car_queue = asyncio.Queue(self.queue_size)
+
+        # +1 luồng cho parse/ghi CrawlLog để không phải chờ slot của request HTTP
+        with ThreadPoolExecutor(max_workers=self.concurrency + 1, thread_name_prefix='crawler') as self._executor:
+            stages = [
+                self._listing_stage(url_queue, car_queue),
+                *(self._detail_stage(url_queue, html_queue) for _ in range(self.concurrency)),
+                self._parse_stage(html_queue, car_queue),
+                self._write_stage(car_queue),
+            ]
+            await asyncio.gather(*stages)
+        return self.cars_count
+
+    def crawl_pages(self):
+        """Crawl the page range with the asyncio pipeline, reporting to CrawlLog like the sequential crawler."""
+        logger.info(f"Starting async crawl from page {self.start_page} to {self.end_page} "
+                    f"(concurrency {self.concurrency})")
+        self.update_crawl_log(status='running')
+        started = time.perf_counter()
+        try:
+            total_cars = asyncio.run(self.crawl_async())
+            self.update_crawl_log(
+                status='completed',
+                records_count=self.cars_count,
+                end_time=datetime.now()
+            )
+            print(f"\nTotal cars crawled: {self.cars_count}")
+            logger.info(f"Crawl completed! Total cars: {total_cars} from {self.details_fetched} detail pages "
+                        f"({self.failed} failed, {self.chars_received / 1e6:.1f}M chars downloaded) "
+                        f"in {time.perf_counter() - started:.1f}s")
+            if self.seen_index is not None:
+                logger.info(f"Seen index: {self.skipped_known} recent listings skipped, "
+                            f"{self.unchanged} refreshed without changes")
+        except Exception as e:
+            logger.error(f"Crawl error: {str(e)}")
+            self.update_crawl_log(
+                status='failed',
+                records_count=self.cars_count,
+                error_message=str(e),
+                end_time=datetime.now()
+            )
+            raise
+        finally:
+            self.close()
+        return total_cars
+
+
+def _serve_fake_chotot(n_pages, items_per_page, latency_s):
+    """Start a local HTTP server with chotot-like listing and detail pages, each answered after latency_s."""
+    import threading
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            time.sleep(latency_s)
+            if '?page=' in self.path:
+                page = int(self.path.rsplit('=', 1)[1])
+                ids = range(page * 1000, page * 1000 + items_per_page) if page <= n_pages else []
+                host = 'http://%s:%d' % self.server.server_address
+                body = ''.join(f'<a href="{host}/mua-ban-oto-ha-noi-{i}.htm">xe {i}</a>' for i in ids)
+            else:
+                car_id = self.path.rsplit('-', 1)[1].split('.')[0]
+                body = (f'<h1>Toyota Vios {car_id}</h1><b class="p26z2wb">450.000.000 đ</b>'
+                        '<div class="p1ja3eq0"><span class="bwq0cbs" style="color:#8C8C8C">Hãng</span>'
+                        '<span class="bwq0cbs">Toyota</span></div>'
+                        '<div class="p1ja3eq0"><span class="bwq0cbs" style="color:#8C8C8C">Năm sản xuất</span>'
+                        '<span class="bwq0cbs">2019</span></div>')
+            data = f'<html><body>{body}</body></html>'.encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/html; charset=utf-8')
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+if __name__ == "__main__":
+    import contextlib
+    import io
+    import os
+    import sys
+    import tempfile
+    from app.utils.http_pool import HttpPool
+
+    n_pages = int(sys.argv[1]) if len(sys.argv) > 1 else 2
+    items_per_page = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    latency_ms = float(sys.argv[3]) if len(sys.argv) > 3 else 200
+    logging.basicConfig(level=logging.WARNING)
+
+    server = _serve_fake_chotot(n_pages, items_per_page, latency_ms / 1000.0)
+    base_url = f"http://127.0.0.1:{server.server_address[1]}/mua-ban-oto"
+
+    print(f"{n_pages} pages x {items_per_page} cars, {latency_ms:.0f} ms server latency")
+    print(f"  {'mode':<10} {'cars':>5} {'seconds':>8} {'cars/s':>7}")
+    os.chdir(tempfile.mkdtemp())
+    # Mỗi lần chạy một HttpPool mới để trạng thái AIMD không mang từ lần trước sang
+    runs = [('sync', lambda: ChototXeCrawler(1, n_pages, http=HttpPool()))]
+    runs += [(f'async x{c}', lambda c=c: AsyncChototXeCrawler(1, n_pages, concurrency=c,
+                                                                http=HttpPool(pool_size=c, max_window=c)))
+             for c in (1, 4, 8, 16)]
+    for name, make in runs:
+        crawler = make()
+        crawler.base_url = base_url
+        started = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            crawler.crawl_pages()
+        seconds = time.perf_counter() - started
+        print(f"  {name:<10} {crawler.cars_count:>5} {seconds:>8.2f} {crawler.cars_count / seconds:>7.1f}")
+    server.shutdown()
@@ -2,8 +2,6 @@
 Crawler utility for the Car Price Prediction application.
 This module handles crawling data from chotot.com.
 """
-import requests
-from bs4 import BeautifulSoup
 import csv
 import os
 import time
@@ -16,13 +14,29 @@ import sys
 from flask import current_app
 from app.utils.database import db
 from app.models import CrawlLog
+from app.utils.http_pool import http_pool, configure_http_pool
+from app.utils.html_parser import PARSER_BACKENDS, get_parser, parse_digits, parse_first_int
+from app.utils.seen_index import SeenListingIndex, UNCHANGED
 
 logger = logging.getLogger(__name__)
 
+CRAWLER_MODES = ('async', 'api', 'sync')
+
+# Index các tin đã crawl (xem seen_index.py), mặc định nằm cạnh raw.csv
+SEEN_INDEX_PATH = os.path.join('data', 'raw', 'seen_listings.db')
+
+USER_AGENTS = [
+    'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
+    'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/14.0 Safari/605.1.15',
+    'Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:89.0) Gecko/20100101 Firefox/89.0',
+    'Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/92.0.4515.107 Safari/537.36'
+]
+
 class ChototXeCrawler:
     """Class for crawling car data from chotot.com."""
     
-    def __init__(self, start_page=1, end_page=1, log_id=None, app=None):
+    def __init__(self, start_page=1, end_page=1, log_id=None, app=None, http=None, parser='lxml',
+                 seen_index=None, stop_after_known_pages=1):
             """Initialize the crawler with page range and log ID."""
             self.start_page = start_page
             self.end_page = end_page
@@ -48,6 +62,7 @@ class ChototXeCrawler:
             
             # Base URL and headers for requests
             self.base_url = "https://xe.chotot.com/mua-ban-oto"
+            self.api_url = "https://gateway.chotot.com/v1/public/ad-listing"
             self.headers = {
                 'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
                 'Accept-Language': 'vi-VN,vi;q=0.9,en-US;q=0.8,en;q=0.7',
@@ -55,6 +70,21 @@ class ChototXeCrawler:
                 'Referer': 'https://xe.chotot.com/'
             }
             
+            # Session dùng chung, tự điều chỉnh tốc độ theo phản hồi của từng host (xem http_pool.py)
+            self.http = http or http_pool
+            
+            # Bộ parse HTML: 'lxml' (nhanh) hoặc 'bs4' (BeautifulSoup như cũ), xem html_parser.py
+            self.parser = get_parser(parser)
+            
+            # Crawl tăng dần: bỏ qua tin đã crawl gần đây, dừng sớm khi gặp trang toàn tin đã biết
+            self.seen_index = seen_index
+            self.stop_after_known_pages = stop_after_known_pages
+            self.known_pages = 0
+            self.skipped_known = 0
+            self.unchanged = 0
+            if self.seen_index is not None:
+                self.seen_index.seed_from_csv(self.csv_path, self.csv_writer.fieldnames)
+            
             # Counter for cars found
             self.cars_count = 0
             
@@ -143,83 +173,34 @@ class ChototXeCrawler:
                     pass
 
     def get_page(self, url):
-        """Fetch a page with retry logic."""
-        max_retries = 3
-        retry_count = 0
-        
-        while retry_count < max_retries:
-            try:
-                # Add a small delay to avoid being blocked
-                time.sleep(random.uniform(0.5, 1.5))
-                
-                # Use a random User-Agent
-                user_agents = [
-                    'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
-                    'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/14.0 Safari/605.1.15',
-                    'Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:89.0) Gecko/20100101 Firefox/89.0',
-                    'Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/92.0.4515.107 Safari/537.36'
-                ]
-                
-                headers = {
-                    'User-Agent': random.choice(user_agents),
-                    'Accept-Language': 'vi-VN,vi;q=0.9,en-US;q=0.8,en;q=0.7',
-                    'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,image/apng,*/*;q=0.8',
-                    'Referer': 'https://xe.chotot.com/'
-                }
-                
-                response = requests.get(url, headers=headers, timeout=30)
-                response.raise_for_status()
-                
-                logger.info(f"Response received from {url}: {len(response.text)} bytes")
-                
-                # KHÔNG update heartbeat ở đây nữa vì sẽ bị overwrite
-                # self.update_crawl_log(records_count=self.cars_count)
-                
-                return response.text
-            except requests.exceptions.RequestException as e:
-                retry_count += 1
-                wait_time = retry_count * 2
-                logger.warning(f"Error fetching {url}: {e}. Retrying in {wait_time} seconds...")
-                time.sleep(wait_time)
-        
-        logger.error(f"Failed to fetch {url} after {max_retries} attempts")
-        return None
+        """Fetch a page through the shared pooled session (per-host adaptive rate control, retry with backoff)."""
+        headers = {
+            # Use a random User-Agent
+            'User-Agent': random.choice(USER_AGENTS),
+            'Accept-Language': 'vi-VN,vi;q=0.9,en-US;q=0.8,en;q=0.7',
+            'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,image/apng,*/*;q=0.8',
+            'Referer': 'https://xe.chotot.com/'
+        }
+        text = self.http.get(url, headers=headers)
+        if text is not None:
+            logger.info(f"Response received from {url}: {len(text)} bytes")
+        return text
 
     def parse_car_price(self, price_text):
         """Parse price text to integer."""
-        if not price_text:
-            return None
-        
-        # Remove non-digit characters
-        price_number = re.sub(r'[^\d]', '', price_text)
-        if price_number:
-            return int(price_number)
-        return None
+        return parse_digits(price_text)
     
     def parse_mileage(self, mileage_text):
         """Parse mileage text to integer."""
-        if not mileage_text:
-            return None
-            
-        # Remove non-digit characters
-        mileage_number = re.sub(r'[^\d]', '', mileage_text)
-        if mileage_number:
-            return int(mileage_number)
-        return None
+        return parse_digits(mileage_text)
     
     def parse_owners(self, owners_text):
         """Parse owners text to integer."""
-        if not owners_text:
-            return None
-        
-        match = re.search(r'(\d+)', owners_text)
-        if match:
-            return int(match.group(1))
-        return None
+        return parse_first_int(owners_text)
     
     def extract_car_id(self, url):
-        """Extract car ID from URL."""
-        match = re.search(r'/(\d+)\.htm', url)
+        """Extract car ID from URL (.../mua-ban-oto-ha-noi-125061589.htm or .../125061589.htm)."""
+        match = re.search(r'[/-](\d+)\.htm', url)
         if match:
             return match.group(1)
         return None
@@ -228,144 +209,91 @@ class ChototXeCrawler:
         """Extract car listing URLs from the page."""
         if not html_content:
             return []
-            
-        soup = BeautifulSoup(html_content, 'html.parser')
-        urls = []
-        
-        # Method 1: Find all a tags with href matching car detail pattern
-        links = soup.find_all('a', href=re.compile(r'/mua-ban-oto-.*-\d+\.htm'))
         
-        if not links:
-            # Method 2: Find div elements with AdItem class
-            car_divs = soup.find_all('div', class_=lambda c: c and 'AdItem_adItem' in c)
-            for div in car_divs:
-                link = div.find('a')
-                if link and link.get('href'):
-                    href = link.get('href')
-                    if '/mua-ban-oto' in href and '.htm' in href:
-                        urls.append(href)
-        
-        if not urls:
-            # Method 3: Find li elements with schema.org ListItem
-            items = soup.find_all('li', attrs={'itemtype': 'http://schema.org/ListItem'})
-            for item in items:
-                link = item.find('a')
-                if link and link.get('href'):
-                    href = link.get('href')
-                    if '/mua-ban-oto' in href and '.htm' in href:
-                        urls.append(href)
-        
-        # Add URLs from direct link finding
-        for link in links:
-            href = link.get('href')
-            if href:
-                urls.append(href)
-        
-        # Convert to full URLs
-        full_urls = []
-        for url in urls:
-            # Remove fragments
-            url = url.split('#')[0]
-            
-            # Ensure full URL
-            if url.startswith('//'):
-                url = 'https:' + url
-            elif url.startswith('/'):
-                url = 'https://xe.chotot.com' + url
-            elif not url.startswith('http'):
-                url = 'https://xe.chotot.com/' + url
-                
-            full_urls.append(url)
-        
-        # Remove duplicates
-        unique_urls = list(set(full_urls))
+        unique_urls = self.parser.listing_urls(html_content)
         logger.info(f"Found {len(unique_urls)} unique car URLs")
         
         return unique_urls
     
+    def listing_api_url(self, page_num):
+        """URL of the public ad-listing API for one listing page (20 ads per page)."""
+        return f"{self.api_url}?cg=2010&limit=20&o={20*(page_num-1)}&st=s,k&key_param_included=true"
+    
+    def listing_urls_from_api(self, api_response):
+        """Extract car detail URLs from an ad-listing API response."""
+        car_urls = []
+        if api_response:
+            try:
+                data = json.loads(api_response)
+                if 'ads' in data:
+                    for ad in data['ads']:
+                        if 'list_id' in ad:
+                            car_id = ad['list_id']
+                            car_urls.append(f"{self.base_url}/{car_id}.htm")
+                    logger.info(f"Found {len(car_urls)} cars from API")
+            except json.JSONDecodeError:
+                logger.error("Could not parse API response")
+        return car_urls
+    
+    def check_seen(self, listing_ids):
+        """
+        Look listing IDs up in the seen index.
+
+        Returns:
+            tuple: (IDs crawled within the TTL, True if every ID is already in the index)
+        """
+        if self.seen_index is None or not listing_ids:
+            return set(), False
+        known = self.seen_index.known(listing_ids)
+        return self.seen_index.fresh(known), all(listing_id in known for listing_id in listing_ids)
+    
+    def skip_fresh_urls(self, car_urls):
+        """Drop the detail URLs of listings crawled within the TTL; also return whether the page held only known listings."""
+        car_ids = [self.extract_car_id(url) for url in car_urls]
+        fresh, all_known = self.check_seen(car_ids)
+        if fresh:
+            car_urls = [url for url, car_id in zip(car_urls, car_ids) if car_id not in fresh]
+            self.skipped_known += len(car_ids) - len(car_urls)
+            logger.info(f"Skipping {len(car_ids) - len(car_urls)} listings crawled in the last "
+                        f"{self.seen_index.ttl.days} days")
+        return car_urls, all_known
+    
+    def should_stop_after(self, page_all_known):
+        """Count consecutive listing pages made only of known listings; True once the page range can stop."""
+        self.known_pages = self.known_pages + 1 if page_all_known else 0
+        return bool(self.stop_after_known_pages) and self.known_pages >= self.stop_after_known_pages
+    
+    def seen_before_write(self, car_data):
+        """
+        Compare a crawled car with the seen index before writing it.
+
+        Returns:
+            str: Content hash to record after the row is written, or None if the row must not be written
+                 (unchanged since the last crawl: only its last-crawled time is refreshed)
+        """
+        if self.seen_index is None:
+            return ''
+        status, digest = self.seen_index.classify(car_data)
+        if status == UNCHANGED:
+            self.seen_index.mark(car_data['id'], digest)
+            self.unchanged += 1
+            logger.info(f"Car ID {car_data['id']} unchanged since the last crawl, not saved again")
+            return None
+        return digest
+    
     def extract_car_details(self, html_content, url):
         """Extract car details from detail page."""
         if not html_content:
             return None
             
-        soup = BeautifulSoup(html_content, 'html.parser')
         car_data = {}
         
         # Extract ID
         car_id = self.extract_car_id(url)
         car_data['id'] = car_id
         
-        # Extract title
-        title_elem = soup.find('h1')
-        if title_elem:
-            car_data['title'] = title_elem.text.strip()
-        
-        # Extract price
-        price_elem = soup.find('b', class_='p26z2wb')
-        if price_elem:
-            car_data['price'] = self.parse_car_price(price_elem.text)
-        
-        # Try alternative price element if first method fails
-        if 'price' not in car_data or not car_data['price']:
-            price_elem = soup.find('span', class_='bfe6oav', style=lambda s: s and 'color: rgb(229, 25, 59)' in s)
-            if price_elem:
-                car_data['price'] = self.parse_car_price(price_elem.text)
-            
-            # Try one more price element
-            if 'price' not in car_data or not car_data['price']:
-                price_elem = soup.find('b', class_='p26z2wb')
-                if price_elem:
-                    car_data['price'] = self.parse_car_price(price_elem.text)
-        
-        # Extract location
-        location_elem = soup.find('span', class_='bwq0cbs flex-1')
-        if location_elem:
-            car_data['location'] = location_elem.text.strip()
-        
-        # Extract post time
-        post_time_elems = soup.find_all('span', class_='bwq0cbs')
-        for elem in post_time_elems:
-            if 'Đăng' in elem.text:
-                car_data['post_time'] = elem.text.strip()
-                break
-        
-        # Extract technical specs
-        info_items = soup.find_all('div', class_='p1ja3eq0')
-        for item in info_items:
-            label_elem = item.find("span", attrs={"class": "bwq0cbs"}, style=True)
-
-            if label_elem and "color:#8C8C8C" in label_elem.get("style", ""):
-                spans = item.find_all("span", class_="bwq0cbs")
-                value_elem = spans[1] if len(spans) > 1 else None
-                label = label_elem.text.strip()
-                value = value_elem.text.strip() if value_elem else None
-                
-                if 'Hãng' in label:
-                    car_data['brand'] = value
-                elif 'Dòng xe' in label:
-                    car_data['model'] = value
-                elif 'Năm sản xuất' in label:
-                    car_data['year'] = int(value) if value.isdigit() else None
-                elif 'Số Km đã đi' in label:
-                    car_data['mileage'] = self.parse_mileage(value)
-                elif 'Nhiên liệu' in label:
-                    car_data['fuel_type'] = value
-                elif 'Hộp số' in label:
-                    car_data['transmission'] = value
-                elif 'Số đời chủ' in label:
-                    car_data['owners'] = self.parse_owners(value)
-                elif 'Xuất xứ' in label:
-                    car_data['origin'] = value
-                elif 'Kiểu dáng' in label:
-                    car_data['car_type'] = value
-                elif 'Số chỗ' in label:
-                    car_data['seats'] = int(value) if value.isdigit() else None
-                elif 'Tình trạng' in label:
-                    car_data['condition'] = value
-                elif 'Trọng lượng' in label:
-                    car_data['weight'] = value
-                elif 'Trọng tải' in label:
-                    car_data['load_capacity'] = value
+        # Tiêu đề, giá, vị trí, thời gian đăng và các thông số (xem html_parser.DETAIL_FIELDS)
+        car_data.update(self.parser.car_details(html_content))
         
         # Add crawl timestamp
         car_data['crawl_time'] = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
@@ -381,11 +309,17 @@ class ChototXeCrawler:
         if not car_data or 'id' not in car_data:
             logger.warning("Cannot save car: Invalid data")
             return False
+        
+        digest = self.seen_before_write(car_data)
+        if digest is None:
+            return False
             
         try:
             # Write to CSV
             self.csv_writer.writerow(car_data)
             self.csv_file.flush()  # Ensure data is written immediately
+            if digest:
+                self.seen_index.mark(car_data['id'], digest)
             
             # Tăng counter TRƯỚC khi update log
             self.cars_count += 1
@@ -407,6 +341,7 @@ class ChototXeCrawler:
         
         # Update log to show current page
         self.update_crawl_log(status=f'running-page-{page_num}')
+        self.last_page_all_known = False
         
         # Get the page HTML
         page_html = self.get_page(page_url)
@@ -420,23 +355,10 @@ class ChototXeCrawler:
         # If no URLs found from HTML, try the API
         if not car_urls:
             logger.info("No URLs found in HTML, trying API...")
-            api_url = f"https://gateway.chotot.com/v1/public/ad-listing?cg=2010&limit=20&o={20*(page_num-1)}&st=s,k&key_param_included=true"
-            api_response = self.get_page(api_url)
-            
-            if api_response:
-                try:
-                    data = json.loads(api_response)
-                    if 'ads' in data:
-                        car_urls = []
-                        for ad in data['ads']:
-                            if 'list_id' in ad:
-                                car_id = ad['list_id']
-                                car_urls.append(f"https://xe.chotot.com/mua-ban-oto/{car_id}.htm")
-                        logger.info(f"Found {len(car_urls)} cars from API")
-                except json.JSONDecodeError:
-                    logger.error("Could not parse API response")
+            car_urls = self.listing_urls_from_api(self.get_page(self.listing_api_url(page_num)))
             
         logger.info(f"Found {len(car_urls)} cars on page {page_num}")
+        car_urls, self.last_page_all_known = self.skip_fresh_urls(car_urls)
         
         page_car_count = 0
         for idx, car_url in enumerate(car_urls):
@@ -499,8 +421,9 @@ class ChototXeCrawler:
                 # Print total crawled cars
                 print(f"\nTotal cars crawled: {self.cars_count}")
                 
-                # Small delay between pages
-                time.sleep(random.uniform(1, 2))
+                if self.should_stop_after(self.last_page_all_known) and page_num < self.end_page:
+                    logger.info(f"Page {page_num}: only known listings, stopping before page {page_num + 1}")
+                    break
             
             # Ensure we update the status to completed
             self.update_crawl_log(
@@ -510,6 +433,9 @@ class ChototXeCrawler:
             )
             
             logger.info(f"Crawl completed! Total cars: {total_cars}")
+            if self.seen_index is not None:
+                logger.info(f"Seen index: {self.skipped_known} recent listings skipped, "
+                            f"{self.unchanged} refreshed without changes")
             
         except Exception as e:
             logger.error(f"Crawl error: {str(e)}")
@@ -546,11 +472,47 @@ class ChototXeCrawler:
             logger.info("CSV file closed")
 
 
-def run_crawler(start_page, end_page, log_id=None, app=None):
-    """Run the crawler with the specified parameters."""
+def run_crawler(start_page, end_page, log_id=None, app=None, mode=None, concurrency=None):
+    """
+    Run the crawler with the specified parameters.
+
+    Args:
+        mode (str): 'async' (tải trang chi tiết song song, xem app/utils/async_crawler.py), 'api' (lấy dữ liệu
+                    từ JSON API, chỉ tải trang chi tiết khi thiếu trường, xem app/utils/api_crawler.py) hoặc
+                    'sync' (tuần tự như cũ); mặc định lấy CRAWLER_MODE trong config của app
+        concurrency (int): Số request tối đa đang chạy cùng lúc ở chế độ async
+
+    Các tin đã crawl được ghi vào index CRAWLER_SEEN_INDEX (xem app/utils/seen_index.py) để lần crawl sau
+    bỏ qua tin còn mới và dừng sớm khi gặp CRAWLER_STOP_AFTER_KNOWN_PAGES trang liên tiếp toàn tin đã biết.
+    """
+    config = app.config if app is not None else {}
+    mode = mode or config.get('CRAWLER_MODE', 'async')
+    if mode not in CRAWLER_MODES:
+        raise ValueError(f"Unknown crawler mode {mode!r}, expected one of {CRAWLER_MODES}")
+    seen_index = None
     try:
+        seen_index_path = config.get('CRAWLER_SEEN_INDEX', SEEN_INDEX_PATH)
+        if seen_index_path:
+            seen_index = SeenListingIndex(seen_index_path, config.get('CRAWLER_SEEN_TTL_DAYS', 30))
+        incremental = dict(seen_index=seen_index,
+                           stop_after_known_pages=config.get('CRAWLER_STOP_AFTER_KNOWN_PAGES', 1))
+        
         # Truyền app vào crawler
-        crawler = ChototXeCrawler(start_page, end_page, log_id, app)
+        if mode in ('async', 'api'):
+            if mode == 'api':
+                from app.utils.api_crawler import ApiChototXeCrawler as crawler_class
+            else:
+                from app.utils.async_crawler import AsyncChototXeCrawler as crawler_class
+            crawler = crawler_class(
+                start_page, end_page, log_id, app,
+                concurrency=concurrency or config.get('CRAWLER_CONCURRENCY', 8),
+                queue_size=config.get('CRAWLER_QUEUE_SIZE', 64),
+                parser=config.get('CRAWLER_PARSER', 'lxml'),
+                **incremental,
+            )
+        else:
+            crawler = ChototXeCrawler(start_page, end_page, log_id, app, parser=config.get('CRAWLER_PARSER', 'lxml'),
+                                      **incremental)
         crawler.crawl_pages()
         return True
     except Exception as e:
@@ -562,7 +524,7 @@ def run_crawler(start_page, end_page, log_id=None, app=None):
                     from app.utils.database import db
                     from app.models import CrawlLog
                     crawl_log = CrawlLog.query.get(log_id)
-                    if crawl_log and crawl_log.status == 'running':
+                    if crawl_log and crawl_log.status.startswith('running'):
                         crawl_log.status = 'failed'
                         crawl_log.error_message = str(e)
                         crawl_log.end_time = datetime.now()
@@ -570,6 +532,29 @@ def run_crawler(start_page, end_page, log_id=None, app=None):
         except:
             pass
         return False
+    finally:
+        if seen_index is not None:
+            seen_index.close()
+
+
+def configure_crawler(app):
+    """Set the crawler defaults for the Flask application."""
+    app.config.setdefault('CRAWLER_MODE', 'async')
+    app.config.setdefault('CRAWLER_CONCURRENCY', 8)
+    app.config.setdefault('CRAWLER_QUEUE_SIZE', 64)
+    app.config.setdefault('CRAWLER_PARSER', 'lxml')
+    # Crawl tăng dần: None để tắt index, 0 để không dừng sớm
+    app.config.setdefault('CRAWLER_SEEN_INDEX', SEEN_INDEX_PATH)
+    app.config.setdefault('CRAWLER_SEEN_TTL_DAYS', 30)
+    app.config.setdefault('CRAWLER_STOP_AFTER_KNOWN_PAGES', 1)
+    if app.config['CRAWLER_MODE'] not in CRAWLER_MODES:
+        raise ValueError(f"Unknown crawler mode {app.config['CRAWLER_MODE']!r}, expected one of {CRAWLER_MODES}")
+    if app.config['CRAWLER_PARSER'] not in PARSER_BACKENDS:
+        raise ValueError(f"Unknown parser backend {app.config['CRAWLER_PARSER']!r}, "
+                         f"expected one of {tuple(PARSER_BACKENDS)}")
+    
+    # Tốc độ tải trang: session dùng chung + AIMD theo host
+    configure_http_pool(app)
 
 def get_latest_raw_file():
     """Get the path to the latest raw data file."""
@@ -29,6 +29,37 @@ def configure_db(app):
     
     return db
 
+def add_missing_columns(*models):
+    """
+    Add nullable columns declared on the models but missing from existing tables.
+
+    Project không có thư mục migrations: db.create_all() không sửa bảng đã có, nên các cột
+    mới (vd car_predictions.predicted_price_cat) được thêm bằng ALTER TABLE ... ADD COLUMN.
+    Gọi trong app context; bảng chưa tồn tại được bỏ qua.
+
+    Returns:
+        list: Các cột đã thêm, dạng 'table.column'
+    """
+    from sqlalchemy import inspect, text
+
+    inspector = inspect(db.engine)
+    tables = set(inspector.get_table_names())
+    added = []
+    for model in models:
+        table = model.__table__
+        if table.name not in tables:
+            continue
+        existing = {column['name'] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in existing or not column.nullable:
+                continue
+            column_type = column.type.compile(dialect=db.engine.dialect)
+            with db.engine.begin() as conn:
+                conn.execute(text(f'ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}'))
+            added.append(f'{table.name}.{column.name}')
+            logger.info(f"Added column {table.name}.{column.name} ({column_type})")
+    return added
+
 def get_or_create(model, **kwargs):
     """Get an existing instance or create a new one if it doesn't exist."""
     instance = model.query.filter_by(**kwargs).first()
@@ -239,6 +270,9 @@ def import_data_to_db(file_path):
         # 8. Import unique origins - NEW ADDITION
         origin_count = import_origins_from_data(df)
         
+        # Bảng tham chiếu đã thay đổi: catalog trong bộ nhớ sẽ được dựng lại ở request sau
+        _invalidate_reference_catalog()
+        
         # Count records in each table
         brand_count = Brand.query.count()
         model_count = Model.query.count()
@@ -263,7 +297,15 @@ def import_data_to_db(file_path):
     except Exception as e:
         logger.error(f"Error importing data: {str(e)}")
         db.session.rollback()
+        # Một số bước có thể đã commit trước khi lỗi
+        _invalidate_reference_catalog()
         return False
+
+def _invalidate_reference_catalog():
+    """Bump the in-memory reference catalog version after the reference tables change."""
+    from app.utils.reference_catalog import reference_catalog
+    reference_catalog.invalidate()
+
 def import_origins_from_data(df):
     """Import unique origins from the processed data file."""
     from app.models import Origin
@@ -0,0 +1,387 @@
+"""
+HTML parser backends for the chotot crawler.
+
+ChototXeCrawler hands listing and detail pages to a parser backend chosen by
+CRAWLER_PARSER:
+
+- 'lxml' (default): builds the tree with lxml's C parser. A single XPath
+  query returns only the relevant nodes (h1, price, location/post-time spans
+  and spec rows) in document order, and one loop extracts them. Spec rows are
+  mapped through the DETAIL_FIELDS table (Vietnamese label -> CSV column,
+  converter).
+- 'bs4': the original BeautifulSoup(html.parser) implementation with repeated
+  find/find_all scans. It is kept as the reference implementation and as the
+  fallback when lxml is not installed.
+
+Both backends return the same values. Listing URLs come back in first-seen
+order; the old implementation returned them in set order.
+
+Benchmark + kiểm tra hai backend cho kết quả giống nhau (từ thư mục gốc project):
+    python -m app.utils.html_parser [fixture_dir] [--pad-kb 170]
+"""
+import logging
+import re
+
+from bs4 import BeautifulSoup
+
+logger = logging.getLogger(__name__)
+
+LISTING_HREF = re.compile(r'/mua-ban-oto-.*-\d+\.htm')
+
+
+def parse_digits(text):
+    """Integer made of every digit in the text (price, mileage), None if there is none."""
+    if not text:
+        return None
+    number = re.sub(r'[^\d]', '', text)
+    return int(number) if number else None
+
+
+def parse_first_int(text):
+    """First integer in the text (number of owners), None if there is none."""
+    if not text:
+        return None
+    match = re.search(r'(\d+)', text)
+    return int(match.group(1)) if match else None
+
+
+def parse_exact_int(text):
+    """Integer if the whole text is digits (year, seats), else None."""
+    return int(text) if text and text.isdigit() else None
+
+
+# Nhãn trên trang chi tiết -> cột CSV, hàm chuyển đổi (None: giữ nguyên chuỗi).
+# Nhãn được so theo kiểu "chứa trong", dòng đầu tiên khớp được dùng nên thứ tự có ý nghĩa.
+DETAIL_FIELDS = (
+    ("Hãng", "brand", None),
+    ("Dòng xe", "model", None),
+    ("Năm sản xuất", "year", parse_exact_int),
+    ("Số Km đã đi", "mileage", parse_digits),
+    ("Nhiên liệu", "fuel_type", None),
+    ("Hộp số", "transmission", None),
+    ("Số đời chủ", "owners", parse_first_int),
+    ("Xuất xứ", "origin", None),
+    ("Kiểu dáng", "car_type", None),
+    ("Số chỗ", "seats", parse_exact_int),
+    ("Tình trạng", "condition", None),
+    ("Trọng lượng", "weight", None),
+    ("Trọng tải", "load_capacity", None),
+)
+
+# Màu chữ của nhãn trong một dòng thông số
+SPEC_LABEL_STYLE = "color:#8C8C8C"
+ALT_PRICE_STYLE = "color: rgb(229, 25, 59)"
+
+
+def normalize_listing_urls(urls):
+    """Turn listing hrefs into absolute URLs without fragments, dropping duplicates (first-seen order)."""
+    full_urls = []
+    for url in urls:
+        # Remove fragments
+        url = url.split('#')[0]
+
+        # Ensure full URL
+        if url.startswith('//'):
+            url = 'https:' + url
+        elif url.startswith('/'):
+            url = 'https://xe.chotot.com' + url
+        elif not url.startswith('http'):
+            url = 'https://xe.chotot.com/' + url
+
+        full_urls.append(url)
+    return list(dict.fromkeys(full_urls))
+
+
+def _is_detail_href(href):
+    return bool(href) and '/mua-ban-oto' in href and '.htm' in href
+
+
+class Bs4Parser:
+    """Original BeautifulSoup(html.parser) extraction."""
+
+    name = 'bs4'
+
+    def listing_urls(self, html_content):
+        """Extract car listing URLs from the page."""
+        soup = BeautifulSoup(html_content, 'html.parser')
+        urls = []
+
+        # Method 1: Find all a tags with href matching car detail pattern
+        links = soup.find_all('a', href=LISTING_HREF)
+
+        if not links:
+            # Method 2: Find div elements with AdItem class
+            car_divs = soup.find_all('div', class_=lambda c: c and 'AdItem_adItem' in c)
+            for div in car_divs:
+                link = div.find('a')
+                if link and _is_detail_href(link.get('href')):
+                    urls.append(link.get('href'))
+
+        if not urls:
+            # Method 3: Find li elements with schema.org ListItem
+            items = soup.find_all('li', attrs={'itemtype': 'http://schema.org/ListItem'})
+            for item in items:
+                link = item.find('a')
+                if link and _is_detail_href(link.get('href')):
+                    urls.append(link.get('href'))
+
+        # Add URLs from direct link finding
+        for link in links:
+            href = link.get('href')
+            if href:
+                urls.append(href)
+
+        return normalize_listing_urls(urls)
+
+    def car_details(self, html_content):
+        """Extract the car fields (everything except id and crawl_time) from a detail page."""
+        soup = BeautifulSoup(html_content, 'html.parser')
+        car_data = {}
+
+        # Extract title
+        title_elem = soup.find('h1')
+        if title_elem:
+            car_data['title'] = title_elem.text.strip()
+
+        # Extract price
+        price_elem = soup.find('b', class_='p26z2wb')
+        if price_elem:
+            car_data['price'] = parse_digits(price_elem.text)
+
+        # Try alternative price element if first method fails
+        if 'price' not in car_data or not car_data['price']:
+            price_elem = soup.find('span', class_='bfe6oav', style=lambda s: s and ALT_PRICE_STYLE in s)
+            if price_elem:
+                car_data['price'] = parse_digits(price_elem.text)
+
+            # Try one more price element
+            if 'price' not in car_data or not car_data['price']:
+                price_elem = soup.find('b', class_='p26z2wb')
+                if price_elem:
+                    car_data['price'] = parse_digits(price_elem.text)
+
+        # Extract location
+        location_elem = soup.find('span', class_='bwq0cbs flex-1')
+        if location_elem:
+            car_data['location'] = location_elem.text.strip()
+
+        # Extract post time
+        post_time_elems = soup.find_all('span', class_='bwq0cbs')
+        for elem in post_time_elems:
+            if 'Đăng' in elem.text:
+                car_data['post_time'] = elem.text.strip()
+                break
+
+        # Extract technical specs
+        info_items = soup.find_all('div', class_='p1ja3eq0')
+        for item in info_items:
+            label_elem = item.find("span", attrs={"class": "bwq0cbs"}, style=True)
+
+            if label_elem and SPEC_LABEL_STYLE in label_elem.get("style", ""):
+                spans = item.find_all("span", class_="bwq0cbs")
+                value_elem = spans[1] if len(spans) > 1 else None
+                label = label_elem.text.strip()
+                value = value_elem.text.strip() if value_elem else None
+
+                if 'Hãng' in label:
+                    car_data['brand'] = value
+                elif 'Dòng xe' in label:
+                    car_data['model'] = value
+                elif 'Năm sản xuất' in label:
+                    car_data['year'] = parse_exact_int(value)
+                elif 'Số Km đã đi' in label:
+                    car_data['mileage'] = parse_digits(value)
+                elif 'Nhiên liệu' in label:
+                    car_data['fuel_type'] = value
+                elif 'Hộp số' in label:
+                    car_data['transmission'] = value
+                elif 'Số đời chủ' in label:
+                    car_data['owners'] = parse_first_int(value)
+                elif 'Xuất xứ' in label:
+                    car_data['origin'] = value
+                elif 'Kiểu dáng' in label:
+                    car_data['car_type'] = value
+                elif 'Số chỗ' in label:
+                    car_data['seats'] = parse_exact_int(value)
+                elif 'Tình trạng' in label:
+                    car_data['condition'] = value
+                elif 'Trọng lượng' in label:
+                    car_data['weight'] = value
+                elif 'Trọng tải' in label:
+                    car_data['load_capacity'] = value
+
+        return car_data
+
+
+def _has_class(name):
+    return f"contains(concat(' ', normalize-space(@class), ' '), ' {name} ')"
+
+
+class LxmlParser:
+    """lxml tree + one XPath query over the relevant nodes, spec rows mapped through DETAIL_FIELDS."""
+
+    name = 'lxml'
+
+    def __init__(self):
+        from lxml import etree, html
+
+        self._html = html
+        self._parser = html.HTMLParser(encoding='utf-8')
+        # Mọi nút cần dùng, theo thứ tự trong tài liệu (giống thứ tự find/find_all của bs4)
+        self._detail_nodes = etree.XPath(
+            f"//h1 | //b[{_has_class('p26z2wb')}] | //span[{_has_class('bfe6oav')} or {_has_class('bwq0cbs')}]"
+            f" | //div[{_has_class('p1ja3eq0')}]"
+        )
+        self._spec_spans = etree.XPath(f".//span[{_has_class('bwq0cbs')}]")
+        self._listing_fallbacks = etree.XPath(
+            "//div[contains(@class, 'AdItem_adItem')] | //li[@itemtype='http://schema.org/ListItem']"
+        )
+        self._first_link = etree.XPath("(.//a)[1]/@href")
+
+    def _tree(self, html_content):
+        if isinstance(html_content, str):
+            html_content = html_content.encode('utf-8')
+        return self._html.fromstring(html_content, parser=self._parser)
+
+    def listing_urls(self, html_content):
+        """Extract car listing URLs from the page."""
+        doc = self._tree(html_content)
+        links = [a.get('href') for a in doc.iter('a') if a.get('href') and LISTING_HREF.search(a.get('href'))]
+
+        # Khối AdItem (chỉ khi không có link trực tiếp), rồi ListItem của schema.org nếu vẫn chưa có URL nào
+        fallbacks = self._listing_fallbacks(doc)
+        urls = self._first_links(fallbacks, 'div') if not links else []
+        if not urls:
+            urls = self._first_links(fallbacks, 'li')
+
+        return normalize_listing_urls(urls + links)
+
+    def _first_links(self, items, tag):
+        urls = []
+        for item in items:
+            if item.tag == tag:
+                href = self._first_link(item)
+                if href and _is_detail_href(href[0]):
+                    urls.append(href[0])
+        return urls
+
+    def car_details(self, html_content):
+        """Extract the car fields (everything except id and crawl_time) from a detail page."""
+        car_data = {}
+        price_b = alt_price = None
+
+        for node in self._detail_nodes(self._tree(html_content)):
+            tag = node.tag
+            classes = (node.get('class') or '').split()
+            if tag == 'h1':
+                if 'title' not in car_data:
+                    car_data['title'] = node.text_content().strip()
+            elif tag == 'b':
+                if price_b is None:
+                    price_b = node
+            elif tag == 'div':
+                self._spec_row(node, car_data)
+            else:
+                if alt_price is None and 'bfe6oav' in classes and ALT_PRICE_STYLE in (node.get('style') or ''):
+                    alt_price = node
+                if 'bwq0cbs' in classes:
+                    if 'location' not in car_data and ' '.join(classes) == 'bwq0cbs flex-1':
+                        car_data['location'] = node.text_content().strip()
+                    if 'post_time' not in car_data:
+                        text = node.text_content()
+                        if 'Đăng' in text:
+                            car_data['post_time'] = text.strip()
+
+        # Giá: thẻ <b> chính, nếu không đọc được thì thẻ span màu đỏ
+        price = parse_digits(price_b.text_content()) if price_b is not None else None
+        if not price and alt_price is not None:
+            alt = parse_digits(alt_price.text_content())
+            if alt or price_b is None:
+                price = alt
+        if price_b is not None or alt_price is not None:
+            car_data['price'] = price
+        return car_data
+
+    def _spec_row(self, item, car_data):
+        spans = self._spec_spans(item)
+        label_elem = next((span for span in spans if span.get('style') is not None), None)
+        if label_elem is None or SPEC_LABEL_STYLE not in label_elem.get('style'):
+            return
+        label = label_elem.text_content().strip()
+        value = spans[1].text_content().strip() if len(spans) > 1 else None
+        for label_text, field, convert in DETAIL_FIELDS:
+            if label_text in label:
+                car_data[field] = convert(value) if convert else value
+                return
+
+
+PARSER_BACKENDS = {
+    'lxml': LxmlParser,
+    'bs4': Bs4Parser,
+}
+
+
+def get_parser(name='lxml'):
+    """Create a parser backend by name; 'lxml' falls back to 'bs4' when lxml is not installed."""
+    if name not in PARSER_BACKENDS:
+        raise ValueError(f"Unknown parser backend {name!r}, expected one of {tuple(PARSER_BACKENDS)}")
+    try:
+        return PARSER_BACKENDS[name]()
+    except ImportError:
+        logger.warning(f"Parser backend {name!r} is not installed, using 'bs4'")
+        return Bs4Parser()
+
+
+def _pad_page(html_content, kb):
+    """Surround the page body with ~kb KB of unrelated markup, like the menus/scripts/related ads of a real page."""
+    block = ('<div class="c1r3xbdq"><a href="/tin-lien-quan"><span class="s1x6c3el">Tin đăng liên quan</span></a>'
+             '<p class="t1b6mn3h">Xe đẹp, giá tốt, hỗ trợ trả góp, liên hệ để xem xe trực tiếp.</p></div>\n')
+    script = '<script>window.__NEXT_DATA__ = {"props": {"pageProps": {"ads": [' + '{"id": 1},' * 200 + ']}}};</script>\n'
+    filler = ''
+    while len(filler) < kb * 1000 // 2:
+        filler += script + block * 20
+    return html_content.replace('<body>', '<body>\n' + filler, 1).replace('</body>', filler + '</body>', 1)
+
+
+if __name__ == "__main__":
+    import glob
+    import os
+    import sys
+    import time
+
+    args = sys.argv[1:]
+    pad_kb = 0
+    if '--pad-kb' in args:
+        pad_kb = int(args[args.index('--pad-kb') + 1])
+        del args[args.index('--pad-kb'):args.index('--pad-kb') + 2]
+    fixture_dir = args[0] if args else os.path.join('tests', 'fixtures')
+
+    pages = []
+    for path in sorted(glob.glob(os.path.join(fixture_dir, '*.html'))):
+        with open(path, encoding='utf-8') as f:
+            html_content = f.read()
+        kind = 'listing' if 'listing' in os.path.basename(path) else 'detail'
+        pages.append((kind, os.path.basename(path), _pad_page(html_content, pad_kb) if pad_kb else html_content))
+
+    backends = {name: get_parser(name) for name in PARSER_BACKENDS}
+    print(f"{len(pages)} fixture pages from {fixture_dir}" + (f", padded with ~{pad_kb} KB of markup" if pad_kb else ""))
+    print(f"  {'page':<36} {'KB':>6} " + ' '.join(f"{name + ' ms':>9}" for name in backends) + "  speedup  identical")
+    mismatches = 0
+    for kind, name, html_content in pages:
+        results, timings = {}, {}
+        for backend_name, backend in backends.items():
+            extract = backend.listing_urls if kind == 'listing' else backend.car_details
+            repeats = 0
+            started = time.perf_counter()
+            while repeats < 5 or time.perf_counter() - started < 0.5:
+                results[backend_name] = extract(html_content)
+                repeats += 1
+            timings[backend_name] = (time.perf_counter() - started) / repeats * 1000
+        identical = results['lxml'] == results['bs4']
+        mismatches += not identical
+        print(f"  {name:<36} {len(html_content.encode('utf-8')) / 1000:>6.1f} "
+              + ' '.join(f"{timings[b]:>9.3f}" for b in backends)
+              + f"  {timings['bs4'] / timings['lxml']:>6.1f}x  {'yes' if identical else 'NO'}")
+        if not identical:
+            print(f"    lxml: {results['lxml']}\n    bs4:  {results['bs4']}")
+    raise SystemExit(1 if mismatches else 0)
@@ -0,0 +1,402 @@
+"""
+Pooled HTTP sessions with per-host adaptive (AIMD) rate control for the crawler.
+
+All crawler requests go through one requests.Session whose HTTPAdapter keeps
+keep-alive connections per host, so a crawl does not pay a TCP/TLS handshake
+per page. Every host gets a HostController that decides how many requests may
+be in flight to it (the window) and, once the window is down to one, how long
+to wait between request starts (the interval):
+
+- additive increase: a successful request while latency is stable widens the
+  window by 1/window (about +1 per round trip), or by 1 per success until the
+  first throttle (slow start); an interval, if set, shrinks by 10% per
+  success before the window grows again
+- multiplicative decrease: 429, 5xx, timeouts and connection errors multiply
+  the window by CRAWLER_DECREASE_FACTOR, at most once per round trip; at
+  a window of 1 the interval doubles instead
+- Retry-After (seconds or HTTP date) pauses the whole host until then
+- a failed attempt is retried after exponential backoff with full jitter
+  (random between 0 and base * 2^attempt, capped), or after Retry-After if
+  that is longer
+
+Benchmark against a rate-limited local server (từ thư mục gốc project):
+    python -m app.utils.http_pool [n_requests] [server_rps] [threads]
+"""
+import email.utils
+import logging
+import random
+import threading
+import time
+from datetime import datetime, timezone
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger(__name__)
+
+# Mã trạng thái coi là máy chủ đang quá tải: giảm tốc và thử lại
+THROTTLE_STATUSES = {429, 500, 502, 503, 504}
+
+
+def parse_retry_after(value, now=None):
+    """Return the Retry-After header as seconds to wait (None when absent or unparseable)."""
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        when = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=timezone.utc)
+    now = now or datetime.now(timezone.utc)
+    return max(0.0, (when - now).total_seconds())
+
+
+class HostController:
+    """AIMD window + interval for one host; acquire() before a request, release() after."""
+
+    def __init__(self, host, min_window=1, max_window=8, initial_window=1, decrease_factor=0.5,
+                 max_interval=30.0, latency_tolerance=2.0):
+        """
+        Args:
+            host (str): Tên host (chỉ dùng cho log/thống kê)
+            min_window, max_window (int): Giới hạn số request đồng thời tới host
+            initial_window (float): Cửa sổ ban đầu (tăng nhanh cho tới lần bị chặn đầu tiên)
+            decrease_factor (float): Hệ số nhân cửa sổ khi bị 429/5xx/timeout
+            max_interval (float): Khoảng cách tối đa (giây) giữa hai lần bắt đầu request khi cửa sổ = 1
+            latency_tolerance (float): Chỉ tăng khi latency trung bình <= hệ số này x latency thấp nhất
+        """
+        self.host = host
+        self.min_window = max(1, int(min_window))
+        self.max_window = max(self.min_window, int(max_window))
+        self.window = float(min(max(initial_window, self.min_window), self.max_window))
+        self.decrease_factor = decrease_factor
+        self.max_interval = max_interval
+        self.latency_tolerance = latency_tolerance
+
+        self.interval = 0.0
+        self.in_flight = 0
+        self.slow_start = True
+        self.blocked_until = 0.0
+        self._next_start = 0.0
+        self._last_decrease = 0.0
+        self.latency = None
+        self.min_latency = None
+        self._cond = threading.Condition()
+
+        self.requests = 0
+        self.throttled = 0
+        self.errors = 0
+
+    def acquire(self):
+        """Block until a request to this host may start."""
+        with self._cond:
+            while True:
+                now = time.monotonic()
+                wait = max(self.blocked_until, self._next_start) - now
+                if self.in_flight < int(self.window) and wait <= 0:
+                    self.in_flight += 1
+                    self._next_start = now + self.interval
+                    self.requests += 1
+                    return now
+                self._cond.wait(timeout=wait if wait > 0 else None)
+
+    def release(self, started, ok, retry_after=None, error=False):
+        """
+        Record the outcome of a request started at `started` (value returned by acquire).
+
+        Args:
+            ok (bool): True khi máy chủ trả lời bình thường, False khi bị 429/5xx/timeout/lỗi kết nối,
+                       None khi lỗi không nói gì về tải của máy chủ (không tăng cũng không giảm cửa sổ)
+            retry_after (float): Số giây máy chủ yêu cầu chờ (header Retry-After)
+            error (bool): Request này kết thúc bằng lỗi (tính vào `errors`)
+        """
+        now = time.monotonic()
+        latency = now - started
+        with self._cond:
+            self.in_flight -= 1
+            if error:
+                self.errors += 1
+            if ok is None:
+                pass
+            elif ok:
+                self.latency = latency if self.latency is None else 0.8 * self.latency + 0.2 * latency
+                self.min_latency = latency if self.min_latency is None else min(self.min_latency, latency)
+                # Request bắt đầu trước lần giảm gần nhất không chứng minh được cửa sổ mới là an toàn
+                if started >= self._last_decrease and self.latency <= self.latency_tolerance * self.min_latency:
+                    self._increase()
+            else:
+                self.throttled += 1
+                # Chỉ giảm một lần mỗi vòng round-trip: các request đang bay cùng lúc bị chặn là một sự kiện
+                if now - self._last_decrease >= (self.latency or latency):
+                    self._decrease()
+                    self._last_decrease = now
+                if retry_after:
+                    self.blocked_until = max(self.blocked_until, now + retry_after)
+            self._cond.notify_all()
+
+    def _increase(self):
+        if self.interval > 0:
+            # Giảm dần khoảng cách (~tăng tốc độ cộng dần) thay vì bỏ hẳn sau một lần thành công
+            self.interval = self.interval * 0.9 if self.interval > 0.01 else 0.0
+        elif self.slow_start:
+            self.window = min(self.max_window, self.window + 1)
+        else:
+            self.window = min(self.max_window, self.window + 1 / self.window)
+
+    def _decrease(self):
+        self.slow_start = False
+        if self.window > self.min_window:
+            self.window = max(self.min_window, self.window * self.decrease_factor)
+        else:
+            # Cửa sổ đã ở mức thấp nhất: giãn khoảng cách giữa các request
+            base = self.latency or 0.1
+            self.interval = min(self.max_interval, max(self.interval * 2, base))
+        logger.info(f"Throttled by {self.host}: window {self.window:.2f}, interval {self.interval:.2f}s")
+
+    def stats(self):
+        with self._cond:
+            return {
+                'window': round(self.window, 2),
+                'interval': round(self.interval, 3),
+                'in_flight': self.in_flight,
+                'latency_ms': round(self.latency * 1000, 1) if self.latency is not None else None,
+                'requests': self.requests,
+                'throttled': self.throttled,
+                'errors': self.errors,
+            }
+
+
+class HttpPool:
+    """Shared keep-alive session plus one HostController per host."""
+
+    def __init__(self, pool_size=16, max_retries=3, backoff_base=1.0, backoff_max=60.0, timeout=30,
+                 **controller_options):
+        """
+        Args:
+            pool_size (int): Số kết nối keep-alive tối đa giữ cho mỗi host
+            max_retries (int): Số lần thử tối đa cho một URL
+            backoff_base (float): Thời gian chờ cơ sở (giây) của backoff mũ
+            backoff_max (float): Thời gian chờ tối đa (giây) giữa hai lần thử
+            timeout (float): Timeout (giây) mỗi request
+            controller_options: Tham số cho HostController (min_window, max_window, ...)
+        """
+        self.pool_size = pool_size
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.timeout = timeout
+        self.controller_options = controller_options
+
+        self._lock = threading.Lock()
+        self._controllers = {}
+        self._session = None
+
+    def configure(self, pool_size=None, max_retries=None, backoff_base=None, backoff_max=None, timeout=None,
+                  **controller_options):
+        """Change the settings; sessions and per-host state are rebuilt on the next request."""
+        with self._lock:
+            if pool_size is not None:
+                self.pool_size = int(pool_size)
+            if max_retries is not None:
+                self.max_retries = max(1, int(max_retries))
+            if backoff_base is not None:
+                self.backoff_base = float(backoff_base)
+            if backoff_max is not None:
+                self.backoff_max = float(backoff_max)
+            if timeout is not None:
+                self.timeout = timeout
+            self.controller_options.update({k: v for k, v in controller_options.items() if v is not None})
+            self._controllers = {}
+            if self._session is not None:
+                self._session.close()
+                self._session = None
+
+    @property
+    def session(self):
+        with self._lock:
+            if self._session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=8, pool_maxsize=self.pool_size, pool_block=True)
+                session.mount('http://', adapter)
+                session.mount('https://', adapter)
+                self._session = session
+            return self._session
+
+    def controller(self, host):
+        with self._lock:
+            if host not in self._controllers:
+                self._controllers[host] = HostController(host, **self.controller_options)
+            return self._controllers[host]
+
+    def backoff(self, attempt, retry_after=None):
+        """Seconds to wait before retry number `attempt` (1-based): full jitter, at least Retry-After."""
+        delay = random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+        if retry_after is not None:
+            delay = max(delay, min(retry_after, self.backoff_max))
+        return delay
+
+    def get(self, url, headers=None, timeout=None):
+        """
+        GET a URL through the host's controller, retrying throttles and transient errors.
+
+        Returns:
+            str: Nội dung trang, hoặc None nếu thất bại sau max_retries lần / gặp lỗi 4xx không thử lại được
+        """
+        controller = self.controller(urlsplit(url).netloc)
+        for attempt in range(1, self.max_retries + 1):
+            retry_after = None
+            # Lần thử cuối thất bại thì cả request tính là một lỗi
+            last_attempt = attempt == self.max_retries
+            started = controller.acquire()
+            try:
+                response = self.session.get(url, headers=headers, timeout=timeout or self.timeout)
+            except (requests.exceptions.Timeout, requests.exceptions.ConnectionError) as e:
+                controller.release(started, ok=False, error=last_attempt)
+                reason = str(e)
+            except requests.exceptions.RequestException as e:
+                # URL sai, quá nhiều redirect...: không phải tín hiệu tải, không cập nhật latency/cửa sổ
+                controller.release(started, ok=None, error=True)
+                logger.error(f"Error fetching {url}: {e}")
+                return None
+            else:
+                if response.status_code in THROTTLE_STATUSES:
+                    retry_after = parse_retry_after(response.headers.get('Retry-After'))
+                    controller.release(started, ok=False, retry_after=retry_after, error=last_attempt)
+                    reason = f"HTTP {response.status_code}"
+                else:
+                    controller.release(started, ok=True, error=response.status_code >= 400)
+                    if response.status_code >= 400:
+                        logger.error(f"Error fetching {url}: HTTP {response.status_code}")
+                        return None
+                    return response.text
+
+            if attempt < self.max_retries:
+                wait_time = self.backoff(attempt, retry_after)
+                logger.warning(f"Error fetching {url}: {reason}. Retrying in {wait_time:.1f} seconds...")
+                time.sleep(wait_time)
+
+        logger.error(f"Failed to fetch {url} after {self.max_retries} attempts")
+        return None
+
+    def stats(self):
+        """Return the controller state per host."""
+        with self._lock:
+            controllers = dict(self._controllers)
+        return {host: controller.stats() for host, controller in controllers.items()}
+
+
+# Session dùng chung cho mọi crawler trong process
+http_pool = HttpPool()
+
+
+def configure_http_pool(app):
+    """Configure the shared crawler HTTP pool for the Flask application."""
+    app.config.setdefault('CRAWLER_MAX_RETRIES', 3)
+    app.config.setdefault('CRAWLER_BACKOFF_BASE', 1.0)
+    app.config.setdefault('CRAWLER_BACKOFF_MAX', 60.0)
+    app.config.setdefault('CRAWLER_MIN_HOST_CONCURRENCY', 1)
+    # Mặc định cho phép tới mức song song của crawler async
+    app.config.setdefault('CRAWLER_MAX_HOST_CONCURRENCY', app.config.get('CRAWLER_CONCURRENCY', 8))
+    app.config.setdefault('CRAWLER_DECREASE_FACTOR', 0.5)
+    http_pool.configure(
+        pool_size=app.config['CRAWLER_MAX_HOST_CONCURRENCY'],
+        max_retries=app.config['CRAWLER_MAX_RETRIES'],
+        backoff_base=app.config['CRAWLER_BACKOFF_BASE'],
+        backoff_max=app.config['CRAWLER_BACKOFF_MAX'],
+        min_window=app.config['CRAWLER_MIN_HOST_CONCURRENCY'],
+        max_window=app.config['CRAWLER_MAX_HOST_CONCURRENCY'],
+        decrease_factor=app.config['CRAWLER_DECREASE_FACTOR'],
+    )
+    return http_pool
+
+
+def _serve_rate_limited(rps, latency_s):
+    """Local server allowing `rps` requests per second (token bucket); beyond that 429 + Retry-After: 1."""
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    bucket = {'tokens': float(rps), 'at': time.monotonic()}
+    lock = threading.Lock()
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def do_GET(self):
+            with lock:
+                now = time.monotonic()
+                bucket['tokens'] = min(float(rps), bucket['tokens'] + (now - bucket['at']) * rps)
+                bucket['at'] = now
+                allowed = bucket['tokens'] >= 1
+                if allowed:
+                    bucket['tokens'] -= 1
+            time.sleep(latency_s)
+            data = b'<html><body>ok</body></html>' if allowed else b'slow down'
+            self.send_response(200 if allowed else 429)
+            if not allowed:
+                self.send_header('Retry-After', '1')
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+if __name__ == "__main__":
+    import sys
+    from concurrent.futures import ThreadPoolExecutor
+
+    n_requests = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    server_rps = float(sys.argv[2]) if len(sys.argv) > 2 else 40
+    threads = int(sys.argv[3]) if len(sys.argv) > 3 else 8
+    logging.basicConfig(level=logging.ERROR)
+
+    server = _serve_rate_limited(server_rps, 0.05)
+    base = f"http://127.0.0.1:{server.server_address[1]}"
+    counters = {'429': 0}
+
+    def fixed_delay_get(url):
+        # Cách cũ: requests.get mới mỗi lần, nghỉ cố định 0.5-1.5s, backoff tuyến tính
+        for attempt in range(1, 4):
+            time.sleep(random.uniform(0.5, 1.5))
+            response = requests.get(url, timeout=30)
+            if response.status_code == 200:
+                return response.text
+            counters['429'] += 1
+            time.sleep(attempt * 2)
+        return None
+
+    def no_delay_get(url):
+        for attempt in range(1, 4):
+            response = requests.get(url, timeout=30)
+            if response.status_code == 200:
+                return response.text
+            counters['429'] += 1
+            time.sleep(attempt * 2)
+        return None
+
+    print(f"{n_requests} requests, {threads} threads, server allows {server_rps:.0f} req/s (429 beyond), 50 ms latency")
+    print(f"  {'client':<22} {'ok':>5} {'429':>5} {'seconds':>8} {'pages/s':>8}")
+    runs = [('fixed delay (old)', fixed_delay_get), ('no delay, no pooling', no_delay_get)]
+    pool = HttpPool(pool_size=threads, max_window=threads, backoff_base=0.25)
+    runs.append(('pooled + AIMD', pool.get))
+    for name, get in runs:
+        counters['429'] = 0
+        time.sleep(1.5)  # cho token bucket của server đầy lại
+        started = time.perf_counter()
+        with ThreadPoolExecutor(threads) as executor:
+            pages = list(executor.map(get, [f"{base}/page/{i}" for i in range(n_requests)]))
+        seconds = time.perf_counter() - started
+        ok = sum(page is not None for page in pages)
+        throttled = counters['429'] if name != 'pooled + AIMD' else sum(s['throttled'] for s in pool.stats().values())
+        print(f"  {name:<22} {ok:>5} {throttled:>5} {seconds:>8.2f} {ok / seconds:>8.1f}")
+    print(f"  AIMD state: {pool.stats()}")
+    server.shutdown()
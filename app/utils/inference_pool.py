@@ -0,0 +1,204 @@
+"""
+Optional process pool for Random Forest / XGBoost inference.
+
+The compiled tree arrays of the current model snapshot are exported once as
+.npy files; worker processes memory-map them (``np.load(mmap_mode='r')``), so
+all workers share one copy of the models through the OS page cache. The native
+RF/XGBoost models are exported next to them. Like in-process prediction
+(predictor.COMPILED_TREES_MAX_CELLS), a worker uses the compiled arrays only
+for small chunks; larger chunks go through the native predict, loaded once per
+worker on first use. Only batches of at least INFERENCE_POOL_MIN_ROWS rows are
+sent to the pool; smaller ones cost less in-process than the round trip to a
+worker. RF and XGBoost run concurrently in different workers and large
+batches are split across workers. Disabled unless INFERENCE_POOL_WORKERS > 0.
+"""
+import os
+import json
+import atexit
+import hashlib
+import logging
+import shutil
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_EXPORT_DIR = os.path.abspath(
+    os.path.join(os.path.dirname(__file__), '..', '..', 'instance', 'inference_models')
+)
+
+# Cache model trong mỗi worker: (export_path, name) -> [CompiledTreeEnsemble, model gốc hoặc None]
+_worker_models = {}
+
+
+def _worker_predict(export_path, name, X):
+    """Worker task: predict X with `name`, compiled arrays for small chunks and the native model otherwise."""
+    from src.models.compiled_trees import CompiledTreeEnsemble
+    from app.utils.predictor import COMPILED_TREES_MAX_CELLS, _predict_trees
+
+    key = (export_path, name)
+    entry = _worker_models.get(key)
+    if entry is None:
+        # Bỏ các bản model cũ trong worker khi đã có phiên bản mới
+        for old_key in [k for k in _worker_models if k[1] == name]:
+            del _worker_models[old_key]
+        entry = _worker_models[key] = [CompiledTreeEnsemble.load(export_path, name, mmap_mode='r'), None]
+
+    compiled, native = entry
+    native_path = os.path.join(export_path, f'{name}_model.pkl')
+    if native is None and X.shape[0] * compiled.n_trees > COMPILED_TREES_MAX_CELLS and os.path.exists(native_path):
+        import joblib
+        # Các mảng nút của RF được map từ file thay vì chép vào từng worker
+        native = entry[1] = joblib.load(native_path, mmap_mode='r')
+    return _predict_trees(native, compiled, X)
+
+
+def _worker_warmup(_):
+    """Worker task used to start processes before the first request."""
+    import time
+    time.sleep(0.1)
+    return os.getpid()
+
+
+class InferencePool:
+    """Process pool evaluating memory-mapped compiled tree ensembles."""
+
+    def __init__(self, workers=0, export_dir=None, chunk_rows=2048, min_rows=4096):
+        """
+        Args:
+            workers (int): Số process worker (0 để tắt, dự đoán ngay trong process Flask)
+            export_dir (str): Thư mục chứa các mảng model được worker memory-map
+            chunk_rows (int): Số dòng tối đa mỗi task khi chia batch lớn cho nhiều worker
+            min_rows (int): Batch ít hơn chừng này dòng được dự đoán ngay trong process Flask
+        """
+        self.workers = workers
+        self.export_dir = export_dir or DEFAULT_EXPORT_DIR
+        self.chunk_rows = chunk_rows
+        self.min_rows = min_rows
+
+        self._lock = threading.Lock()
+        self._executor = None
+        self._exports = {}
+
+    @property
+    def enabled(self):
+        return self.workers > 0
+
+    def accepts(self, n_rows):
+        """Whether a batch of n_rows should be predicted in the pool rather than in-process."""
+        return self.enabled and n_rows >= self.min_rows
+
+    def configure(self, workers=None, export_dir=None, chunk_rows=None, min_rows=None):
+        """Change pool settings; a running pool is shut down and restarted lazily."""
+        self.shutdown()
+        with self._lock:
+            if workers is not None:
+                self.workers = workers
+            if export_dir:
+                self.export_dir = export_dir
+            if chunk_rows:
+                self.chunk_rows = chunk_rows
+            if min_rows is not None:
+                self.min_rows = min_rows
+            self._exports = {}
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                # 'spawn' tránh fork một process Flask đang có nhiều thread
+                context = multiprocessing.get_context('spawn')
+                self._executor = ProcessPoolExecutor(max_workers=self.workers, mp_context=context)
+                logger.info(f"Started inference pool with {self.workers} workers")
+            return self._executor
+
+    def start(self):
+        """Start the worker processes now instead of on the first prediction."""
+        executor = self._get_executor()
+        pids = set(executor.map(_worker_warmup, range(self.workers)))
+        logger.info(f"Inference pool workers ready: {sorted(pids)}")
+
+    def shutdown(self):
+        """Stop the worker processes."""
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True, cancel_futures=True)
+            logger.info("Inference pool shut down")
+
+    def export(self, models):
+        """
+        Write the snapshot's compiled ensembles to a content-addressed folder.
+
+        The folder name is derived from the artifact hashes, so every Flask
+        process exporting the same models reuses the same files.
+        """
+        with self._lock:
+            path = self._exports.get(models.version)
+            if path:
+                return path
+
+            digest = hashlib.sha256(json.dumps(models.hashes, sort_keys=True).encode()).hexdigest()[:16]
+            path = os.path.join(self.export_dir, digest)
+            if not os.path.exists(os.path.join(path, 'xgb.json')):
+                tmp_path = f"{path}.tmp-{os.getpid()}-{threading.get_ident()}"
+                models.rf_compiled.save(tmp_path, 'rf')
+                models.xgb_compiled.save(tmp_path, 'xgb')
+                # Model gốc cho các chunk lớn (snapshot từ bundle có thể không có RF gốc)
+                import joblib
+                for name, model in (('rf', models.rf_model), ('xgb', models.xgb_model)):
+                    if model is not None:
+                        joblib.dump(model, os.path.join(tmp_path, f'{name}_model.pkl'))
+                try:
+                    os.rename(tmp_path, path)
+                except OSError:
+                    # Một process khác đã export xong trước
+                    shutil.rmtree(tmp_path, ignore_errors=True)
+                logger.info(f"Exported model v{models.version} arrays to {path}")
+
+            self._exports = {models.version: path}
+            return path
+
+    def predict_trees(self, models, X):
+        """
+        Predict RF and XGBoost on X in the worker processes.
+
+        Returns:
+            dict: {'rf': ndarray, 'xgb': ndarray}
+        """
+        path = self.export(models)
+        executor = self._get_executor()
+
+        # float32 là kiểu mà cả bộ duyệt cây lẫn sklearn/XGBoost dùng, gửi sang worker nhẹ hơn một nửa
+        X = X.astype(np.float32) if hasattr(X, 'tocsr') else np.ascontiguousarray(X, dtype=np.float32)
+        chunks = [X[start:start + self.chunk_rows] for start in range(0, X.shape[0], self.chunk_rows)] or [X]
+
+        futures = {
+            name: [executor.submit(_worker_predict, path, name, chunk) for chunk in chunks]
+            for name in ('rf', 'xgb')
+        }
+        return {
+            name: np.concatenate([future.result() for future in parts])
+            for name, parts in futures.items()
+        }
+
+
+# Pool dùng chung cho toàn bộ process
+inference_pool = InferencePool()
+atexit.register(inference_pool.shutdown)
+
+
+def configure_inference_pool(app):
+    """Configure the shared inference pool for the Flask application."""
+    app.config.setdefault('INFERENCE_POOL_WORKERS', 0)
+    app.config.setdefault('INFERENCE_POOL_DIR', os.path.join(app.instance_path, 'inference_models'))
+    app.config.setdefault('INFERENCE_POOL_CHUNK_ROWS', 2048)
+    app.config.setdefault('INFERENCE_POOL_MIN_ROWS', 4096)
+    inference_pool.configure(
+        workers=app.config['INFERENCE_POOL_WORKERS'],
+        export_dir=app.config['INFERENCE_POOL_DIR'],
+        chunk_rows=app.config['INFERENCE_POOL_CHUNK_ROWS'],
+        min_rows=app.config['INFERENCE_POOL_MIN_ROWS'],
+    )
+    return inference_pool
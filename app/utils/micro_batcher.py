@@ -0,0 +1,218 @@
+"""
+Micro-batching queue in front of the prediction models.
+
+Concurrent requests each carry one car; a background thread collects them
+for up to MICRO_BATCH_MAX_SIZE rows or MICRO_BATCH_MAX_WAIT_MS milliseconds,
+runs one vectorized call per model for the whole group and scatters the
+results back to the waiting requests.
+
+Load test (từ thư mục gốc project):
+    python -m app.utils.micro_batcher [path/to/models_dir]
+"""
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+logger = logging.getLogger(__name__)
+
+
+class MicroBatcher:
+    """Collect single-row predictions from many threads into vectorized batches."""
+
+    def __init__(self, max_batch=64, max_wait_ms=2.0, enabled=False):
+        """
+        Args:
+            max_batch (int): Số dòng tối đa mỗi batch
+            max_wait_ms (float): Thời gian chờ tối đa (ms) để gom thêm yêu cầu sau yêu cầu đầu tiên
+            enabled (bool): Tắt thì predict() chạy trực tiếp từng yêu cầu
+        """
+        self.max_batch = max_batch
+        self.max_wait_ms = max_wait_ms
+        self.enabled = enabled
+
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread = None
+        self.batches = 0
+        self.rows = 0
+
+    def configure(self, max_batch=None, max_wait_ms=None, enabled=None):
+        """Change the batching knobs (takes effect from the next batch)."""
+        if max_batch is not None:
+            self.max_batch = max(1, int(max_batch))
+        if max_wait_ms is not None:
+            self.max_wait_ms = float(max_wait_ms)
+        if enabled is not None:
+            self.enabled = enabled
+
+    def _ensure_started(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='micro-batcher', daemon=True)
+                self._thread.start()
+
+    def submit(self, car, models):
+        """Queue one validated car for prediction; returns a Future of {'lr', 'rf', 'xgb'} floats."""
+        future = Future()
+        self._ensure_started()
+        self._queue.put((car, models, future))
+        return future
+
+    def predict(self, car, models, timeout=30):
+        """Predict one car through the batch queue (or directly when disabled)."""
+        if not self.enabled:
+            return _predict_group([car], models)[0]
+        return self.submit(car, models).result(timeout=timeout)
+
+    def _collect(self):
+        """Block for the first request, then gather more until the batch is full or the wait expires."""
+        items = [self._queue.get()]
+        deadline = time.monotonic() + self.max_wait_ms / 1000.0
+        while len(items) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                items.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        # Lấy nốt các yêu cầu đã có sẵn trong hàng đợi mà không chờ thêm
+        while len(items) < self.max_batch:
+            try:
+                items.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return items
+
+    def _run(self):
+        while True:
+            items = self._collect()
+
+            # Trong lúc reload model có thể lẫn hai snapshot: mỗi snapshot chạy một batch riêng
+            groups = {}
+            for car, models, future in items:
+                groups.setdefault(id(models), (models, []))[1].append((car, future))
+
+            for models, entries in groups.values():
+                try:
+                    results = _predict_group([car for car, _ in entries], models)
+                except Exception as e:
+                    logger.error(f"Micro-batch prediction error: {e}")
+                    for _, future in entries:
+                        future.set_exception(e)
+                    continue
+                for (_, future), result in zip(entries, results):
+                    future.set_result(result)
+
+            self.batches += len(groups)
+            self.rows += len(items)
+
+    def stats(self):
+        """Return batching counters."""
+        return {
+            'enabled': self.enabled,
+            'max_batch': self.max_batch,
+            'max_wait_ms': self.max_wait_ms,
+            'batches': self.batches,
+            'rows': self.rows,
+            'avg_batch_size': self.rows / self.batches if self.batches else 0.0,
+            'queued': self._queue.qsize(),
+        }
+
+
+def _predict_group(cars, models):
+    """Run one vectorized prediction for a list of cars; returns one dict per car."""
+    from app.utils.predictor import encode_cars, predict_encoded
+
+    preds = predict_encoded(models, encode_cars(cars, models.encoder))
+    return [
+        {name: float(values[i]) for name, values in preds.items()}
+        for i in range(len(cars))
+    ]
+
+
+# Micro-batcher dùng chung cho toàn bộ process
+micro_batcher = MicroBatcher()
+
+
+def configure_micro_batcher(app):
+    """Configure the shared micro-batcher for the Flask application."""
+    app.config.setdefault('MICRO_BATCH_ENABLED', False)
+    app.config.setdefault('MICRO_BATCH_MAX_SIZE', 64)
+    app.config.setdefault('MICRO_BATCH_MAX_WAIT_MS', 2.0)
+    micro_batcher.configure(
+        max_batch=app.config['MICRO_BATCH_MAX_SIZE'],
+        max_wait_ms=app.config['MICRO_BATCH_MAX_WAIT_MS'],
+        enabled=app.config['MICRO_BATCH_ENABLED'],
+    )
+    return micro_batcher
+
+
+def load_test(models, cars, clients=(1, 8, 32, 128), requests_per_client=50, batcher=None):
+    """
+    Measure single-car prediction throughput with and without micro-batching.
+
+    Args:
+        models: ModelSnapshot để dự đoán
+        cars (list): Danh sách xe đã chuẩn hóa, các client lấy lần lượt
+        clients (tuple): Số client chạy đồng thời
+        requests_per_client (int): Số yêu cầu mỗi client gửi
+    """
+    batcher = batcher or MicroBatcher(enabled=True)
+    results = {}
+    print(f"Micro-batch load test (max_batch={batcher.max_batch}, max_wait={batcher.max_wait_ms} ms)")
+    for n_clients in clients:
+        for mode in ('direct', 'batched'):
+            batcher.enabled = mode == 'batched'
+            latencies = []
+            lat_lock = threading.Lock()
+
+            def client(offset):
+                local = []
+                for i in range(requests_per_client):
+                    car = cars[(offset * requests_per_client + i) % len(cars)]
+                    start = time.perf_counter()
+                    batcher.predict(car, models)
+                    local.append(time.perf_counter() - start)
+                with lat_lock:
+                    latencies.extend(local)
+
+            threads = [threading.Thread(target=client, args=(c,)) for c in range(n_clients)]
+            start = time.perf_counter()
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+            elapsed = time.perf_counter() - start
+
+            latencies.sort()
+            total = n_clients * requests_per_client
+            results[(n_clients, mode)] = {
+                'throughput': total / elapsed,
+                'p50_ms': latencies[len(latencies) // 2] * 1e3,
+                'p99_ms': latencies[int(len(latencies) * 0.99) - 1] * 1e3,
+            }
+            r = results[(n_clients, mode)]
+            print(f"  {n_clients:>4} clients | {mode:<7} | {r['throughput']:9.1f} req/s "
+                  f"| p50 {r['p50_ms']:8.2f} ms | p99 {r['p99_ms']:8.2f} ms")
+    return results
+
+
+if __name__ == '__main__':
+    import os
+    import sys
+    import pandas as pd
+    from app.utils.model_registry import ModelRegistry
+    from src.models.feature_encoder import NUMERIC_FIELDS
+
+    root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+    registry = ModelRegistry(sys.argv[1] if len(sys.argv) > 1 else None)
+    snapshot = registry.get()
+
+    df = pd.read_csv(os.path.join(root, 'data', 'preprocessing', 'cleaned.csv')).drop(columns=['price'])
+    df[NUMERIC_FIELDS] = df[NUMERIC_FIELDS].astype(int)
+    sample_cars = df.sample(2000, random_state=42).to_dict(orient='records')
+
+    load_test(snapshot, sample_cars)
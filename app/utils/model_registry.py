@@ -0,0 +1,403 @@
+"""
+In-process model registry for the car price prediction application.
+Each trained artifact is loaded once per process and kept in memory; files
+are re-checked cheaply (mtime/size) and reloaded atomically when their
+content actually changes, e.g. after /train-models finishes.
+
+Models are read either from the pickles (default) or, with
+MODEL_REGISTRY_FORMAT = 'bundle', from the native-format bundle written by the
+trainers (src/models/model_bundle.py), which loads in a fraction of the time
+and memory-maps the tree arrays.
+
+When the folder holds a version store (versions/current, see
+src/models/model_versions.py) the registry serves the promoted version and
+switches as soon as the pointer changes; published versions are never
+modified, so a reload cannot mix files from two training runs.
+"""
+import os
+import json
+import hashlib
+import logging
+import threading
+import time
+from datetime import datetime
+import joblib
+from src.models.feature_encoder import FeatureEncoder, CategoryCodeEncoder
+from src.models.compiled_lr import CompiledLinearRegression
+from src.models.compiled_trees import compile_tree_model
+from src.models.price_surface import PriceSurface
+from src.models.model_bundle import ModelBundle, MANIFEST_FILE
+from src.models.model_versions import ModelVersionStore, VERSIONS_DIRNAME
+
+logger = logging.getLogger(__name__)
+
+# Thư mục mặc định chứa các model do src/training ghi ra
+DEFAULT_MODEL_DIR = os.path.abspath(
+    os.path.join(os.path.dirname(__file__), '..', '..', 'src', 'models')
+)
+
+# Tên thuộc tính trong snapshot -> tên file artifact
+MODEL_ARTIFACTS = {
+    'model_columns': 'model_columns.pkl',
+    'lr_model': 'linear_regression_model.pkl',
+    'scaler_X': 'scaler_X.pkl',
+    'scaler_y': 'scaler_y.pkl',
+    'rf_model': 'random_forest_model.pkl',
+    'xgb_model': 'xgboost_model.pkl',
+}
+
+# Artifact chỉ có ở các version train từ khi có model native categorical (đọc nếu có)
+OPTIONAL_ARTIFACTS = {
+    'cat_model': 'native_categorical_model.pkl',
+    'category_codes': 'category_codes.json',
+}
+ARTIFACT_FILES = {**MODEL_ARTIFACTS, **OPTIONAL_ARTIFACTS}
+
+MODEL_FORMATS = ('pickle', 'bundle')
+
+# Thư mục con chứa bundle định dạng gốc
+BUNDLE_DIRNAME = 'bundle'
+
+# Bảng giá tính sẵn (tùy chọn), do `python -m src.models.price_surface` ghi ra sau khi train
+PRICE_SURFACE_FILE = 'price_surface.json'
+
+
+def file_sha256(path, chunk_size=1024 * 1024):
+    """Compute the SHA-256 hex digest of a file."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _load_artifact(path):
+    """Read one artifact: JSON files as JSON, everything else with joblib."""
+    if path.endswith('.json'):
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+    return joblib.load(path)
+
+
+def _category_code_encoder(cat_model, category_codes, model_columns):
+    """Encoder for the native-categorical model, or None when the snapshot does not have that model."""
+    if cat_model is None or category_codes is None:
+        return None
+    return CategoryCodeEncoder(category_codes, model_columns)
+
+
+def _try_compile(model, name):
+    """Compile a tree ensemble for NumPy inference, or return None to keep the native model."""
+    try:
+        return compile_tree_model(model)
+    except Exception as e:
+        logger.warning(f"Cannot compile {name} model, using native predict: {e}")
+        return None
+
+
+class ModelSnapshot:
+    """Immutable set of model artifacts loaded together."""
+
+    def __init__(self, artifacts, hashes, version, price_surface=None, release=None):
+        """Initialize the snapshot from loaded artifacts, their hashes and an optional price surface."""
+        self.model_columns = artifacts['model_columns']
+        self.lr_model = artifacts['lr_model']
+        self.scaler_X = artifacts['scaler_X']
+        self.scaler_y = artifacts['scaler_y']
+        self.rf_model = artifacts['rf_model']
+        self.xgb_model = artifacts['xgb_model']
+        # Model native categorical và mapping mã category của nó (None với các version cũ)
+        self.cat_model = artifacts.get('cat_model')
+        self.category_codes = artifacts.get('category_codes')
+        # Bộ mã hóa one-hot được biên dịch một lần cho mỗi snapshot
+        self.encoder = FeatureEncoder(self.model_columns)
+        # Chuyển hàng one-hot sang mã category cho model native categorical
+        self.cat_codes = _category_code_encoder(self.cat_model, self.category_codes, self.model_columns)
+        # LR đã gộp scaler + hệ số thành bảng tra cứu, không cần sklearn khi dự đoán
+        self.lr_scorer = CompiledLinearRegression(self.encoder, self.lr_model, self.scaler_X, self.scaler_y)
+        # RF/XGBoost dạng mảng NumPy cho batch nhỏ (None nếu không biên dịch được)
+        self.rf_compiled = _try_compile(self.rf_model, 'Random Forest')
+        self.xgb_compiled = _try_compile(self.xgb_model, 'XGBoost')
+        # Lưới giá tính sẵn cho đúng bộ model này (None nếu chưa tạo hoặc đã cũ)
+        self.price_surface = price_surface
+        self.hashes = hashes
+        # Hash các file .pkl tương ứng (dùng để đối chiếu price surface)
+        self.source_hashes = {ARTIFACT_FILES[name]: digest for name, digest in hashes.items()}
+        self.version = version
+        # Tên version trong kho versions/ (vd 'v3'), None khi đọc thư mục phẳng
+        self.release = release
+        self.loaded_at = datetime.now()
+
+    @classmethod
+    def from_bundle(cls, bundle, version, price_surface=None, release=None):
+        """Build a snapshot from a loaded ModelBundle (no sklearn objects, RF only as node arrays)."""
+        snapshot = cls.__new__(cls)
+        snapshot.model_columns = bundle.model_columns
+        snapshot.lr_model = snapshot.scaler_X = snapshot.scaler_y = None
+        snapshot.rf_model = None
+        snapshot.xgb_model = bundle.xgb_model
+        snapshot.encoder = bundle.encoder
+        snapshot.lr_scorer = bundle.lr_scorer
+        snapshot.rf_compiled = bundle.rf_compiled
+        snapshot.xgb_compiled = bundle.xgb_compiled
+        snapshot.cat_model = bundle.cat_model
+        snapshot.category_codes = bundle.category_codes
+        snapshot.cat_codes = _category_code_encoder(bundle.cat_model, bundle.category_codes, bundle.model_columns)
+        snapshot.price_surface = price_surface
+        snapshot.hashes = bundle.hashes
+        snapshot.source_hashes = bundle.source_hashes
+        snapshot.version = version
+        snapshot.release = release
+        snapshot.loaded_at = datetime.now()
+        return snapshot
+
+    def __repr__(self):
+        release = f' ({self.release})' if self.release else ''
+        return f'<ModelSnapshot v{self.version}{release} loaded at {self.loaded_at:%Y-%m-%d %H:%M:%S}>'
+
+
+class ModelRegistry:
+    """Load model artifacts once per process and hot-reload them on change."""
+
+    def __init__(self, model_dir=None, check_interval=1.0, use_price_surface=False, model_format='pickle'):
+        """Initialize the registry with the artifact folder and re-check interval (seconds)."""
+        self.model_dir = model_dir or DEFAULT_MODEL_DIR
+        self.check_interval = check_interval
+        self.use_price_surface = use_price_surface
+        self.model_format = model_format
+        self.versions = ModelVersionStore(os.path.join(self.model_dir, VERSIONS_DIRNAME))
+
+        self._lock = threading.Lock()
+        self._snapshot = None
+        self._stats = {}
+        self._version = 0
+        self._last_check = 0.0
+
+    def configure(self, model_dir=None, check_interval=None, use_price_surface=None, model_format=None):
+        """Point the registry at another folder; the next get() reloads everything."""
+        if model_format is not None and model_format not in MODEL_FORMATS:
+            raise ValueError(f"Unknown model format {model_format!r}, expected one of {MODEL_FORMATS}")
+        with self._lock:
+            if model_format is not None:
+                self.model_format = model_format
+            if model_dir:
+                self.model_dir = model_dir
+                self.versions = ModelVersionStore(os.path.join(model_dir, VERSIONS_DIRNAME))
+            if check_interval is not None:
+                self.check_interval = check_interval
+            if use_price_surface is not None:
+                self.use_price_surface = use_price_surface
+            self._snapshot = None
+            self._stats = {}
+            self._last_check = 0.0
+
+    @property
+    def version(self):
+        """Version of the currently loaded snapshot (0 if nothing is loaded)."""
+        snapshot = self._snapshot
+        return snapshot.version if snapshot else 0
+
+    def _resolve(self):
+        """Return (folder to load from, release name): the promoted version, else model_dir itself."""
+        release = self.versions.current()
+        if release:
+            return self.versions.version_path(release), release
+        return self.model_dir, None
+
+    @property
+    def active_dir(self):
+        """Folder the current artifacts are read from."""
+        return self._resolve()[0]
+
+    @property
+    def bundle_dir(self):
+        return os.path.join(self.active_dir, BUNDLE_DIRNAME)
+
+    def _file_stats(self):
+        """Return {name: (mtime_ns, size)} for every artifact (only the manifest for a bundle), plus the source folder."""
+        directory, release = self._resolve()
+        stats = {'source': (directory, release)}
+        if self.model_format == 'bundle':
+            # Manifest được ghi sau cùng: đổi manifest nghĩa là bundle đã đổi
+            st = os.stat(os.path.join(directory, BUNDLE_DIRNAME, MANIFEST_FILE))
+            stats['manifest'] = (st.st_mtime_ns, st.st_size)
+        else:
+            for name, filename in MODEL_ARTIFACTS.items():
+                st = os.stat(os.path.join(directory, filename))
+                stats[name] = (st.st_mtime_ns, st.st_size)
+            for name, filename in OPTIONAL_ARTIFACTS.items():
+                path = os.path.join(directory, filename)
+                stats[name] = None
+                if os.path.exists(path):
+                    st = os.stat(path)
+                    stats[name] = (st.st_mtime_ns, st.st_size)
+        stats['price_surface'] = None
+        surface_path = os.path.join(directory, PRICE_SURFACE_FILE)
+        if self.use_price_surface and os.path.exists(surface_path):
+            st = os.stat(surface_path)
+            stats['price_surface'] = (st.st_mtime_ns, st.st_size)
+        return stats
+
+    def _load_price_surface(self, directory, source_hashes):
+        """Load the price surface if it exists and was built from exactly these pickles ({filename: sha256})."""
+        if not self.use_price_surface or not os.path.exists(os.path.join(directory, PRICE_SURFACE_FILE)):
+            return None
+        try:
+            surface = PriceSurface.load(directory)
+        except Exception as e:
+            logger.warning(f"Cannot load price surface, using exact models: {e}")
+            return None
+        if not surface.matches(source_hashes):
+            logger.warning("Price surface was built from other model files, using exact models")
+            return None
+        return surface
+
+    def _load(self, stats):
+        """Load whatever changed and swap in a new snapshot."""
+        if self.model_format == 'bundle':
+            return self._load_bundle(stats)
+        return self._load_pickles(stats)
+
+    def _load_bundle(self, stats):
+        """Open the bundle again if its manifest (or the price surface) changed."""
+        current = self._snapshot
+        directory, release = stats['source']
+        same_source = current and self._stats.get('source') == stats['source']
+        surface_changed = not same_source or self._stats.get('price_surface') != stats['price_surface']
+        if same_source and self._stats.get('manifest') == stats['manifest'] and not surface_changed:
+            self._stats = stats
+            return current
+
+        bundle = ModelBundle.load(os.path.join(directory, BUNDLE_DIRNAME))
+        if self._file_stats() != stats:
+            raise RuntimeError('Model bundle changed while loading')
+
+        price_surface = self._load_price_surface(directory, bundle.source_hashes)
+        if (current and bundle.hashes == current.hashes and current.release == release
+                and price_surface is None and current.price_surface is None):
+            self._stats = stats
+            return current
+
+        self._version += 1
+        snapshot = ModelSnapshot.from_bundle(bundle, self._version, price_surface, release)
+        self._snapshot = snapshot
+        self._stats = stats
+        logger.info(f"Loaded model bundle v{snapshot.version} from {bundle.directory} "
+                    f"(price surface: {'yes' if price_surface else 'no'})")
+        return snapshot
+
+    def _load_pickles(self, stats):
+        """Load all pickled artifacts whose content changed and swap in a new snapshot."""
+        current = self._snapshot
+        directory, release = stats['source']
+        same_source = current and self._stats.get('source') == stats['source']
+        files = dict(MODEL_ARTIFACTS)
+        files.update({name: filename for name, filename in OPTIONAL_ARTIFACTS.items() if stats[name] is not None})
+        hashes = {}
+        # Artifact tùy chọn có ở snapshot cũ nhưng không còn trong thư mục mới
+        changed = [name for name in OPTIONAL_ARTIFACTS if current and name in current.hashes and name not in files]
+        for name, filename in files.items():
+            if same_source and self._stats.get(name) == stats[name] and name in current.hashes:
+                hashes[name] = current.hashes[name]
+                continue
+            hashes[name] = file_sha256(os.path.join(directory, filename))
+            if not current or current.hashes.get(name) != hashes[name]:
+                changed.append(name)
+
+        surface_changed = not same_source or self._stats.get('price_surface') != stats['price_surface']
+        if current and not changed and not surface_changed:
+            # Chỉ mtime thay đổi (vd: file được touch/copy lại) - không cần load lại
+            self._stats = stats
+            return current
+
+        artifacts = {}
+        for name, filename in files.items():
+            if current and name not in changed:
+                artifacts[name] = getattr(current, name)
+            else:
+                artifacts[name] = _load_artifact(os.path.join(directory, filename))
+
+        # File có thể đã bị ghi đè trong lúc load - thử lại ở lần kiểm tra sau
+        if self._file_stats() != stats:
+            raise RuntimeError('Model artifacts changed while loading')
+
+        price_surface = self._load_price_surface(
+            directory, {ARTIFACT_FILES[name]: digest for name, digest in hashes.items()})
+        if (current and not changed and current.release == release
+                and price_surface is None and current.price_surface is None):
+            # File surface đổi nhưng vẫn không dùng được - giữ nguyên snapshot hiện tại
+            self._stats = stats
+            return current
+
+        self._version += 1
+        snapshot = ModelSnapshot(artifacts, hashes, self._version, price_surface, release)
+        self._snapshot = snapshot
+        self._stats = stats
+        logger.info(f"Loaded model snapshot v{snapshot.version} from {directory} "
+                    f"(changed: {', '.join(changed) or 'price surface'}, "
+                    f"price surface: {'yes' if price_surface else 'no'})")
+        return snapshot
+
+    def get(self):
+        """
+        Return the current ModelSnapshot, reloading it if any artifact changed.
+
+        The file check runs at most once per ``check_interval`` seconds. If a
+        reload fails (e.g. a half-written file) the previous snapshot keeps
+        serving; without any snapshot the error is raised to the caller.
+        """
+        snapshot = self._snapshot
+        now = time.monotonic()
+        if snapshot and now - self._last_check < self.check_interval:
+            return snapshot
+
+        with self._lock:
+            snapshot = self._snapshot
+            if snapshot and now - self._last_check < self.check_interval:
+                return snapshot
+            try:
+                stats = self._file_stats()
+                if snapshot is None or stats != self._stats:
+                    snapshot = self._load(stats)
+            except Exception as e:
+                if snapshot is None:
+                    raise
+                logger.error(f"Error reloading models from {self.model_dir}, "
+                             f"keeping v{snapshot.version}: {e}")
+            self._last_check = now
+            return snapshot
+
+    def reload(self):
+        """Force a file check on the next get() and perform it now."""
+        with self._lock:
+            self._last_check = 0.0
+        return self.get()
+
+
+# Registry dùng chung cho toàn bộ process
+model_registry = ModelRegistry()
+
+
+def configure_model_registry(app):
+    """Configure the shared model registry for the Flask application."""
+    app.config.setdefault('MODEL_REGISTRY_DIR', DEFAULT_MODEL_DIR)
+    app.config.setdefault('MODEL_REGISTRY_CHECK_INTERVAL', 1.0)
+    # Lưới giá chỉ là xấp xỉ (nội suy theo số km, có xe lệch >10% so với model), nên mặc định tắt:
+    # /predict dùng model chính xác và khi train không tốn thời gian dựng lưới
+    app.config.setdefault('PRICE_SURFACE_ENABLED', False)
+    app.config.setdefault('MODEL_REGISTRY_FORMAT', 'pickle')
+    # /train-models: tự chuyển sang version mới sau khi train, và số version giữ lại (None = giữ hết)
+    app.config.setdefault('MODEL_VERSIONS_AUTO_PROMOTE', True)
+    app.config.setdefault('MODEL_VERSIONS_KEEP', 10)
+    # Số core cho từng trainer, vd {'rf': 4, 'xgb': 3} (None = chia đều theo số CPU) và số trainer chạy cùng lúc
+    app.config.setdefault('TRAINING_CORE_BUDGETS', None)
+    app.config.setdefault('TRAINING_MAX_PARALLEL', None)
+    # Tham số thêm cho từng trainer, vd {'xgb': {'mode': 'early-stopping'}}
+    app.config.setdefault('TRAINING_OPTIONS', None)
+    model_registry.configure(
+        model_format=app.config['MODEL_REGISTRY_FORMAT'],
+        model_dir=app.config['MODEL_REGISTRY_DIR'],
+        check_interval=app.config['MODEL_REGISTRY_CHECK_INTERVAL'],
+        use_price_surface=app.config['PRICE_SURFACE_ENABLED'],
+    )
+    return model_registry
@@ -0,0 +1,153 @@
+"""
+LRU/TTL cache of price predictions keyed by the normalized car specification.
+Keys include the model registry version, so retraining invalidates every
+cached price automatically.
+"""
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+
+class PredictionCache:
+    """Thread-safe LRU cache with per-entry time-to-live and hit/miss counters."""
+
+    def __init__(self, maxsize=4096, ttl=3600, mileage_bucket=1000):
+        """
+        Args:
+            maxsize (int): Số kết quả tối đa giữ trong cache (0 để tắt cache)
+            ttl (float): Thời gian sống của mỗi kết quả (giây)
+            mileage_bucket (int): Làm tròn số km về bội số này trước khi dự đoán
+        """
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.mileage_bucket = mileage_bucket
+
+        self._lock = threading.Lock()
+        self._data = OrderedDict()
+        self._version = None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    @property
+    def enabled(self):
+        return self.maxsize > 0
+
+    def normalize(self, car):
+        """Return a copy of the car spec with mileage rounded to the bucket size (only when caching)."""
+        normalized = dict(car)
+        if self.enabled and self.mileage_bucket and self.mileage_bucket > 1:
+            mileage = int(car['mileage'])
+            normalized['mileage'] = int(round(mileage / self.mileage_bucket)) * self.mileage_bucket
+        return normalized
+
+    @staticmethod
+    def make_key(car):
+        """Build the cache key from a normalized car spec."""
+        return (
+            str(car['brand']), str(car['model']), int(car['year']), int(car['mileage']),
+            str(car['fuel_type']), str(car['transmission']), str(car['origin']),
+            str(car['car_type']), int(car['seats']),
+        )
+
+    def get(self, key, version):
+        """Return the cached value for key under the given model version, or None."""
+        if not self.enabled:
+            return None
+        with self._lock:
+            if version != self._version:
+                # Model đã được train lại: bỏ toàn bộ kết quả cũ
+                if self._data:
+                    self.invalidations += len(self._data)
+                    logger.info(f"Prediction cache invalidated ({len(self._data)} entries) "
+                                f"for model version {version}")
+                self._data.clear()
+                self._version = version
+
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            value, expires_at = entry
+            if expires_at < time.monotonic():
+                del self._data[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+
+            self._data.move_to_end(key)
+            self.hits += 1
+            return dict(value)
+
+    def put(self, key, version, value):
+        """Store value for key if it belongs to the current model version."""
+        if not self.enabled:
+            return
+        with self._lock:
+            if version != self._version:
+                return
+            self._data[key] = (dict(value), time.monotonic() + self.ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        """Drop every cached entry (counters are kept)."""
+        with self._lock:
+            self.invalidations += len(self._data)
+            self._data.clear()
+
+    def configure(self, maxsize=None, ttl=None, mileage_bucket=None):
+        """Change the cache limits; existing entries are dropped."""
+        with self._lock:
+            if maxsize is not None:
+                self.maxsize = maxsize
+            if ttl is not None:
+                self.ttl = ttl
+            if mileage_bucket is not None:
+                self.mileage_bucket = mileage_bucket
+            self._data.clear()
+            self._version = None
+
+    def stats(self):
+        """Return cache counters for sizing the cache."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'enabled': self.enabled,
+                'size': len(self._data),
+                'maxsize': self.maxsize,
+                'ttl': self.ttl,
+                'mileage_bucket': self.mileage_bucket,
+                'model_version': self._version,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'invalidations': self.invalidations,
+            }
+
+
+# Cache dùng chung cho toàn bộ process
+prediction_cache = PredictionCache()
+
+
+def configure_prediction_cache(app):
+    """Configure the shared prediction cache for the Flask application."""
+    app.config.setdefault('PREDICTION_CACHE_SIZE', 4096)
+    app.config.setdefault('PREDICTION_CACHE_TTL', 3600)
+    app.config.setdefault('PREDICTION_CACHE_MILEAGE_BUCKET', 1000)
+    prediction_cache.configure(
+        maxsize=app.config['PREDICTION_CACHE_SIZE'],
+        ttl=app.config['PREDICTION_CACHE_TTL'],
+        mileage_bucket=app.config['PREDICTION_CACHE_MILEAGE_BUCKET'],
+    )
+    return prediction_cache
@@ -0,0 +1,242 @@
+"""
+Write-behind persistence of CarPrediction history.
+
+Predictions are queued in memory and written with one bulk insert per flush,
+every PREDICTION_LOG_FLUSH_ROWS rows or PREDICTION_LOG_FLUSH_MS milliseconds,
+by a background thread. A ring buffer of the latest predictions serves the
+"recent predictions" widget, so the request path does not touch SQLite at all.
+PREDICTION_LOG_MODE = 'sync' restores the old commit-per-request behaviour.
+Pending rows are flushed when the process exits.
+"""
+import atexit
+import logging
+import threading
+from collections import deque, namedtuple
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+PREDICTION_FIELDS = (
+    'brand', 'model', 'year', 'mileage', 'fuel_type', 'transmission', 'origin', 'car_type', 'seats',
+    'predicted_price_lr', 'predicted_price_rf', 'predicted_price_xgb', 'predicted_price_cat', 'prediction_time',
+)
+
+# Bản ghi chỉ đọc cho widget, cùng tên thuộc tính với CarPrediction
+RecentPrediction = namedtuple('RecentPrediction', PREDICTION_FIELDS)
+
+LOG_MODES = ('write-behind', 'sync')
+
+
+class PredictionLog:
+    """Buffered CarPrediction writer with an in-memory ring of recent predictions."""
+
+    def __init__(self, mode='write-behind', flush_rows=50, flush_ms=1000, max_pending=10000, recent_size=20):
+        """
+        Args:
+            mode (str): 'write-behind' (ghi theo lô ở thread nền) hoặc 'sync' (commit ngay trong request)
+            flush_rows (int): Ghi xuống DB khi hàng đợi đạt số dòng này
+            flush_ms (float): Thời gian tối đa (ms) một dòng nằm trong hàng đợi
+            max_pending (int): Số dòng tối đa giữ lại khi DB lỗi; vượt quá thì bỏ dòng cũ nhất
+            recent_size (int): Kích thước ring buffer cho widget dự đoán gần đây
+        """
+        self.mode = mode
+        self.flush_rows = flush_rows
+        self.flush_ms = flush_ms
+        self.max_pending = max_pending
+
+        self._app = None
+        self._cond = threading.Condition()
+        self._pending = []
+        self._recent = deque(maxlen=recent_size)
+        self._recent_loaded = False
+        self._thread = None
+        self._stopping = False
+        self.written = 0
+        self.flushes = 0
+        self.dropped = 0
+        self.errors = 0
+
+    def configure(self, app, mode=None, flush_rows=None, flush_ms=None, max_pending=None, recent_size=None):
+        """Bind the writer to a Flask app and change its settings (pending rows are flushed first)."""
+        if self._app is not None:
+            self.flush()
+        with self._cond:
+            self._app = app
+            if mode is not None:
+                if mode not in LOG_MODES:
+                    raise ValueError(f"Unknown prediction log mode {mode!r}, expected one of {LOG_MODES}")
+                self.mode = mode
+            if flush_rows is not None:
+                self.flush_rows = max(1, int(flush_rows))
+            if flush_ms is not None:
+                self.flush_ms = float(flush_ms)
+            if max_pending is not None:
+                self.max_pending = int(max_pending)
+            if recent_size is not None and recent_size != self._recent.maxlen:
+                self._recent = deque(self._recent, maxlen=recent_size)
+            self._recent_loaded = False
+            self._recent.clear()
+
+    def record(self, **fields):
+        """
+        Record one prediction (CarPrediction column values).
+
+        Returns:
+            RecentPrediction: Bản ghi đã đưa vào ring buffer
+        """
+        fields.setdefault('prediction_time', datetime.utcnow())
+        # Version chưa có model native categorical thì không có giá này
+        fields.setdefault('predicted_price_cat', None)
+        row = {name: fields[name] for name in PREDICTION_FIELDS}
+        entry = RecentPrediction(**row)
+
+        if self.mode == 'sync':
+            self._write([row])
+            with self._cond:
+                self._recent.appendleft(entry)
+            return entry
+
+        self._ensure_started()
+        with self._cond:
+            self._recent.appendleft(entry)
+            self._pending.append(row)
+            if len(self._pending) > self.max_pending:
+                overflow = len(self._pending) - self.max_pending
+                del self._pending[:overflow]
+                self.dropped += overflow
+                logger.warning(f"Prediction log queue full, dropped {overflow} oldest rows")
+            # Đánh thức thread nền khi lô mới bắt đầu (để tính hạn flush_ms) hoặc khi đã đủ dòng
+            if len(self._pending) == 1 or len(self._pending) >= self.flush_rows:
+                self._cond.notify()
+        return entry
+
+    def recent(self, limit=5):
+        """Return the latest predictions, newest first (loads from the DB once per process)."""
+        if not self._recent_loaded:
+            self._load_recent()
+        with self._cond:
+            return list(self._recent)[:limit]
+
+    def _load_recent(self):
+        from app.models import CarPrediction
+
+        rows = CarPrediction.query.order_by(CarPrediction.prediction_time.desc()).limit(self._recent.maxlen).all()
+        with self._cond:
+            if self._recent_loaded:
+                return
+            # Giữ các dự đoán mới chưa kịp ghi xuống DB ở đầu ring
+            seen = {(e.prediction_time, e.brand, e.model) for e in self._recent}
+            for row in rows:
+                if len(self._recent) >= self._recent.maxlen:
+                    break
+                if (row.prediction_time, row.brand, row.model) not in seen:
+                    self._recent.append(RecentPrediction(**{name: getattr(row, name) for name in PREDICTION_FIELDS}))
+            self._recent_loaded = True
+
+    def _ensure_started(self):
+        with self._cond:
+            if self._thread is None or not self._thread.is_alive():
+                self._stopping = False
+                self._thread = threading.Thread(target=self._run, name='prediction-log', daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                if not self._pending and not self._stopping:
+                    self._cond.wait()
+                # Chờ thêm cho đủ lô, trừ khi đã đủ số dòng hoặc đang dừng
+                if len(self._pending) < self.flush_rows and not self._stopping:
+                    self._cond.wait(timeout=self.flush_ms / 1000.0)
+                stopping = self._stopping
+            errors = self.errors
+            self.flush()
+            if stopping:
+                return
+            if self.errors != errors:
+                # DB lỗi: chờ một chu kỳ trước khi thử lại
+                with self._cond:
+                    self._cond.wait(timeout=self.flush_ms / 1000.0)
+
+    def flush(self):
+        """Write every pending row to the database now."""
+        with self._cond:
+            rows, self._pending = self._pending, []
+        if not rows:
+            return 0
+        try:
+            self._write(rows)
+            return len(rows)
+        except Exception as e:
+            self.errors += 1
+            logger.error(f"Error flushing {len(rows)} predictions: {e}")
+            with self._cond:
+                # Đưa lại vào đầu hàng đợi để thử ở lần flush sau
+                self._pending[:0] = rows
+                if len(self._pending) > self.max_pending:
+                    overflow = len(self._pending) - self.max_pending
+                    del self._pending[:overflow]
+                    self.dropped += overflow
+            return 0
+
+    def _write(self, rows):
+        from app.models import CarPrediction
+        from app.utils.database import db
+
+        with self._app.app_context():
+            try:
+                db.session.bulk_insert_mappings(CarPrediction, rows)
+                db.session.commit()
+            except Exception:
+                db.session.rollback()
+                raise
+        self.written += len(rows)
+        self.flushes += 1
+
+    def shutdown(self):
+        """Stop the background flusher after writing the pending rows."""
+        with self._cond:
+            self._stopping = True
+            self._cond.notify_all()
+            thread = self._thread
+        if thread is not None and thread.is_alive():
+            thread.join(timeout=10)
+        if self._app is not None:
+            self.flush()
+
+    def stats(self):
+        """Return writer counters."""
+        with self._cond:
+            return {
+                'mode': self.mode,
+                'pending': len(self._pending),
+                'flush_rows': self.flush_rows,
+                'flush_ms': self.flush_ms,
+                'written': self.written,
+                'flushes': self.flushes,
+                'dropped': self.dropped,
+                'errors': self.errors,
+            }
+
+
+# Bộ ghi dùng chung cho toàn bộ process
+prediction_log = PredictionLog()
+atexit.register(prediction_log.shutdown)
+
+
+def configure_prediction_log(app):
+    """Configure the shared prediction history writer for the Flask application."""
+    app.config.setdefault('PREDICTION_LOG_MODE', 'write-behind')
+    app.config.setdefault('PREDICTION_LOG_FLUSH_ROWS', 50)
+    app.config.setdefault('PREDICTION_LOG_FLUSH_MS', 1000)
+    app.config.setdefault('PREDICTION_LOG_MAX_PENDING', 10000)
+    app.config.setdefault('PREDICTION_LOG_RECENT_SIZE', 20)
+    prediction_log.configure(
+        app,
+        mode=app.config['PREDICTION_LOG_MODE'],
+        flush_rows=app.config['PREDICTION_LOG_FLUSH_ROWS'],
+        flush_ms=app.config['PREDICTION_LOG_FLUSH_MS'],
+        max_pending=app.config['PREDICTION_LOG_MAX_PENDING'],
+        recent_size=app.config['PREDICTION_LOG_RECENT_SIZE'],
+    )
+    return prediction_log
@@ -0,0 +1,159 @@
+"""
+Prediction helpers shared by the /predict page and the JSON prediction APIs.
+Rows are encoded together into one matrix aligned to model_columns.pkl so each
+model is called once per batch instead of once per car.
+"""
+import logging
+import numpy as np
+from scipy import sparse
+from src.models.compiled_trees import accepts_sparse
+from src.models.feature_encoder import CATEGORICAL_FIELDS, NUMERIC_FIELDS, predict_aligned
+from app.utils.inference_pool import inference_pool
+
+logger = logging.getLogger(__name__)
+
+# Bộ duyệt cây NumPy chỉ dùng khi số dòng x số cây nhỏ; batch lớn hơn dùng predict gốc
+# (C++/Cython đa luồng nhanh hơn khi chi phí gọi hàm không còn chiếm ưu thế)
+COMPILED_TREES_MAX_CELLS = 4096
+
+# Batch từ chừng này dòng được mã hóa thành CSR (mỗi dòng chỉ có ~9 ô khác 0 trên hàng trăm cột)
+SPARSE_BATCH_MIN_ROWS = 256
+
+REQUIRED_FIELDS = ["brand", "model", "year", "mileage", "fuel_type",
+                   "transmission", "origin", "car_type", "seats"]
+
+
+def validate_car(raw, encoder=None):
+    """
+    Validate and normalize one car specification.
+
+    Args:
+        raw (dict): Thông tin xe (brand, model, year, mileage, ...)
+        encoder (FeatureEncoder): Nếu có, kiểm tra các giá trị phân loại đã được model biết
+
+    Returns:
+        tuple: (car dict hoặc None, danh sách lỗi)
+    """
+    if not isinstance(raw, dict):
+        return None, ['Row must be an object with car fields']
+
+    car = {}
+    errors = []
+    for field in REQUIRED_FIELDS:
+        value = raw.get(field)
+        if value is None or (isinstance(value, float) and np.isnan(value)) or str(value).strip() == '':
+            errors.append(f"Missing field '{field}'")
+            continue
+
+        if field in NUMERIC_FIELDS:
+            try:
+                number = float(value)
+                if not number.is_integer() or number < 0:
+                    raise ValueError
+                car[field] = int(number)
+            except (TypeError, ValueError):
+                errors.append(f"Field '{field}' must be a non-negative integer, got '{value}'")
+        else:
+            car[field] = str(value).strip()
+
+    if not errors and encoder is not None:
+        for field in CATEGORICAL_FIELDS:
+            if encoder.column_for(field, car[field]) is None:
+                errors.append(f"Unknown {field} '{car[field]}'")
+
+    return (None, errors) if errors else (car, [])
+
+
+def encode_cars(cars, encoder):
+    """Encode a list of cars into a float64 matrix (CSR for large batches) aligned to the model columns."""
+    if len(cars) == 1:
+        return encoder.transform_one(cars[0]).reshape(1, -1)
+    if len(cars) >= SPARSE_BATCH_MIN_ROWS:
+        return encoder.transform_sparse(cars)
+    return encoder.transform(cars)
+
+
+def predict_encoded(models, X):
+    """
+    Run LR, RF and XGBoost (plus the native-categorical model, if the snapshot has one) once over an encoded batch.
+
+    Returns:
+        dict: {'lr': ndarray, 'rf': ndarray, 'xgb': ndarray[, 'cat': ndarray]} giá dự đoán (float) cho từng dòng
+    """
+    # ------------------ Linear Regression -----------------
+    preds = {"lr": models.lr_scorer.predict_matrix(X)}
+
+    # ------- RF + XGBoost song song trong các process worker (nếu bật, chỉ batch lớn) -------
+    tree_preds = None
+    if inference_pool.accepts(X.shape[0]) and models.rf_compiled is not None and models.xgb_compiled is not None:
+        try:
+            tree_preds = inference_pool.predict_trees(models, X)
+        except Exception as e:
+            logger.error(f"Inference pool error, predicting in-process: {e}")
+
+    if tree_preds is None:
+        tree_preds = {
+            # ------------------- Random Forest ------------------
+            "rf": _predict_trees(models.rf_model, models.rf_compiled, X),
+            # -------------------- XGBoost --------------------
+            "xgb": _predict_trees(models.xgb_model, models.xgb_compiled, X),
+        }
+    preds.update(tree_preds)
+
+    # ------ Native categorical: 9 cột (số + mã category) thay vì hàng one-hot ------
+    if models.cat_codes is not None:
+        preds["cat"] = predict_categorical(models, X)
+    return preds
+
+
+def predict_categorical(models, X):
+    """Price encoded one-hot rows with the native-categorical model (codes are read off the one-hot columns)."""
+    return predict_aligned(models.cat_model, models.cat_codes.from_one_hot(X))
+
+
+def _predict_trees(model, compiled, X):
+    """Use the compiled NumPy ensemble for small batches, the native model otherwise."""
+    if compiled is not None and (model is None or X.shape[0] * compiled.n_trees <= COMPILED_TREES_MAX_CELLS):
+        # Model nạp từ bundle có thể chỉ có dạng mảng nút (không có model gốc)
+        return compiled.predict(X)
+    if sparse.issparse(X) and not accepts_sparse(model):
+        # XGBoost train trên ma trận dense (missing=NaN) sẽ coi ô trống của CSR là missing, không phải 0
+        X = X.toarray()
+    return predict_aligned(model, X)
+
+
+def predict_batch(records, models):
+    """
+    Validate, encode and price many cars with one call per model.
+
+    Args:
+        records (list): Danh sách dict thông tin xe
+        models: ModelSnapshot từ model registry
+
+    Returns:
+        list: Một phần tử cho mỗi dòng đầu vào, theo đúng thứ tự:
+              {'index', 'success', 'prediction'} hoặc {'index', 'success', 'errors'}
+    """
+    results = [None] * len(records)
+    valid_cars = []
+    valid_index = []
+
+    for idx, raw in enumerate(records):
+        car, errors = validate_car(raw, models.encoder)
+        if errors:
+            results[idx] = {'index': idx, 'success': False, 'errors': errors}
+        else:
+            valid_cars.append(car)
+            valid_index.append(idx)
+
+    if valid_cars:
+        input_encoded = encode_cars(valid_cars, models.encoder)
+        preds = predict_encoded(models, input_encoded)
+        for pos, idx in enumerate(valid_index):
+            prediction = {name: int(round(float(values[pos]))) for name, values in preds.items()}
+            # Giá trung bình vẫn là của 3 model gốc; 'cat' (nếu có) được trả về riêng
+            prediction['avg'] = (prediction['lr'] + prediction['rf'] + prediction['xgb']) / 3
+            results[idx] = {'index': idx, 'success': True, 'prediction': prediction}
+
+    logger.info(f"Batch prediction: {len(valid_cars)}/{len(records)} rows priced")
+    return results
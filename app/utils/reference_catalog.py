@@ -0,0 +1,211 @@
+"""
+In-memory catalog of the reference tables (brands, models, car types, fuel
+types, transmissions, years, seats, origins).
+
+The catalog is built from the database once and reused by the /predict page
+and the dropdown APIs, so every lookup is a dictionary read. `import_data_to_db`
+calls `invalidate()` after it commits, which bumps the version and makes the
+next `get()` rebuild it.
+"""
+import hashlib
+import json
+import logging
+import threading
+import time
+from collections import namedtuple
+
+logger = logging.getLogger(__name__)
+
+# Bản ghi chỉ đọc, cùng tên thuộc tính với các model SQLAlchemy để template dùng được như cũ
+BrandEntry = namedtuple('BrandEntry', ['id', 'name'])
+ModelEntry = namedtuple('ModelEntry', ['id', 'name', 'brand_id'])
+CarTypeEntry = namedtuple('CarTypeEntry', ['id', 'category', 'model_id'])
+FuelTypeEntry = namedtuple('FuelTypeEntry', ['id', 'type'])
+TransmissionEntry = namedtuple('TransmissionEntry', ['id', 'transmission'])
+YearEntry = namedtuple('YearEntry', ['id', 'year'])
+SeatEntry = namedtuple('SeatEntry', ['id', 'seat'])
+OriginEntry = namedtuple('OriginEntry', ['id', 'name'])
+
+
+def _by_id(entries):
+    return {entry.id: entry for entry in entries}
+
+
+class CatalogSnapshot:
+    """Immutable view of the reference tables at one catalog version."""
+
+    def __init__(self, version, brands, models, car_types, fuel_types, transmissions, years, seats, origins):
+        self.version = version
+        self.built_at = time.time()
+        self._serialized = None
+
+        # Danh sách đã sắp xếp sẵn theo thứ tự hiển thị trên dropdown
+        self.brands = sorted(brands, key=lambda b: b.name)
+        self.fuel_types = sorted(fuel_types, key=lambda f: f.id)
+        self.transmissions = sorted(transmissions, key=lambda t: t.id)
+        self.years = sorted(years, key=lambda y: y.year, reverse=True)
+        self.seats = sorted(seats, key=lambda s: s.seat)
+        self.origins = sorted(origins, key=lambda o: o.id)
+
+        self.brand_by_id = _by_id(brands)
+        self.model_by_id = _by_id(models)
+        self.car_type_by_id = _by_id(car_types)
+        self.fuel_type_by_id = _by_id(fuel_types)
+        self.transmission_by_id = _by_id(transmissions)
+        self.year_by_id = _by_id(years)
+        self.seat_by_id = _by_id(seats)
+        self.origin_by_id = _by_id(origins)
+
+        # Cây brand -> model -> car_type
+        self.models_by_brand = {}
+        for model in sorted(models, key=lambda m: m.id):
+            self.models_by_brand.setdefault(model.brand_id, []).append(model)
+        self.car_types_by_model = {}
+        for car_type in sorted(car_types, key=lambda c: c.id):
+            self.car_types_by_model.setdefault(car_type.model_id, []).append(car_type)
+
+    @staticmethod
+    def _lookup(table, key):
+        """Look up an id given as int or form string; returns None when missing or invalid."""
+        try:
+            return table.get(int(key))
+        except (TypeError, ValueError):
+            return None
+
+    def brand(self, brand_id):
+        return self._lookup(self.brand_by_id, brand_id)
+
+    def model(self, model_id):
+        return self._lookup(self.model_by_id, model_id)
+
+    def car_type(self, car_type_id):
+        return self._lookup(self.car_type_by_id, car_type_id)
+
+    def fuel_type(self, fuel_type_id):
+        return self._lookup(self.fuel_type_by_id, fuel_type_id)
+
+    def transmission(self, transmission_id):
+        return self._lookup(self.transmission_by_id, transmission_id)
+
+    def year(self, year_id):
+        return self._lookup(self.year_by_id, year_id)
+
+    def seat(self, seat_id):
+        return self._lookup(self.seat_by_id, seat_id)
+
+    def origin(self, origin_id):
+        return self._lookup(self.origin_by_id, origin_id)
+
+    def models_for_brand(self, brand_id):
+        return self.models_by_brand.get(brand_id, [])
+
+    def car_types_for_model(self, model_id):
+        return self.car_types_by_model.get(model_id, [])
+
+    def to_payload(self):
+        """
+        Compact JSON-ready view of the whole catalog.
+
+        brands là cây [brand_id, name, [[model_id, name, [[car_type_id, category], ...]], ...]];
+        các bảng còn lại là danh sách [id, giá trị] theo đúng thứ tự dropdown.
+        """
+        return {
+            'brands': [
+                [brand.id, brand.name, [
+                    [model.id, model.name, [[c.id, c.category] for c in self.car_types_for_model(model.id)]]
+                    for model in self.models_for_brand(brand.id)
+                ]]
+                for brand in self.brands
+            ],
+            'fuel_types': [[f.id, f.type] for f in self.fuel_types],
+            'transmissions': [[t.id, t.transmission] for t in self.transmissions],
+            'years': [[y.id, y.year] for y in self.years],
+            'seats': [[s.id, s.seat] for s in self.seats],
+            'origins': [[o.id, o.name] for o in self.origins],
+        }
+
+    def serialized(self):
+        """Return (json_bytes, etag) for the catalog payload, computed once per snapshot."""
+        cached = self._serialized
+        if cached is None:
+            body = json.dumps(self.to_payload(), ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+            # ETag theo nội dung: mọi process có cùng bảng tham chiếu trả cùng ETag
+            cached = (body, hashlib.sha256(body).hexdigest()[:32])
+            self._serialized = cached
+        return cached
+
+
+class ReferenceCatalog:
+    """Lazily built, version-invalidated cache of the reference tables."""
+
+    def __init__(self, max_age=300):
+        """
+        Args:
+            max_age (float): Số giây tối đa dùng lại một bản catalog (0 để không giới hạn).
+                Giúp các process khác thấy dữ liệu mới khi import chạy ở process khác.
+        """
+        self.max_age = max_age
+
+        self._lock = threading.Lock()
+        self._snapshot = None
+        self._version = 1
+
+    @property
+    def version(self):
+        return self._version
+
+    def configure(self, max_age=None):
+        """Change the catalog settings; the current snapshot is dropped."""
+        if max_age is not None:
+            self.max_age = max_age
+        self.invalidate()
+
+    def invalidate(self):
+        """Bump the version so the next get() rebuilds the catalog from the database."""
+        with self._lock:
+            self._version += 1
+            self._snapshot = None
+        logger.info(f"Reference catalog invalidated (version {self._version})")
+
+    def get(self):
+        """Return the current CatalogSnapshot, querying the database only when needed (needs an app context)."""
+        snapshot = self._snapshot
+        if snapshot is not None and (not self.max_age or time.time() - snapshot.built_at < self.max_age):
+            return snapshot
+
+        with self._lock:
+            snapshot = self._snapshot
+            if snapshot is None or (self.max_age and time.time() - snapshot.built_at >= self.max_age):
+                snapshot = self._build(self._version)
+                self._snapshot = snapshot
+            return snapshot
+
+    @staticmethod
+    def _build(version):
+        from app.models import Brand, Model, CarType, FuelType, Transmission, Year, Seat, Origin
+
+        snapshot = CatalogSnapshot(
+            version,
+            brands=[BrandEntry(b.id, b.name) for b in Brand.query.all()],
+            models=[ModelEntry(m.id, m.name, m.brand_id) for m in Model.query.all()],
+            car_types=[CarTypeEntry(c.id, c.category, c.model_id) for c in CarType.query.all()],
+            fuel_types=[FuelTypeEntry(f.id, f.type) for f in FuelType.query.all()],
+            transmissions=[TransmissionEntry(t.id, t.transmission) for t in Transmission.query.all()],
+            years=[YearEntry(y.id, y.year) for y in Year.query.all()],
+            seats=[SeatEntry(s.id, s.seat) for s in Seat.query.all()],
+            origins=[OriginEntry(o.id, o.name) for o in Origin.query.all()],
+        )
+        logger.info(f"Reference catalog v{version} built: {len(snapshot.brands)} brands, "
+                    f"{len(snapshot.model_by_id)} models, {len(snapshot.car_type_by_id)} car types")
+        return snapshot
+
+
+# Catalog dùng chung cho toàn bộ process
+reference_catalog = ReferenceCatalog()
+
+
+def configure_reference_catalog(app):
+    """Configure the shared reference catalog for the Flask application."""
+    app.config.setdefault('REFERENCE_CATALOG_MAX_AGE', 300)
+    reference_catalog.configure(max_age=app.config['REFERENCE_CATALOG_MAX_AGE'])
+    return reference_catalog
@@ -0,0 +1,197 @@
+"""
+Persistent index of crawled chotot listings.
+
+Every listing written by the crawler is recorded by ID (extract_car_id) with
+its last-crawled time and a hash of its content. The index lives in a small
+SQLite file next to data/raw/raw.csv (CRAWLER_SEEN_INDEX), so it works with
+or without a Flask app context. The crawler uses it to:
+
+- skip the detail page of a listing crawled less than CRAWLER_SEEN_TTL_DAYS
+  ago, and refresh it once it is older than that;
+- append a refreshed listing to raw.csv only when its content hash changed
+  (price, mileage, ...); otherwise only its last-crawled time moves;
+- stop a page range early once CRAWLER_STOP_AFTER_KNOWN_PAGES consecutive
+  listing pages contain only listings already in the index.
+
+A monthly crawl then costs in proportion to the new listings instead of the
+whole market. On first use the index is seeded from the rows already in
+raw.csv.
+
+Mô phỏng crawl hằng tháng trên server giả (từ thư mục gốc project):
+    python -m app.utils.seen_index [n_pages] [latency_ms]
+"""
+import csv
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+from datetime import datetime, timedelta
+
+logger = logging.getLogger(__name__)
+
+# Không đưa vào hash: thời điểm crawl và "Đăng x phút trước" thay đổi ở mỗi lần crawl
+VOLATILE_FIELDS = ('crawl_time', 'post_time')
+
+# Kết quả của classify()
+NEW, CHANGED, UNCHANGED = 'new', 'changed', 'unchanged'
+
+
+def content_hash(car_data):
+    """Hash of a listing's stable fields (values compared as strings, empty values ignored)."""
+    stable = {key: str(value) for key, value in car_data.items()
+              if key not in VOLATILE_FIELDS and value not in (None, '')}
+    return hashlib.sha1(json.dumps(stable, sort_keys=True, ensure_ascii=False).encode('utf-8')).hexdigest()
+
+
+class SeenListingIndex:
+    """SQLite-backed map listing_id -> (first seen, last crawled, content hash)."""
+
+    def __init__(self, path, ttl_days=30):
+        """
+        Args:
+            path (str): File SQLite của index
+            ttl_days (float): Tin đã crawl trong chừng này ngày thì không tải lại trang chi tiết
+        """
+        self.path = path
+        self.ttl = timedelta(days=ttl_days)
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS seen_listings ("
+                " listing_id TEXT PRIMARY KEY,"
+                " first_seen TEXT NOT NULL,"
+                " last_crawled TEXT NOT NULL,"
+                " content_hash TEXT,"
+                " crawl_count INTEGER NOT NULL DEFAULT 1)"
+            )
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM seen_listings").fetchone()[0]
+
+    def _lookup(self, listing_ids):
+        ids = [str(i) for i in listing_ids if i]
+        found = {}
+        with self._lock:
+            # Chia nhỏ để không vượt giới hạn số tham số của SQLite
+            for start in range(0, len(ids), 500):
+                chunk = ids[start:start + 500]
+                rows = self._conn.execute(
+                    f"SELECT listing_id, last_crawled, content_hash FROM seen_listings "
+                    f"WHERE listing_id IN ({','.join('?' * len(chunk))})", chunk
+                ).fetchall()
+                found.update({row[0]: (datetime.fromisoformat(row[1]), row[2]) for row in rows})
+        return found
+
+    def known(self, listing_ids):
+        """Return the subset of IDs already in the index."""
+        return set(self._lookup(listing_ids))
+
+    def fresh(self, listing_ids, now=None):
+        """Return the subset of IDs crawled less than the TTL ago (their detail pages can be skipped)."""
+        cutoff = (now or datetime.now()) - self.ttl
+        return {listing_id for listing_id, (last_crawled, _) in self._lookup(listing_ids).items()
+                if last_crawled > cutoff}
+
+    def classify(self, car_data):
+        """
+        Compare a crawled listing with the index (nothing is written).
+
+        Returns:
+            tuple: (NEW | CHANGED | UNCHANGED, content hash)
+        """
+        digest = content_hash(car_data)
+        previous = self._lookup([car_data.get('id')]).get(str(car_data.get('id')))
+        if previous is None:
+            return NEW, digest
+        return (UNCHANGED if previous[1] == digest else CHANGED), digest
+
+    def mark(self, listing_id, digest, crawled_at=None):
+        """Record that a listing was crawled (insert or refresh)."""
+        if not listing_id:
+            return
+        crawled_at = (crawled_at or datetime.now()).isoformat(timespec='seconds')
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT INTO seen_listings (listing_id, first_seen, last_crawled, content_hash) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT(listing_id) DO UPDATE SET last_crawled = excluded.last_crawled, "
+                "content_hash = excluded.content_hash, crawl_count = crawl_count + 1",
+                (str(listing_id), crawled_at, crawled_at, digest),
+            )
+
+    def seed_from_csv(self, csv_path, fieldnames):
+        """Fill an empty index from an existing raw CSV (rows without header, in `fieldnames` order)."""
+        if len(self) or not os.path.exists(csv_path):
+            return 0
+        rows = []
+        with open(csv_path, encoding='utf-8-sig', newline='') as f:
+            for values in csv.reader(f):
+                if not values or values[0] in ('', 'id'):
+                    continue
+                car_data = dict(zip(fieldnames, values))
+                try:
+                    crawled_at = datetime.strptime(car_data.get('crawl_time', ''), '%Y-%m-%d %H:%M:%S')
+                except ValueError:
+                    crawled_at = datetime.now()
+                rows.append((car_data['id'], crawled_at.isoformat(timespec='seconds'), content_hash(car_data)))
+        with self._lock, self._conn:
+            # Dòng sau (mới hơn) của cùng một tin ghi đè dòng trước
+            self._conn.executemany(
+                "INSERT INTO seen_listings (listing_id, first_seen, last_crawled, content_hash) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT(listing_id) DO UPDATE SET last_crawled = excluded.last_crawled, "
+                "content_hash = excluded.content_hash, crawl_count = crawl_count + 1",
+                [(listing_id, crawled, crawled, digest) for listing_id, crawled, digest in rows],
+            )
+        logger.info(f"Seeded seen-listing index with {len(rows)} rows from {csv_path}")
+        return len(rows)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+if __name__ == "__main__":
+    import contextlib
+    import io
+    import sys
+    import tempfile
+    import time
+    from app.utils.async_crawler import AsyncChototXeCrawler, _serve_fake_chotot
+    from app.utils.http_pool import HttpPool
+
+    n_pages = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+    latency_ms = float(sys.argv[2]) if len(sys.argv) > 2 else 100
+    logging.basicConfig(level=logging.WARNING)
+    server = _serve_fake_chotot(n_pages, 20, latency_ms / 1000.0)
+    base_url = f"http://127.0.0.1:{server.server_address[1]}/mua-ban-oto"
+    os.chdir(tempfile.mkdtemp())
+
+    def crawl(start_page, end_page, index):
+        crawler = AsyncChototXeCrawler(start_page, end_page, concurrency=8, http=HttpPool(pool_size=8),
+                                       seen_index=index)
+        crawler.base_url = base_url
+        started = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            crawler.crawl_pages()
+        return crawler, time.perf_counter() - started
+
+    # Lần trước đã crawl trang 2-4; nay trang 1 là tin mới đăng, các trang sau là tin cũ
+    index = SeenListingIndex(os.path.join('data', 'raw', 'seen_listings.db'))
+    crawl(2, 4, index)
+    print(f"{n_pages} pages x 20 cars, {latency_ms:.0f} ms latency, {len(index)} listings already in the index")
+    print(f"  {'crawl':<12} {'pages':>5} {'details':>7} {'saved':>5} {'skipped':>7} {'seconds':>8}")
+    for name, crawl_index in (('full', None), ('incremental', index)):
+        crawler, seconds = crawl(1, n_pages, crawl_index)
+        print(f"  {name:<12} {crawler.pages_done:>5} {crawler.details_fetched:>7} {crawler.cars_count:>5} "
+              f"{crawler.skipped_known:>7} {seconds:>8.2f}")
+
+    # Làm mới sau TTL: tin không đổi chỉ cập nhật last_crawled, không ghi thêm dòng vào CSV
+    stale = SeenListingIndex(index.path, ttl_days=0)
+    crawler, seconds = crawl(1, 1, stale)
+    print(f"  {'ttl expired':<12} {crawler.pages_done:>5} {crawler.details_fetched:>7} {crawler.cars_count:>5} "
+          f"{crawler.unchanged:>7} {seconds:>8.2f}  (last column: refreshed unchanged)")
+    server.shutdown()
@@ -0,0 +1,297 @@
+"""
+Shared feature build for the trainers.
+
+cleaned.csv is parsed and one-hot encoded once into a sparse CSR design
+matrix, together with the column vocabulary and a fixed train/test split:
+
+    data/features/<key>/
+        X.npz           ma trận đặc trưng CSR (cột số trước, sau đó các cột one-hot)
+        y.npy           giá xe
+        split.npz       chỉ số dòng train / test
+        rows.npy        hash từng dòng của cleaned.csv (để tìm dòng mới khi train incremental)
+        meta.json       thứ tự cột, hash dữ liệu, tham số chia tập
+
+`key` is a hash of the input file's content and the split parameters, so a
+retrain on unchanged data reuses the artifact and every trainer sees exactly
+the same columns and the same split. The column order is the one
+`pd.get_dummies` produced before, so model_columns.pkl does not change.
+
+Chạy thử (từ thư mục gốc project):
+    python -m src.features.feature_engineering [path/to/cleaned.csv]
+"""
+import os
+import json
+import time
+import shutil
+import hashlib
+import tempfile
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+
+FEATURE_FORMAT = 2
+
+# Cùng danh sách cột mà các trainer vẫn truyền cho pd.get_dummies
+CATEGORICAL_COLUMNS = ["brand", "model", "fuel_type", "transmission", "origin", "car_type"]
+TARGET_COLUMN = "price"
+
+META_FILE = "meta.json"
+
+
+def default_data_path():
+    """cleaned.csv relative to the working directory, as the trainers always read it."""
+    return os.path.abspath(os.path.join(os.getcwd(), "data", "preprocessing", "cleaned.csv"))
+
+
+def default_cache_dir(data_path):
+    """data/features, next to the data/preprocessing folder of `data_path`."""
+    return os.path.abspath(os.path.join(os.path.dirname(data_path), "..", "features"))
+
+
+def file_hash(path, chunk_size=1024 * 1024):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def row_hashes(df):
+    """
+    64-bit hash of every row, independent of the dtypes pandas happened to infer
+    (số -> float64, còn lại -> str), so the same listing hashes the same in every crawl.
+    """
+    canonical = pd.DataFrame({
+        name: df[name].astype(np.float64) if pd.api.types.is_numeric_dtype(df[name]) else df[name].astype(str)
+        for name in df.columns
+    })
+    return pd.util.hash_pandas_object(canonical, index=False).to_numpy(dtype=np.uint64)
+
+
+def feature_key(data_hash, test_size=0.2, random_state=42):
+    """Cache key of a feature build: input content + split parameters + format version."""
+    raw = json.dumps([FEATURE_FORMAT, data_hash, test_size, random_state])
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()[:24]
+
+
+def encode_frame(df, categorical=CATEGORICAL_COLUMNS, target=TARGET_COLUMN):
+    """
+    One-hot encode a cleaned DataFrame straight into CSR, without a dense dummy frame.
+
+    Returns:
+        (X, columns, numeric_columns, y): X là csr_matrix float64, columns giống hệt
+        pd.get_dummies(df, columns=categorical).drop(target).columns
+    """
+    features = df.drop(columns=[target])
+    numeric_columns = [c for c in features.columns if c not in categorical]
+    n_rows = len(features)
+
+    blocks = [sp.csr_matrix(features[numeric_columns].to_numpy(dtype=np.float64))]
+    columns = list(numeric_columns)
+    for name in categorical:
+        # Cùng thứ tự category (đã sắp xếp) như pd.get_dummies
+        values = pd.Categorical(features[name])
+        codes = values.codes
+        present = codes >= 0
+        blocks.append(sp.csr_matrix(
+            (np.ones(present.sum()), (np.nonzero(present)[0], codes[present])),
+            shape=(n_rows, len(values.categories)),
+        ))
+        columns.extend(f"{name}_{category}" for category in values.categories)
+
+    X = sp.hstack(blocks, format="csr")
+    y = df[target].to_numpy(dtype=np.float64)
+    return X, columns, numeric_columns, y
+
+
+def encode_with_columns(df, columns, categorical=CATEGORICAL_COLUMNS, target=TARGET_COLUMN):
+    """
+    One-hot encode a cleaned DataFrame onto an existing vocabulary (the columns a model was trained on).
+
+    Category chưa có trong vocabulary bị bỏ (one-hot toàn 0, giống lúc dự đoán).
+
+    Returns:
+        (X, y, unseen): X là csr_matrix với đúng `columns`, unseen đánh dấu các dòng có category mới
+    """
+    X, own_columns, numeric_columns, y = encode_frame(df, categorical, target)
+    position = {column: i for i, column in enumerate(columns)}
+    missing = [column for column in numeric_columns if column not in position]
+    if missing:
+        raise ValueError(f"Numeric columns {missing} are not in the model's columns")
+
+    mapping = np.array([position.get(column, -1) for column in own_columns], dtype=np.int64)
+    coo = X.tocoo()
+    mapped = mapping[coo.col]
+    known = mapped >= 0
+    unseen = np.zeros(X.shape[0], dtype=bool)
+    unseen[coo.row[~known]] = True
+    X = sp.csr_matrix((coo.data[known], (coo.row[known], mapped[known])), shape=(X.shape[0], len(columns)))
+    return X, y, unseen
+
+
+class FeatureSet:
+    """Encoded design matrix, vocabulary and train/test split shared by the trainers."""
+
+    def __init__(self, X, y, columns, numeric_columns, train_idx, test_idx, meta=None, directory=None,
+                 row_hashes=None):
+        self.X = X
+        self.y = y
+        self.columns = list(columns)
+        self.numeric_columns = list(numeric_columns)
+        self.train_idx = train_idx
+        self.test_idx = test_idx
+        self.meta = meta or {}
+        self.directory = directory
+        self.row_hashes = row_hashes
+
+    @property
+    def key(self):
+        return self.meta.get("key")
+
+    @property
+    def data_hash(self):
+        return self.meta.get("data_hash")
+
+    @property
+    def test_mask(self):
+        """Boolean mask of the test rows."""
+        mask = np.zeros(self.X.shape[0], dtype=bool)
+        mask[self.test_idx] = True
+        return mask
+
+    @property
+    def numeric_indices(self):
+        return [self.columns.index(c) for c in self.numeric_columns]
+
+    def split(self, X=None, y=None):
+        """Return (X_train, X_test, y_train, y_test) using the shared split (defaults: the CSR matrix and prices)."""
+        X = self.X if X is None else X
+        y = self.y if y is None else y
+        return X[self.train_idx], X[self.test_idx], y[self.train_idx], y[self.test_idx]
+
+    def validation_split(self, fraction=0.1, random_state=42):
+        """Split the shared train rows again into (fit_idx, validation_idx), e.g. for early stopping."""
+        from sklearn.model_selection import train_test_split
+
+        return train_test_split(self.train_idx, test_size=fraction, random_state=random_state)
+
+    def dense(self, dtype=np.float32):
+        """Dense copy of X, for estimators that treat absent sparse entries as missing (XGBoost)."""
+        return self.X.astype(dtype).toarray()
+
+    def save(self, directory):
+        """Write the feature set into `directory` atomically (staged in a sibling temp folder)."""
+        parent = os.path.dirname(os.path.abspath(directory))
+        os.makedirs(parent, exist_ok=True)
+        tmp_dir = tempfile.mkdtemp(prefix=".features-", dir=parent)
+        try:
+            sp.save_npz(os.path.join(tmp_dir, "X.npz"), self.X, compressed=False)
+            np.save(os.path.join(tmp_dir, "y.npy"), self.y)
+            np.savez(os.path.join(tmp_dir, "split.npz"), train=self.train_idx, test=self.test_idx)
+            if self.row_hashes is not None:
+                np.save(os.path.join(tmp_dir, "rows.npy"), self.row_hashes)
+            meta = dict(self.meta, columns=self.columns, numeric_columns=self.numeric_columns)
+            with open(os.path.join(tmp_dir, META_FILE), "w", encoding="utf-8") as f:
+                json.dump(meta, f, ensure_ascii=False)
+            try:
+                os.rename(tmp_dir, directory)
+            except OSError:
+                # Process khác vừa ghi cùng key (cùng nội dung) - dùng bản của nó
+                if not os.path.exists(os.path.join(directory, META_FILE)):
+                    raise
+                shutil.rmtree(tmp_dir, ignore_errors=True)
+        except Exception:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            raise
+        self.directory = directory
+        return directory
+
+    @classmethod
+    def load(cls, directory):
+        with open(os.path.join(directory, META_FILE), encoding="utf-8") as f:
+            meta = json.load(f)
+        split = np.load(os.path.join(directory, "split.npz"))
+        rows_path = os.path.join(directory, "rows.npy")
+        return cls(
+            sp.load_npz(os.path.join(directory, "X.npz")).tocsr(),
+            np.load(os.path.join(directory, "y.npy")),
+            meta.pop("columns"),
+            meta.pop("numeric_columns"),
+            split["train"],
+            split["test"],
+            meta=meta,
+            directory=directory,
+            row_hashes=np.load(rows_path) if os.path.exists(rows_path) else None,
+        )
+
+
+def build_features(data_path=None, cache_dir=None, test_size=0.2, random_state=42, force=False):
+    """
+    Return the FeatureSet for `data_path`, building and caching it only if its content is new.
+
+    Args:
+        data_path (str): File cleaned.csv (mặc định data/preprocessing/cleaned.csv theo thư mục hiện tại)
+        cache_dir (str): Nơi lưu các bản build (mặc định data/features cạnh thư mục của data_path)
+        test_size, random_state: Tham số chia tập, giống train_test_split các trainer dùng trước đây
+        force (bool): Build lại kể cả khi đã có trong cache
+    """
+    from sklearn.model_selection import train_test_split
+
+    data_path = data_path or default_data_path()
+    cache_dir = cache_dir or default_cache_dir(data_path)
+    data_hash = file_hash(data_path)
+    key = feature_key(data_hash, test_size, random_state)
+    directory = os.path.join(cache_dir, key)
+
+    if not force and os.path.exists(os.path.join(directory, META_FILE)):
+        return FeatureSet.load(directory)
+
+    start = time.perf_counter()
+    df = pd.read_csv(data_path)
+    X, columns, numeric_columns, y = encode_frame(df)
+    # Cùng hoán vị với train_test_split(X, y, ...) trước đây: chỉ phụ thuộc số dòng và random_state
+    train_idx, test_idx = train_test_split(np.arange(len(df)), test_size=test_size, random_state=random_state)
+
+    features = FeatureSet(X, y, columns, numeric_columns, train_idx, test_idx, row_hashes=row_hashes(df), meta={
+        "format": FEATURE_FORMAT,
+        "key": key,
+        "data_hash": data_hash,
+        "data_path": os.path.abspath(data_path),
+        "n_rows": int(X.shape[0]),
+        "test_size": test_size,
+        "random_state": random_state,
+        "build_seconds": time.perf_counter() - start,
+        "created_at": time.time(),
+    })
+    if force and os.path.exists(directory):
+        shutil.rmtree(directory, ignore_errors=True)
+    features.save(directory)
+    return features
+
+
+if __name__ == "__main__":
+    import sys
+
+    from sklearn.model_selection import train_test_split  # noqa: F401 - import trước, không tính vào thời gian build
+
+    path = sys.argv[1] if len(sys.argv) > 1 else default_data_path()
+
+    start = time.perf_counter()
+    df = pd.read_csv(path)
+    expected = pd.get_dummies(df, columns=CATEGORICAL_COLUMNS).drop(TARGET_COLUMN, axis=1)
+    dummies_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    features = build_features(path, force=True)
+    build_seconds = time.perf_counter() - start
+    start = time.perf_counter()
+    features = build_features(path)
+    cached_seconds = time.perf_counter() - start
+
+    assert features.columns == expected.columns.tolist()
+    assert np.array_equal(features.X.toarray(), expected.to_numpy(dtype=np.float64))
+    nnz = features.X.nnz / np.prod(features.X.shape)
+    print(f"{features.X.shape[0]} rows x {features.X.shape[1]} columns, density {nnz:.2%}, key {features.key}")
+    print(f"read_csv + get_dummies : {dummies_seconds * 1e3:8.1f} ms (mỗi trainer, trước đây x3)")
+    print(f"build + save           : {build_seconds * 1e3:8.1f} ms")
+    print(f"load from cache        : {cached_seconds * 1e3:8.1f} ms")
@@ -0,0 +1,166 @@
+"""
+Compiled Linear Regression scorer.
+
+The LR model sees only one-hot columns plus three scaled numerics, so its
+prediction in VND is
+
+    price = base + sum(slope[k] * numeric[k]) + sum(contribution[field][category])
+
+with scaler_X, scaler_y and lr_model.coef_ folded into ``base``, ``slope`` and
+per-category dictionaries. Scoring is a handful of lookups and adds; sklearn is
+not touched at request time.
+
+Chạy benchmark (từ thư mục gốc project):
+    python -m src.models.compiled_lr [path/to/models_dir]
+"""
+import numpy as np
+from src.models.feature_encoder import FeatureEncoder, predict_aligned
+
+
+def _scaler_params(scaler, n):
+    """Return (mean, scale) arrays of a fitted StandardScaler, honoring with_mean/with_std."""
+    mean = np.asarray(scaler.mean_, dtype=np.float64) if getattr(scaler, "mean_", None) is not None else np.zeros(n)
+    scale = np.asarray(scaler.scale_, dtype=np.float64) if getattr(scaler, "scale_", None) is not None else np.ones(n)
+    return mean, scale
+
+
+class CompiledLinearRegression:
+    """Per-category coefficient tables equivalent to scaler_X -> LinearRegression -> scaler_y."""
+
+    def __init__(self, encoder, lr_model, scaler_X, scaler_y):
+        """Fold the scalers and LR coefficients into lookup tables."""
+        coef = np.asarray(lr_model.coef_, dtype=np.float64).reshape(-1)
+        intercept = float(np.asarray(lr_model.intercept_, dtype=np.float64).reshape(-1)[0])
+        y_mean, y_scale = _scaler_params(scaler_y, 1)
+        x_mean, x_scale = _scaler_params(scaler_X, len(encoder.numeric_index))
+        self._fold(encoder, coef, intercept, x_mean, x_scale, float(y_mean[0]), float(y_scale[0]))
+
+    @classmethod
+    def from_params(cls, encoder, coef, intercept, x_mean, x_scale, y_mean, y_scale):
+        """Build the scorer from raw LR coefficients and scaler parameters (e.g. from a model bundle)."""
+        scorer = cls.__new__(cls)
+        scorer._fold(encoder, np.asarray(coef, dtype=np.float64).reshape(-1), float(intercept),
+                     np.asarray(x_mean, dtype=np.float64), np.asarray(x_scale, dtype=np.float64),
+                     float(y_mean), float(y_scale))
+        return scorer
+
+    def _fold(self, encoder, coef, intercept, x_mean, x_scale, y_mean, y_scale):
+        self.encoder = encoder
+        if coef.shape[0] != encoder.n_features:
+            raise ValueError(f"LR model has {coef.shape[0]} coefficients, expected {encoder.n_features}")
+
+        # Hệ số trên giá trị gốc (chưa scale) của cột số, đã quy về VND
+        base = intercept
+        self.numeric_slopes = []
+        for k, (field, i) in enumerate(encoder.numeric_index):
+            self.numeric_slopes.append((field, coef[i] / x_scale[k] * y_scale))
+            base -= coef[i] * x_mean[k] / x_scale[k]
+        self.base = y_mean + y_scale * base
+
+        # Đóng góp (VND) của từng category
+        self.contributions = {
+            field: {category: coef[i] * y_scale for category, i in categories.items()}
+            for field, categories in encoder.category_index.items()
+        }
+
+        self._tables = tuple(self.contributions.items())
+        self._slopes = tuple(self.numeric_slopes)
+
+        # Dạng vector cho ma trận đã mã hóa: price = X @ weights + base
+        self.weights = coef * y_scale
+        for k, (field, i) in enumerate(encoder.numeric_index):
+            self.weights[i] = coef[i] / x_scale[k] * y_scale
+
+    @classmethod
+    def from_models(cls, model_columns, lr_model, scaler_X, scaler_y):
+        """Build the scorer straight from the pickled training artifacts."""
+        return cls(FeatureEncoder(model_columns), lr_model, scaler_X, scaler_y)
+
+    def predict_one(self, car):
+        """Predict the price (VND, float) of one car dict (category values as strings)."""
+        price = self.base
+        for field, slope in self._slopes:
+            price += slope * car[field]
+        for field, table in self._tables:
+            price += table.get(car[field], 0.0)
+        return price
+
+    def predict(self, cars):
+        """Vectorized prediction for a list of car dicts (category values as strings)."""
+        n_rows = len(cars)
+        prices = np.full(n_rows, self.base, dtype=np.float64)
+        for field, slope in self._slopes:
+            prices += slope * np.fromiter((car[field] for car in cars), dtype=np.float64, count=n_rows)
+        for field, table in self._tables:
+            prices += np.fromiter((table.get(car[field], 0.0) for car in cars), dtype=np.float64, count=n_rows)
+        return prices
+
+    def predict_matrix(self, X):
+        """Predict from rows already encoded by FeatureEncoder (dense or CSR)."""
+        return np.asarray(X @ self.weights).reshape(-1) + self.base
+
+
+def benchmark_lr(model_dir, cars, repeat=200):
+    """Check the compiled scorer against sklearn and time both."""
+    import os
+    import time
+    import joblib
+
+    model_columns = joblib.load(os.path.join(model_dir, "model_columns.pkl"))
+    lr_model = joblib.load(os.path.join(model_dir, "linear_regression_model.pkl"))
+    scaler_X = joblib.load(os.path.join(model_dir, "scaler_X.pkl"))
+    scaler_y = joblib.load(os.path.join(model_dir, "scaler_y.pkl"))
+
+    scorer = CompiledLinearRegression.from_models(model_columns, lr_model, scaler_X, scaler_y)
+    encoder = scorer.encoder
+    numeric_idx = [i for _, i in encoder.numeric_index]
+
+    def sklearn_predict(X):
+        X = X.copy()
+        X[:, numeric_idx] = scaler_X.transform(X[:, numeric_idx])
+        y = predict_aligned(lr_model, X)
+        return scaler_y.inverse_transform(np.asarray(y).reshape(-1, 1))[:, 0]
+
+    X = encoder.transform(cars)
+    expected = sklearn_predict(X)
+    for name, got in [("predict", scorer.predict(cars)),
+                      ("predict_matrix", scorer.predict_matrix(X)),
+                      ("predict_one", np.array([scorer.predict_one(car) for car in cars]))]:
+        rel_err = np.max(np.abs(got - expected) / np.abs(expected))
+        assert rel_err < 1e-9, f"{name}: max relative error {rel_err}"
+        print(f"  {name:<16}: max relative error vs sklearn {rel_err:.2e}")
+
+    def timeit(fn):
+        start = time.perf_counter()
+        for _ in range(repeat):
+            fn()
+        return (time.perf_counter() - start) / repeat
+
+    car = cars[0]
+    X1 = X[:1]
+    results = {
+        "single_sklearn": timeit(lambda: sklearn_predict(X1)),
+        "single_compiled": timeit(lambda: scorer.predict_one(car)),
+        "batch_sklearn": timeit(lambda: sklearn_predict(X)),
+        "batch_compiled_dicts": timeit(lambda: scorer.predict(cars)),
+        "batch_compiled_matrix": timeit(lambda: scorer.predict_matrix(X)),
+    }
+    print(f"LR benchmark (batch of {len(cars)} rows)")
+    for name, seconds in results.items():
+        print(f"  {name:<22}: {seconds * 1e6:12.2f} µs")
+    return results
+
+
+if __name__ == "__main__":
+    import os
+    import sys
+    import pandas as pd
+
+    root = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+    model_dir = sys.argv[1] if len(sys.argv) > 1 else os.path.join(root, "src", "models")
+
+    df = pd.read_csv(os.path.join(root, "data", "preprocessing", "cleaned.csv")).drop(columns=["price"])
+    df[["year", "mileage", "seats"]] = df[["year", "mileage", "seats"]].astype(int)
+    cars = df.head(1000).to_dict(orient="records")
+
+    benchmark_lr(model_dir, cars, repeat=50)
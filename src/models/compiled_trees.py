@@ -0,0 +1,423 @@
+"""
+Array-backed compiled inference for the Random Forest and XGBoost models.
+
+The trained ``RandomForestRegressor`` and XGBoost booster are flattened into
+contiguous NumPy arrays (feature, threshold, left, right, value) and evaluated
+in pure NumPy: every row walks every tree at once, one tree level per step.
+This skips sklearn input validation, DMatrix construction and thread dispatch,
+which dominate single-row and small-batch latency.
+
+Both split rules are normalized to ``x <= threshold``:
+- sklearn compares float32 inputs with ``x <= threshold``;
+- XGBoost compares float32 inputs with ``x < split_condition``, so the
+  condition is replaced by the next float32 value below it.
+XGBoost models trained with ``missing=0`` (sparse CSR training, where an
+absent entry is "missing") also keep each node's default direction, and an
+input equal to the missing value follows it, as in XGBoost.
+One-hot columns only take 0/1, so their splits reduce to a test on the bit;
+the evaluator gathers from a float32 copy of only the columns any tree uses.
+Leaves point to themselves; (row, tree) pairs that reach a leaf drop out of
+the active set, so deep but unbalanced forests only pay for the paths taken.
+
+Chạy kiểm tra tương đương + benchmark (từ thư mục gốc project):
+    python -m src.models.compiled_trees [path/to/models_dir]
+"""
+import json
+import numpy as np
+
+# Giới hạn số phần tử (dòng x cây) xử lý mỗi lượt để bộ nhớ tạm không quá lớn
+MAX_CHUNK_CELLS = 4_000_000
+
+# Objective XGBoost có link identity (margin chính là giá dự đoán)
+IDENTITY_OBJECTIVES = {
+    "reg:squarederror", "reg:squaredlogerror", "reg:absoluteerror",
+    "reg:pseudohubererror", "reg:quantileerror",
+}
+
+
+class CompiledTreeEnsemble:
+    """Flattened tree ensemble evaluated with vectorized NumPy traversal."""
+
+    def __init__(self, feature, threshold, left, right, value, roots, max_depth,
+                 n_features, aggregation="sum", base_score=0.0, used_features=None, is_leaf=None,
+                 missing=None, default_left=None):
+        """
+        Args:
+            feature, threshold, left, right, value: Mảng nút của tất cả cây nối liền nhau
+                (chỉ số con là chỉ số toàn cục; lá trỏ về chính nó)
+            roots (ndarray): Chỉ số nút gốc của từng cây
+            max_depth (int): Độ sâu lớn nhất của các cây
+            n_features (int): Số cột đầu vào
+            aggregation (str): 'mean' (Random Forest, float64) hoặc 'sum' (XGBoost, cộng float32)
+            base_score (float): Giá trị khởi đầu/cộng thêm khi gộp các cây
+            used_features (ndarray): Nếu có, ``feature`` đã được đánh lại chỉ số theo mảng này
+            is_leaf (ndarray): Cờ lá đã tính sẵn (khi load từ file)
+            missing (float): Giá trị được coi là "missing" (XGBoost train với missing=0), None = không có
+            default_left (ndarray): Hướng đi của giá trị missing tại mỗi nút (cần khi có missing)
+        """
+        self.n_features = int(n_features)
+        self.roots = np.ascontiguousarray(roots, dtype=np.int32)
+        self.max_depth = int(max_depth)
+        self.aggregation = aggregation
+        self.base_score = float(base_score)
+        self.n_trees = len(self.roots)
+
+        if used_features is None:
+            # Chỉ giữ các cột thực sự được dùng để chia nút và đánh lại chỉ số
+            feature = np.asarray(feature, dtype=np.int64)
+            used_features = np.unique(feature)
+            remap = np.zeros(self.n_features, dtype=np.int32)
+            remap[used_features] = np.arange(len(used_features), dtype=np.int32)
+            feature = remap[feature]
+        self.used_features = np.ascontiguousarray(used_features, dtype=np.int64)
+
+        # Mảng đúng dtype (vd: np.load với mmap_mode) được dùng trực tiếp, không sao chép
+        self.feature = np.ascontiguousarray(feature, dtype=np.int32)
+        self.threshold = np.ascontiguousarray(threshold, dtype=np.float64)
+        self.left = np.ascontiguousarray(left, dtype=np.int32)
+        self.right = np.ascontiguousarray(right, dtype=np.int32)
+        self.value = np.ascontiguousarray(value, dtype=np.float64)
+        if is_leaf is None:
+            is_leaf = self.left == np.arange(len(self.left), dtype=np.int32)
+        self.is_leaf = np.ascontiguousarray(is_leaf, dtype=np.bool_)
+        self.missing = None if missing is None else float(missing)
+        self.default_left = None if self.missing is None else np.ascontiguousarray(default_left, dtype=np.bool_)
+
+    @property
+    def n_nodes(self):
+        return len(self.feature)
+
+    def arrays(self):
+        """Return the flat arrays (e.g. for saving with np.save / sharing between processes)."""
+        arrays = {
+            "feature": self.feature,
+            "used_features": self.used_features,
+            "threshold": self.threshold,
+            "left": self.left,
+            "right": self.right,
+            "value": self.value,
+            "roots": self.roots,
+            "is_leaf": self.is_leaf,
+        }
+        if self.default_left is not None:
+            arrays["default_left"] = self.default_left
+        return arrays
+
+    def metadata(self):
+        """Return the scalar parameters needed to rebuild the ensemble from arrays()."""
+        return {
+            "max_depth": self.max_depth,
+            "n_features": self.n_features,
+            "aggregation": self.aggregation,
+            "base_score": self.base_score,
+            "missing": self.missing,
+        }
+
+    @classmethod
+    def from_arrays(cls, arrays, metadata):
+        """Rebuild an ensemble from arrays() and metadata()."""
+        return cls(arrays["feature"], arrays["threshold"], arrays["left"], arrays["right"],
+                   arrays["value"], arrays["roots"], used_features=arrays["used_features"],
+                   is_leaf=arrays["is_leaf"], default_left=arrays.get("default_left"), **metadata)
+
+    def save(self, directory, name):
+        """Save the ensemble as <name>_<array>.npy files plus <name>.json metadata."""
+        import os
+
+        os.makedirs(directory, exist_ok=True)
+        for key, array in self.arrays().items():
+            np.save(os.path.join(directory, f"{name}_{key}.npy"), np.ascontiguousarray(array))
+        with open(os.path.join(directory, f"{name}.json"), "w", encoding="utf-8") as f:
+            json.dump(self.metadata(), f)
+
+    @classmethod
+    def load(cls, directory, name, mmap_mode="r"):
+        """
+        Load an ensemble written by save().
+
+        With ``mmap_mode='r'`` the node arrays are memory-mapped: loading is
+        near zero-copy and processes mapping the same files share the pages.
+        """
+        import os
+
+        with open(os.path.join(directory, f"{name}.json"), encoding="utf-8") as f:
+            metadata = json.load(f)
+        keys = ["feature", "used_features", "threshold", "left", "right", "value", "roots", "is_leaf"]
+        if metadata.get("missing") is not None:
+            keys.append("default_left")
+        arrays = {key: np.load(os.path.join(directory, f"{name}_{key}.npy"), mmap_mode=mmap_mode) for key in keys}
+        return cls.from_arrays(arrays, metadata)
+
+    def _leaf_values(self, X_used):
+        """Return the (n_rows, n_trees) leaf values for a float32 matrix of used columns."""
+        n_rows, n_used = X_used.shape
+        X_flat = X_used.ravel()
+
+        # Mỗi cặp (dòng, cây) là một con trỏ nút; chỉ các cặp chưa tới lá được duyệt tiếp
+        nodes = np.tile(self.roots, n_rows)
+        row_offset = np.repeat(np.arange(n_rows, dtype=np.int64) * n_used, self.n_trees)
+        active = np.flatnonzero(~self.is_leaf[nodes])
+        for _ in range(self.max_depth):
+            if not len(active):
+                break
+            current = nodes[active]
+            x = X_flat.take(row_offset[active] + self.feature.take(current))
+            go_left = x <= self.threshold.take(current)
+            if self.default_left is not None:
+                go_left = np.where(x == self.missing, self.default_left.take(current), go_left)
+            nxt = np.where(go_left, self.left.take(current), self.right.take(current))
+            nodes[active] = nxt
+            active = active[~self.is_leaf.take(nxt)]
+        return self.value.take(nodes).reshape(n_rows, self.n_trees)
+
+    def predict(self, X):
+        """
+        Predict for a dense (n_rows, n_features) matrix or a CSR matrix.
+
+        Inputs are cast to float32 like sklearn/XGBoost do before traversal.
+        """
+        if hasattr(X, "tocsc"):
+            X_used = X[:, self.used_features].toarray().astype(np.float32)
+        else:
+            X = np.asarray(X)
+            if X.ndim == 1:
+                X = X.reshape(1, -1)
+            X_used = np.ascontiguousarray(X[:, self.used_features], dtype=np.float32)
+
+        n_rows = X_used.shape[0]
+        out = np.empty(n_rows, dtype=np.float64)
+        if not self.n_trees:
+            out.fill(self.base_score)
+            return out
+
+        chunk = max(1, MAX_CHUNK_CELLS // self.n_trees)
+        for start in range(0, n_rows, chunk):
+            leaves = self._leaf_values(X_used[start:start + chunk])
+            if self.aggregation == "mean":
+                # Cộng tuần tự từng cây rồi chia, giống RandomForestRegressor.predict
+                out[start:start + chunk] = np.cumsum(leaves, axis=1)[:, -1] / self.n_trees + self.base_score
+            else:
+                # XGBoost cộng tuần tự bằng float32, bắt đầu từ base_score
+                base = np.full((leaves.shape[0], 1), self.base_score, dtype=np.float32)
+                summed = np.cumsum(np.concatenate([base, leaves.astype(np.float32)], axis=1), axis=1, dtype=np.float32)
+                out[start:start + chunk] = summed[:, -1]
+        return out
+
+
+def _self_loop_leaves(left, right, is_leaf, offset):
+    """Offset child indices and make every leaf point to itself."""
+    idx = np.arange(len(left), dtype=np.int64) + offset
+    left = np.where(is_leaf, idx, np.asarray(left, dtype=np.int64) + offset)
+    right = np.where(is_leaf, idx, np.asarray(right, dtype=np.int64) + offset)
+    return left, right
+
+
+def _tree_depth(left, right, root=0):
+    """Depth (number of splits on the longest root-to-leaf path) of one tree."""
+    depth = 0
+    frontier = [root]
+    while True:
+        children = [c for n in frontier for c in (left[n], right[n]) if c != -1]
+        if not children:
+            return depth
+        depth += 1
+        frontier = children
+
+
+def compile_random_forest(rf_model):
+    """Flatten a fitted sklearn RandomForestRegressor (or single-output tree ensemble)."""
+    features, thresholds, lefts, rights, values, roots = [], [], [], [], [], []
+    offset = 0
+    max_depth = 0
+    for estimator in rf_model.estimators_:
+        tree = estimator.tree_
+        is_leaf = tree.children_left == -1
+        left, right = _self_loop_leaves(tree.children_left, tree.children_right, is_leaf, offset)
+
+        features.append(np.where(is_leaf, 0, tree.feature))
+        thresholds.append(np.where(is_leaf, 0.0, tree.threshold))
+        lefts.append(left)
+        rights.append(right)
+        values.append(tree.value[:, 0, 0])
+        roots.append(offset)
+        max_depth = max(max_depth, int(tree.max_depth))
+        offset += tree.node_count
+
+    return CompiledTreeEnsemble(
+        np.concatenate(features), np.concatenate(thresholds), np.concatenate(lefts),
+        np.concatenate(rights), np.concatenate(values), np.array(roots), max_depth,
+        n_features=rf_model.n_features_in_, aggregation="mean",
+    )
+
+
+def _parse_base_score(raw):
+    """XGBoost stores base_score as '5E-1' or, in newer versions, '[5E-1]'."""
+    return float(str(raw).strip("[]").split(",")[0])
+
+
+def compile_xgboost(xgb_model, iteration_range=None):
+    """
+    Flatten a fitted XGBRegressor / Booster (gbtree, single target).
+
+    Args:
+        iteration_range (tuple): (begin, end) số vòng boosting sử dụng. Mặc định dùng
+            best_iteration nếu model được train với early stopping, giống XGBRegressor.predict.
+    """
+    booster = xgb_model.get_booster() if hasattr(xgb_model, "get_booster") else xgb_model
+    # Giá trị "missing" của XGBRegressor (NaN mặc định: không có ô nào bằng NaN sau khi mã hóa)
+    missing = getattr(xgb_model, "missing", np.nan)
+    missing = None if missing is None or np.isnan(missing) else float(missing)
+    if iteration_range is None:
+        try:
+            iteration_range = (0, xgb_model.best_iteration + 1)
+        except AttributeError:
+            iteration_range = None
+
+    model = json.loads(booster.save_raw(raw_format="json"))
+    learner = model["learner"]
+    objective = learner["objective"]["name"]
+    if objective not in IDENTITY_OBJECTIVES:
+        raise NotImplementedError(f"Unsupported XGBoost objective for compiled inference: {objective}")
+    if learner["gradient_booster"]["name"] != "gbtree":
+        raise NotImplementedError("Only gbtree boosters can be compiled")
+
+    gbtree = learner["gradient_booster"]["model"]
+    trees = gbtree["trees"]
+    indptr = gbtree.get("iteration_indptr") or list(range(len(trees) + 1))
+    if iteration_range is not None:
+        begin, end = iteration_range
+        trees = trees[indptr[begin]:indptr[min(end, len(indptr) - 1)]]
+
+    features, thresholds, lefts, rights, values, roots, default_lefts = [], [], [], [], [], [], []
+    offset = 0
+    max_depth = 0
+    for tree in trees:
+        if any(tree.get("split_type", [])):
+            raise NotImplementedError("Categorical splits are not supported by the compiled evaluator")
+        left_children = np.asarray(tree["left_children"], dtype=np.int64)
+        right_children = np.asarray(tree["right_children"], dtype=np.int64)
+        conditions = np.asarray(tree["split_conditions"], dtype=np.float32)
+        is_leaf = left_children == -1
+        left, right = _self_loop_leaves(left_children, right_children, is_leaf, offset)
+
+        # x < c (float32) <=> x <= giá trị float32 liền trước c
+        le_threshold = np.nextafter(conditions, np.float32(-np.inf)).astype(np.float64)
+
+        features.append(np.where(is_leaf, 0, np.asarray(tree["split_indices"], dtype=np.int64)))
+        thresholds.append(np.where(is_leaf, 0.0, le_threshold))
+        lefts.append(left)
+        rights.append(right)
+        values.append(np.where(is_leaf, conditions.astype(np.float64), 0.0))
+        default_lefts.append(np.asarray(tree["default_left"], dtype=bool))
+        roots.append(offset)
+        max_depth = max(max_depth, _tree_depth(left_children, right_children))
+        offset += len(left_children)
+
+    n_features = int(learner["learner_model_param"]["num_feature"])
+    base_score = _parse_base_score(learner["learner_model_param"]["base_score"])
+    if not trees:
+        return CompiledTreeEnsemble([0], [0.0], [0], [0], [0.0], [], 0, n_features, "sum", base_score,
+                                    missing=missing, default_left=[False])
+
+    return CompiledTreeEnsemble(
+        np.concatenate(features), np.concatenate(thresholds), np.concatenate(lefts),
+        np.concatenate(rights), np.concatenate(values), np.array(roots), max_depth,
+        n_features=n_features, aggregation="sum", base_score=base_score,
+        missing=missing, default_left=np.concatenate(default_lefts),
+    )
+
+
+def accepts_sparse(model):
+    """
+    Whether ``model.predict`` reads a CSR matrix the same way as its dense form.
+
+    sklearn coi ô trống của CSR là 0; XGBoost coi là "missing", nên chỉ đúng khi
+    model được train với missing=0.
+    """
+    if hasattr(model, "get_booster"):
+        return getattr(model, "missing", np.nan) == 0
+    return True
+
+
+def compile_tree_model(model):
+    """Compile either a sklearn forest or an XGBoost model."""
+    if hasattr(model, "get_booster"):
+        return compile_xgboost(model)
+    if hasattr(model, "estimators_"):
+        return compile_random_forest(model)
+    raise TypeError(f"Cannot compile model of type {type(model).__name__}")
+
+
+def verify_equivalence(model, compiled, X, rtol):
+    """Assert compiled predictions match model.predict on X; return the max relative error."""
+    from src.models.feature_encoder import predict_aligned
+
+    expected = predict_aligned(model, X)
+    got = compiled.predict(X)
+    rel_err = float(np.max(np.abs(got - expected) / np.maximum(np.abs(expected), 1.0)))
+    assert rel_err <= rtol, f"{type(model).__name__}: max relative error {rel_err} > {rtol}"
+    return rel_err
+
+
+def benchmark_trees(model_dir, X_pool, batch_sizes=(1, 100, 10_000), repeat=20):
+    """Equivalence check and latency benchmark of compiled vs original RF/XGBoost."""
+    import os
+    import time
+    import joblib
+    from src.models.feature_encoder import predict_aligned
+
+    def sample(n):
+        idx = np.arange(n) % len(X_pool)
+        return X_pool[idx]
+
+    def timeit(fn, n_repeat):
+        fn()
+        start = time.perf_counter()
+        for _ in range(n_repeat):
+            fn()
+        return (time.perf_counter() - start) / n_repeat
+
+    results = {}
+    for name, filename, rtol in [("Random Forest", "random_forest_model.pkl", 1e-12),
+                                 ("XGBoost", "xgboost_model.pkl", 0.0)]:
+        path = os.path.join(model_dir, filename)
+        if not os.path.exists(path):
+            print(f"{name}: {path} not found, skipped")
+            continue
+        model = joblib.load(path)
+        start = time.perf_counter()
+        compiled = compile_tree_model(model)
+        compile_time = time.perf_counter() - start
+
+        rel_err = verify_equivalence(model, compiled, sample(min(len(X_pool), 10_000)), rtol)
+        print(f"{name}: {compiled.n_trees} trees, {compiled.n_nodes} nodes, depth {compiled.max_depth}, "
+              f"{len(compiled.used_features)}/{compiled.n_features} features used, "
+              f"compiled in {compile_time:.2f}s, max relative error {rel_err:.1e}")
+
+        for n in batch_sizes:
+            X = sample(n)
+            n_repeat = max(1, repeat if n < 10_000 else repeat // 10)
+            original = timeit(lambda: predict_aligned(model, X), n_repeat)
+            fast = timeit(lambda: compiled.predict(X), n_repeat)
+            results[(name, n)] = (original, fast)
+            print(f"  batch {n:>6}: original {original * 1e3:10.3f} ms | compiled {fast * 1e3:10.3f} ms "
+                  f"| speedup {original / fast:6.1f}x")
+    return results
+
+
+if __name__ == "__main__":
+    import os
+    import sys
+    import joblib
+    import pandas as pd
+    from src.models.feature_encoder import FeatureEncoder, NUMERIC_FIELDS
+
+    root = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+    model_dir = sys.argv[1] if len(sys.argv) > 1 else os.path.join(root, "src", "models")
+
+    encoder = FeatureEncoder(joblib.load(os.path.join(model_dir, "model_columns.pkl")))
+    df = pd.read_csv(os.path.join(root, "data", "preprocessing", "cleaned.csv")).drop(columns=["price"])
+    df[NUMERIC_FIELDS] = df[NUMERIC_FIELDS].astype(int)
+    X_pool = encoder.transform(df.to_dict(orient="records"))
+
+    benchmark_trees(model_dir, X_pool)
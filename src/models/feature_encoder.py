@@ -0,0 +1,287 @@
+"""
+Compiled one-hot encoder built once from model_columns.pkl.
+
+Replaces the per-request ``pd.get_dummies`` + missing-column concat + reindex
+with direct (column, category) -> column index lookups that fill a NumPy row
+(or CSR rows for batches). The output is identical to the pandas path.
+
+Chạy benchmark (từ thư mục gốc project):
+    python -m src.models.feature_encoder [path/to/model_columns.pkl]
+"""
+import warnings
+
+import numpy as np
+
+CATEGORICAL_FIELDS = ["brand", "model", "fuel_type", "transmission", "origin", "car_type"]
+NUMERIC_FIELDS = ["year", "mileage", "seats"]
+
+
+class FeatureEncoder:
+    """Encode car dicts into rows aligned to the model's training columns."""
+
+    def __init__(self, model_columns, categorical_fields=CATEGORICAL_FIELDS, numeric_fields=NUMERIC_FIELDS):
+        """Compile the column vocabulary into index lookup tables."""
+        self.columns = list(model_columns)
+        self.n_features = len(self.columns)
+        self.categorical_fields = list(categorical_fields)
+
+        column_index = {col: i for i, col in enumerate(self.columns)}
+
+        # Cột số: giữ nguyên giá trị đầu vào
+        self.numeric_index = [(field, column_index[field]) for field in numeric_fields if field in column_index]
+
+        # Cột one-hot "<field>_<category>" -> {field: {category: index}}
+        self.category_index = {field: {} for field in self.categorical_fields}
+        for col, i in column_index.items():
+            for field in self.categorical_fields:
+                prefix = field + "_"
+                if col.startswith(prefix):
+                    self.category_index[field][col[len(prefix):]] = i
+                    break
+
+    def column_for(self, field, value):
+        """Return the column index for (field, value), or None if the model never saw it."""
+        return self.category_index.get(field, {}).get(str(value))
+
+    def transform_one(self, car, out=None):
+        """
+        Encode one car into a 1-D float64 row.
+
+        Args:
+            car (dict): Thông tin xe (brand, model, year, mileage, ...)
+            out (ndarray): Mảng có sẵn (n_features,) để ghi vào, tránh cấp phát lại
+        """
+        if out is None:
+            out = np.zeros(self.n_features, dtype=np.float64)
+        else:
+            out.fill(0.0)
+
+        for field, i in self.numeric_index:
+            out[i] = car[field]
+        for field in self.categorical_fields:
+            i = self.category_index[field].get(str(car[field]))
+            if i is not None:
+                out[i] = 1.0
+        return out
+
+    def transform(self, cars):
+        """Encode a list of cars into a dense (n_rows, n_features) float64 matrix."""
+        n_rows = len(cars)
+        X = np.zeros((n_rows, self.n_features), dtype=np.float64)
+        if not n_rows:
+            return X
+
+        for field, i in self.numeric_index:
+            X[:, i] = [car[field] for car in cars]
+
+        # Mỗi trường phân loại: tra chỉ số cột cho cả batch rồi gán một lần
+        rows = np.arange(n_rows)
+        for field in self.categorical_fields:
+            lookup = self.category_index[field]
+            cols = np.fromiter((lookup.get(str(car[field]), -1) for car in cars), dtype=np.int64, count=n_rows)
+            known = cols >= 0
+            X[rows[known], cols[known]] = 1.0
+        return X
+
+    def transform_sparse(self, cars):
+        """Encode a list of cars into a scipy.sparse CSR matrix (same values as transform)."""
+        from scipy import sparse
+
+        n_rows = len(cars)
+        rows = np.arange(n_rows)
+        row_parts, col_parts, data_parts = [], [], []
+
+        for field, i in self.numeric_index:
+            values = np.fromiter((car[field] for car in cars), dtype=np.float64, count=n_rows)
+            nonzero = values != 0.0
+            row_parts.append(rows[nonzero])
+            col_parts.append(np.full(int(nonzero.sum()), i, dtype=np.int64))
+            data_parts.append(values[nonzero])
+
+        for field in self.categorical_fields:
+            lookup = self.category_index[field]
+            cols = np.fromiter((lookup.get(str(car[field]), -1) for car in cars), dtype=np.int64, count=n_rows)
+            known = cols >= 0
+            row_parts.append(rows[known])
+            col_parts.append(cols[known])
+            data_parts.append(np.ones(int(known.sum()), dtype=np.float64))
+
+        if not row_parts:
+            return sparse.csr_matrix((n_rows, self.n_features), dtype=np.float64)
+        return sparse.coo_matrix(
+            (np.concatenate(data_parts), (np.concatenate(row_parts), np.concatenate(col_parts))),
+            shape=(n_rows, self.n_features),
+        ).tocsr()
+
+
+def category_codes_from_columns(model_columns, categorical_fields=CATEGORICAL_FIELDS, numeric_fields=NUMERIC_FIELDS):
+    """
+    Category-code mapping implied by a one-hot vocabulary.
+
+    Returns:
+        dict: {'numeric': [...], 'categorical': [...], 'categories': {field: [category, ...]}};
+        mã của một category là vị trí của nó trong danh sách (cùng thứ tự cột one-hot)
+    """
+    encoder = FeatureEncoder(model_columns, categorical_fields, numeric_fields)
+    return {
+        "numeric": [field for field, _ in encoder.numeric_index],
+        "categorical": list(categorical_fields),
+        "categories": {
+            field: [category for category, _ in sorted(lookup.items(), key=lambda item: item[1])]
+            for field, lookup in encoder.category_index.items()
+        },
+    }
+
+
+class CategoryCodeEncoder:
+    """
+    Encode cars for a native-categorical model: numeric fields as they are plus one
+    integer code per categorical field (9 columns instead of hundreds of one-hot ones).
+
+    Category chưa có trong mapping được mã hóa là NaN (model coi là missing).
+    """
+
+    def __init__(self, mapping, model_columns=None):
+        """
+        Args:
+            mapping (dict): Mapping do category_codes_from_columns tạo (lưu cùng model, category_codes.json)
+            model_columns (list): Nếu có, biên dịch thêm bảng chuyển từ hàng one-hot theo các cột này
+        """
+        self.mapping = mapping
+        self.numeric_fields = list(mapping["numeric"])
+        self.categorical_fields = list(mapping["categorical"])
+        self.feature_names = self.numeric_fields + self.categorical_fields
+        # Kiểu cột cho XGBoost: 'q' = số, 'c' = category
+        self.feature_types = ["q"] * len(self.numeric_fields) + ["c"] * len(self.categorical_fields)
+        self.n_features = len(self.feature_names)
+        self.code_index = {
+            field: {category: code for code, category in enumerate(mapping["categories"][field])}
+            for field in self.categorical_fields
+        }
+
+        self.one_hot_slot = self.one_hot_value = None
+        if model_columns is not None:
+            # Cột one-hot i -> (cột đầu ra, giá trị): cột số giữ giá trị, cột "<field>_<category>" cho ra mã
+            one_hot = FeatureEncoder(model_columns, self.categorical_fields, self.numeric_fields)
+            self.one_hot_slot = np.full(one_hot.n_features, -1, dtype=np.int64)
+            self.one_hot_value = np.full(one_hot.n_features, np.nan, dtype=np.float32)
+            for slot, (_, i) in enumerate(one_hot.numeric_index):
+                self.one_hot_slot[i] = slot
+            for slot, field in enumerate(self.categorical_fields, start=len(self.numeric_fields)):
+                for category, i in one_hot.category_index[field].items():
+                    code = self.code_index[field].get(category)
+                    if code is not None:
+                        self.one_hot_slot[i] = slot
+                        self.one_hot_value[i] = code
+
+    def _empty(self, n_rows):
+        X = np.zeros((n_rows, self.n_features), dtype=np.float32)
+        X[:, len(self.numeric_fields):] = np.nan
+        return X
+
+    def transform(self, cars):
+        """Encode a list of car dicts into a float32 (n_rows, n_numeric + n_categorical) matrix."""
+        X = self._empty(len(cars))
+        for j, field in enumerate(self.numeric_fields):
+            X[:, j] = [car[field] for car in cars]
+        for j, field in enumerate(self.categorical_fields, start=len(self.numeric_fields)):
+            lookup = self.code_index[field]
+            X[:, j] = [lookup.get(str(car[field]), np.nan) for car in cars]
+        return X
+
+    def from_one_hot(self, X):
+        """Convert rows encoded by FeatureEncoder (dense or CSR) into the same code matrix."""
+        if self.one_hot_slot is None:
+            raise ValueError("CategoryCodeEncoder was built without model_columns")
+        if hasattr(X, "tocoo"):
+            coo = X.tocoo()
+            rows, cols, data = coo.row, coo.col, coo.data
+        else:
+            X = np.atleast_2d(X)
+            rows, cols = np.nonzero(X)
+            data = X[rows, cols]
+        out = self._empty(X.shape[0])
+        slots = self.one_hot_slot[cols]
+        keep = slots >= 0
+        rows, cols, slots, data = rows[keep], cols[keep], slots[keep], data[keep]
+        numeric = slots < len(self.numeric_fields)
+        out[rows[numeric], slots[numeric]] = data[numeric]
+        out[rows[~numeric], slots[~numeric]] = self.one_hot_value[cols[~numeric]]
+        return out
+
+
+def predict_aligned(model, X):
+    """
+    Call model.predict on rows already aligned to the training columns.
+
+    The models are fit on DataFrames but served ndarray/CSR rows, so sklearn warns about
+    missing feature names; the warning is silenced for this call only, not for the process.
+    """
+    with warnings.catch_warnings():
+        warnings.filterwarnings("ignore", message="X does not have valid feature names", category=UserWarning)
+        return np.asarray(model.predict(X), dtype=np.float64)
+
+
+def encode_with_pandas(cars, model_columns):
+    """Reference encoding: the original get_dummies + missing columns + reindex path."""
+    import pandas as pd
+
+    input_df = pd.DataFrame(cars)
+    input_encoded = pd.get_dummies(input_df)
+    missing_cols = [col for col in model_columns if col not in input_encoded.columns]
+    missing_df = pd.DataFrame(0, index=input_encoded.index, columns=missing_cols)
+    input_encoded = pd.concat([input_encoded, missing_df], axis=1)
+    return input_encoded[model_columns].to_numpy(dtype=np.float64)
+
+
+def benchmark_encoding(model_columns, cars, repeat=200):
+    """Compare the pandas path with FeatureEncoder and check the outputs are identical."""
+    import time
+
+    encoder = FeatureEncoder(model_columns)
+
+    for car in cars:
+        expected = encode_with_pandas([car], model_columns)[0]
+        assert np.array_equal(encoder.transform_one(car), expected), f"Mismatch for {car}"
+    expected = encode_with_pandas(cars, model_columns)
+    assert np.array_equal(encoder.transform(cars), expected)
+    assert np.array_equal(encoder.transform_sparse(cars).toarray(), expected)
+
+    def timeit(fn):
+        start = time.perf_counter()
+        for _ in range(repeat):
+            fn()
+        return (time.perf_counter() - start) / repeat
+
+    car = cars[0]
+    results = {
+        "single_pandas": timeit(lambda: encode_with_pandas([car], model_columns)),
+        "single_encoder": timeit(lambda: encoder.transform_one(car)),
+        "batch_pandas": timeit(lambda: encode_with_pandas(cars, model_columns)),
+        "batch_encoder": timeit(lambda: encoder.transform(cars)),
+        "batch_encoder_csr": timeit(lambda: encoder.transform_sparse(cars)),
+    }
+
+    print(f"Encoding benchmark ({len(model_columns)} columns, batch of {len(cars)} rows)")
+    for name, seconds in results.items():
+        print(f"  {name:<20}: {seconds * 1e6:12.1f} µs")
+    print(f"  single-row speedup  : {results['single_pandas'] / results['single_encoder']:.0f}x")
+    print(f"  batch speedup       : {results['batch_pandas'] / results['batch_encoder']:.0f}x")
+    return results
+
+
+if __name__ == "__main__":
+    import os
+    import sys
+    import joblib
+    import pandas as pd
+
+    root = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+    columns_path = sys.argv[1] if len(sys.argv) > 1 else os.path.join(root, "src", "models", "model_columns.pkl")
+    model_columns = joblib.load(columns_path)
+
+    df = pd.read_csv(os.path.join(root, "data", "preprocessing", "cleaned.csv")).drop(columns=["price"])
+    df[NUMERIC_FIELDS] = df[NUMERIC_FIELDS].astype(int)
+    cars = df.head(1000).to_dict(orient="records")
+
+    benchmark_encoding(model_columns, cars, repeat=20)
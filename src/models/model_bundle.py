@@ -0,0 +1,403 @@
+"""
+Model bundle: the trained models in native, fast-loading formats.
+
+    bundle/
+        manifest.json           định dạng, hash từng file, tham số nhỏ (scaler, intercept)
+        columns.json            thứ tự cột one-hot (model_columns)
+        lr_coef.npy             hệ số Linear Regression
+        rf_trees.json, rf_trees_*.npy     Random Forest dạng mảng nút (mmap được)
+        xgb.ubj                 XGBoost định dạng UBJSON gốc
+        xgb_trees.json, xgb_trees_*.npy   XGBoost dạng mảng nút (mmap được)
+        cat.ubj, cat_codes.json           XGBoost native categorical + mapping mã category (tùy chọn)
+
+Each trainer writes its own component next to the pickles it already saves.
+The manifest is replaced last and atomically, so a reader never sees a
+component whose files are incomplete; files are swapped in with os.replace,
+so processes that already memory-mapped the old arrays keep a valid copy.
+
+Benchmark so với pickle (từ thư mục gốc project):
+    python -m src.models.model_bundle [path/to/models_dir]
+"""
+import os
+import json
+import time
+import shutil
+import hashlib
+import tempfile
+import numpy as np
+from src.models.feature_encoder import FeatureEncoder, NUMERIC_FIELDS
+from src.models.compiled_lr import CompiledLinearRegression, _scaler_params
+from src.models.compiled_trees import CompiledTreeEnsemble, compile_random_forest, compile_xgboost
+
+BUNDLE_FORMAT = 1
+MANIFEST_FILE = "manifest.json"
+COLUMNS_FILE = "columns.json"
+BUNDLE_COMPONENTS = ("lr", "rf", "xgb")
+# Thành phần có thể không có (bundle của các version train trước khi có engine này)
+OPTIONAL_COMPONENTS = ("cat",)
+
+# Thư mục bundle mặc định, cạnh các file .pkl do src/training ghi ra
+DEFAULT_BUNDLE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "bundle"))
+
+
+def _sha256(path, chunk_size=1024 * 1024):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def columns_hash(columns):
+    """Stable hash of a column vocabulary."""
+    return hashlib.sha256(json.dumps(list(columns), ensure_ascii=False).encode("utf-8")).hexdigest()
+
+
+def read_manifest(bundle_dir):
+    """Return the bundle manifest, or None if the bundle does not exist."""
+    path = os.path.join(bundle_dir, MANIFEST_FILE)
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _write_json(path, data):
+    tmp_path = f"{path}.tmp-{os.getpid()}"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+
+class _ComponentWriter:
+    """Stage a component's files in a temp folder, then swap them into the bundle and update the manifest."""
+
+    def __init__(self, bundle_dir, name, columns, pickles=None):
+        self.bundle_dir = bundle_dir
+        self.name = name
+        self.columns = list(columns)
+        self.pickles = pickles or []
+        self.params = {}
+
+    def __enter__(self):
+        os.makedirs(self.bundle_dir, exist_ok=True)
+        self.tmp_dir = tempfile.mkdtemp(prefix=f".{self.name}-", dir=self.bundle_dir)
+        return self
+
+    def path(self, filename):
+        return os.path.join(self.tmp_dir, filename)
+
+    def __exit__(self, exc_type, exc, tb):
+        try:
+            if exc_type is None:
+                self._publish()
+        finally:
+            shutil.rmtree(self.tmp_dir, ignore_errors=True)
+        return False
+
+    def _publish(self):
+        # Cột one-hot dùng chung cho mọi thành phần; ghi lại nếu khác bản đang có
+        cols_hash = columns_hash(self.columns)
+        manifest = read_manifest(self.bundle_dir) or {"format": BUNDLE_FORMAT, "components": {}}
+        if manifest.get("columns_sha256") != cols_hash:
+            _write_json(os.path.join(self.bundle_dir, COLUMNS_FILE), self.columns)
+
+        files = {}
+        for filename in sorted(os.listdir(self.tmp_dir)):
+            files[filename] = _sha256(self.path(filename))
+            os.replace(self.path(filename), os.path.join(self.bundle_dir, filename))
+
+        # Hash các file pickle được ghi cùng lúc, để đối chiếu bundle với bộ .pkl tương ứng
+        pickles = {os.path.basename(p): _sha256(p) for p in self.pickles if os.path.exists(p)}
+
+        manifest["format"] = BUNDLE_FORMAT
+        manifest["columns_sha256"] = cols_hash
+        manifest["updated_at"] = time.time()
+        manifest["components"][self.name] = {
+            "files": files,
+            "params": self.params,
+            "columns_sha256": cols_hash,
+            "pickles": pickles,
+            "created_at": time.time(),
+        }
+        _write_json(os.path.join(self.bundle_dir, MANIFEST_FILE), manifest)
+
+
+def write_linear_regression(bundle_dir, columns, lr_model, scaler_X, scaler_y,
+                            numeric_columns=NUMERIC_FIELDS, pickles=None):
+    """Write LR coefficients and scaler parameters into the bundle."""
+    x_mean, x_scale = _scaler_params(scaler_X, len(numeric_columns))
+    y_mean, y_scale = _scaler_params(scaler_y, 1)
+    with _ComponentWriter(bundle_dir, "lr", columns, pickles) as writer:
+        np.save(writer.path("lr_coef.npy"), np.asarray(lr_model.coef_, dtype=np.float64).reshape(-1))
+        writer.params = {
+            "intercept": float(np.asarray(lr_model.intercept_, dtype=np.float64).reshape(-1)[0]),
+            "numeric_columns": list(numeric_columns),
+            "x_mean": x_mean.tolist(),
+            "x_scale": x_scale.tolist(),
+            "y_mean": float(y_mean[0]),
+            "y_scale": float(y_scale[0]),
+        }
+
+
+def write_random_forest(bundle_dir, columns, rf_model, pickles=None):
+    """Write the Random Forest as memory-mappable node arrays."""
+    with _ComponentWriter(bundle_dir, "rf", columns, pickles) as writer:
+        compile_random_forest(rf_model).save(writer.tmp_dir, "rf_trees")
+        writer.params = {"n_estimators": len(rf_model.estimators_)}
+
+
+def write_xgboost(bundle_dir, columns, xgb_model, pickles=None):
+    """Write XGBoost in its native UBJSON format plus memory-mappable node arrays."""
+    with _ComponentWriter(bundle_dir, "xgb", columns, pickles) as writer:
+        xgb_model.save_model(writer.path("xgb.ubj"))
+        compile_xgboost(xgb_model).save(writer.tmp_dir, "xgb_trees")
+        # xgb.ubj không lưu tham số missing của XGBRegressor (0 khi train trên ma trận sparse)
+        missing = getattr(xgb_model, "missing", np.nan)
+        writer.params = {
+            "best_iteration": getattr(xgb_model, "best_iteration", None),
+            "missing": None if missing is None or np.isnan(missing) else float(missing),
+        }
+
+
+def write_native_categorical(bundle_dir, columns, cat_model, mapping, pickles=None):
+    """Write the native-categorical XGBoost model (UBJSON) and its category-code mapping."""
+    with _ComponentWriter(bundle_dir, "cat", columns, pickles) as writer:
+        cat_model.save_model(writer.path("cat.ubj"))
+        with open(writer.path("cat_codes.json"), "w", encoding="utf-8") as f:
+            json.dump(mapping, f, ensure_ascii=False)
+
+
+def merge_bundles(bundle_dir, part_dirs):
+    """
+    Move the components of several bundles (e.g. written by trainers running in
+    separate processes) into one bundle. The manifest is written last.
+    """
+    os.makedirs(bundle_dir, exist_ok=True)
+    manifest = read_manifest(bundle_dir) or {"format": BUNDLE_FORMAT, "components": {}}
+    columns_file = None
+    for part_dir in part_dirs:
+        part = read_manifest(part_dir)
+        if part is None:
+            raise ValueError(f"{part_dir} is not a model bundle")
+        if manifest.get("columns_sha256") not in (None, part["columns_sha256"]):
+            raise ValueError(f"{part_dir} was trained on different columns")
+        for name, component in part["components"].items():
+            for filename in component["files"]:
+                os.replace(os.path.join(part_dir, filename), os.path.join(bundle_dir, filename))
+            manifest["components"][name] = component
+        manifest["columns_sha256"] = part["columns_sha256"]
+        columns_file = os.path.join(part_dir, COLUMNS_FILE)
+
+    if columns_file is not None:
+        os.replace(columns_file, os.path.join(bundle_dir, COLUMNS_FILE))
+    manifest["format"] = BUNDLE_FORMAT
+    manifest["updated_at"] = time.time()
+    _write_json(os.path.join(bundle_dir, MANIFEST_FILE), manifest)
+    return bundle_dir
+
+
+def export_bundle(model_dir, bundle_dir=None):
+    """Convert the pickled artifacts in model_dir into a bundle (for models trained before bundles existed)."""
+    import joblib
+
+    bundle_dir = bundle_dir or os.path.join(model_dir, "bundle")
+    pkl = lambda name: os.path.join(model_dir, name)
+    columns = joblib.load(pkl("model_columns.pkl"))
+    write_linear_regression(
+        bundle_dir, columns,
+        joblib.load(pkl("linear_regression_model.pkl")), joblib.load(pkl("scaler_X.pkl")), joblib.load(pkl("scaler_y.pkl")),
+        pickles=[pkl("linear_regression_model.pkl"), pkl("scaler_X.pkl"), pkl("scaler_y.pkl"), pkl("model_columns.pkl")],
+    )
+    write_random_forest(bundle_dir, columns, joblib.load(pkl("random_forest_model.pkl")),
+                        pickles=[pkl("random_forest_model.pkl")])
+    write_xgboost(bundle_dir, columns, joblib.load(pkl("xgboost_model.pkl")),
+                  pickles=[pkl("xgboost_model.pkl")])
+    if os.path.exists(pkl("native_categorical_model.pkl")):
+        with open(pkl("category_codes.json"), encoding="utf-8") as f:
+            mapping = json.load(f)
+        write_native_categorical(bundle_dir, columns, joblib.load(pkl("native_categorical_model.pkl")), mapping,
+                                 pickles=[pkl("native_categorical_model.pkl"), pkl("category_codes.json")])
+    return bundle_dir
+
+
+class ModelBundle:
+    """Models loaded from a bundle directory."""
+
+    def __init__(self, directory, manifest, columns, lr_scorer, rf_compiled, xgb_model, xgb_compiled,
+                 cat_model=None, category_codes=None):
+        self.directory = directory
+        self.manifest = manifest
+        self.model_columns = columns
+        self.encoder = lr_scorer.encoder
+        self.lr_scorer = lr_scorer
+        self.rf_compiled = rf_compiled
+        self.xgb_model = xgb_model
+        self.xgb_compiled = xgb_compiled
+        self.cat_model = cat_model
+        self.category_codes = category_codes
+
+    @property
+    def component_names(self):
+        """Components this bundle serves: the required ones plus the optional ones it has."""
+        components = self.manifest["components"]
+        return BUNDLE_COMPONENTS + tuple(name for name in OPTIONAL_COMPONENTS if name in components)
+
+    @property
+    def hashes(self):
+        """{filename: sha256} of every bundle file, from the manifest."""
+        hashes = {COLUMNS_FILE: self.manifest["columns_sha256"]}
+        for name in self.component_names:
+            hashes.update(self.manifest["components"][name]["files"])
+        return hashes
+
+    @property
+    def source_hashes(self):
+        """{pickle filename: sha256} of the pickles written together with this bundle."""
+        hashes = {}
+        for name in self.component_names:
+            hashes.update(self.manifest["components"][name].get("pickles", {}))
+        return hashes
+
+    @classmethod
+    def load(cls, directory, mmap_mode="r", load_xgb_native=True):
+        """
+        Open a bundle.
+
+        Node arrays are memory-mapped (near zero-copy, shared between
+        processes); only the small LR vectors and, if requested, the native
+        XGBoost booster are read into memory.
+        """
+        manifest = read_manifest(directory)
+        if manifest is None:
+            raise FileNotFoundError(f"No model bundle in {directory}")
+        if manifest.get("format") != BUNDLE_FORMAT:
+            raise ValueError(f"Unsupported bundle format {manifest.get('format')}")
+        components = manifest.get("components", {})
+        missing = [name for name in BUNDLE_COMPONENTS if name not in components]
+        if missing:
+            raise ValueError(f"Model bundle is missing components: {', '.join(missing)}")
+        stale = [name for name in BUNDLE_COMPONENTS + OPTIONAL_COMPONENTS
+                 if name in components and components[name]["columns_sha256"] != manifest["columns_sha256"]]
+        if stale:
+            raise ValueError(f"Bundle components trained on different columns: {', '.join(stale)}")
+
+        with open(os.path.join(directory, COLUMNS_FILE), encoding="utf-8") as f:
+            columns = json.load(f)
+        encoder = FeatureEncoder(columns)
+
+        lr = components["lr"]["params"]
+        lr_scorer = CompiledLinearRegression.from_params(
+            encoder, np.load(os.path.join(directory, "lr_coef.npy")), lr["intercept"],
+            lr["x_mean"], lr["x_scale"], lr["y_mean"], lr["y_scale"],
+        )
+        rf_compiled = CompiledTreeEnsemble.load(directory, "rf_trees", mmap_mode=mmap_mode)
+        xgb_compiled = CompiledTreeEnsemble.load(directory, "xgb_trees", mmap_mode=mmap_mode)
+
+        xgb_model = None
+        if load_xgb_native:
+            from xgboost import XGBRegressor
+            xgb_model = XGBRegressor()
+            xgb_model.load_model(os.path.join(directory, "xgb.ubj"))
+            if components["xgb"].get("params", {}).get("missing") is not None:
+                xgb_model.set_params(missing=components["xgb"]["params"]["missing"])
+
+        # Native categorical chỉ có dạng booster gốc (không biên dịch thành mảng nút)
+        cat_model = category_codes = None
+        if "cat" in components:
+            from xgboost import XGBRegressor
+            cat_model = XGBRegressor()
+            cat_model.load_model(os.path.join(directory, "cat.ubj"))
+            with open(os.path.join(directory, "cat_codes.json"), encoding="utf-8") as f:
+                category_codes = json.load(f)
+
+        return cls(directory, manifest, columns, lr_scorer, rf_compiled, xgb_model, xgb_compiled,
+                   cat_model, category_codes)
+
+
+def _rss_mb():
+    """Current resident set size of this process in MB."""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    import resource
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _measure_load(kind, path, n_rows=1000):
+    """Subprocess task: load one artifact set and report time and RSS."""
+    import warnings
+    import joblib
+    import sklearn.ensemble  # noqa: F401 - import trước để không tính vào RSS của bước load
+    import xgboost  # noqa: F401
+
+    from src.models.feature_encoder import predict_aligned
+
+    # Process con chỉ chạy phép đo này
+    warnings.filterwarnings("ignore", message="Loky-backed parallel loops", category=UserWarning)
+
+    rss_before = _rss_mb()
+    start = time.perf_counter()
+    if kind == "pickle":
+        artifacts = {name: joblib.load(os.path.join(path, f"{name}.pkl")) for name in (
+            "model_columns", "linear_regression_model", "scaler_X", "scaler_y",
+            "random_forest_model", "xgboost_model")}
+        n_features = len(artifacts["model_columns"])
+
+        def predict(X):
+            predict_aligned(artifacts["random_forest_model"], X)
+            predict_aligned(artifacts["xgboost_model"], X)
+    else:
+        bundle = ModelBundle.load(path)
+        n_features = len(bundle.model_columns)
+
+        def predict(X):
+            bundle.rf_compiled.predict(X)
+            predict_aligned(bundle.xgb_model, X)
+    load_seconds = time.perf_counter() - start
+    rss_loaded = _rss_mb()
+
+    X = np.zeros((n_rows, n_features))
+    predict(X)
+    return {
+        "load_seconds": load_seconds,
+        "rss_load_mb": rss_loaded - rss_before,
+        "rss_after_predict_mb": _rss_mb() - rss_before,
+    }
+
+
+def benchmark_loading(model_dir, bundle_dir, repeat=3):
+    """Compare cold-load time and RSS of the pickles and the bundle, each in a fresh process."""
+    import multiprocessing
+
+    context = multiprocessing.get_context("spawn")
+    results = {}
+    for kind, path in (("pickle", model_dir), ("bundle", bundle_dir)):
+        runs = []
+        for _ in range(repeat):
+            with context.Pool(1) as pool:
+                runs.append(pool.apply(_measure_load, (kind, path)))
+        results[kind] = {key: float(np.median([run[key] for run in runs])) for key in runs[0]}
+
+    print(f"Cold load benchmark (median of {repeat} fresh processes)")
+    for kind, r in results.items():
+        print(f"  {kind:<7}: load {r['load_seconds'] * 1e3:9.1f} ms | RSS after load {r['rss_load_mb']:8.1f} MB "
+              f"| after 1000-row predict {r['rss_after_predict_mb']:8.1f} MB")
+    return results
+
+
+if __name__ == "__main__":
+    import sys
+
+    root = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+    model_dir = sys.argv[1] if len(sys.argv) > 1 else os.path.join(root, "src", "models")
+    bundle_dir = os.path.join(model_dir, "bundle")
+
+    if read_manifest(bundle_dir) is None:
+        print(f"Exporting {model_dir} pickles to {bundle_dir}")
+        export_bundle(model_dir, bundle_dir)
+    benchmark_loading(model_dir, bundle_dir)
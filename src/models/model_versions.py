@@ -0,0 +1,250 @@
+"""
+Versioned model store: every training run is published as an immutable
+folder and serving follows a `current` pointer.
+
+    versions/
+        current             {"version": "v3", "promoted_at": ...} - thay bằng os.replace
+        v1/, v2/, v3/       các file .pkl, bundle/, price_surface.* và version.json
+        .staging-*/         lần train đang chạy (chưa ai đọc)
+
+Trainers write into a private staging folder; `publish()` records the
+training metrics and the hash of the data, then renames the folder to the
+next `v<N>` in one step. Promoting a version only rewrites the small pointer
+file, so a reader sees either the old or the new set of files, never a mix.
+
+Quản lý từ dòng lệnh (từ thư mục gốc project):
+    python -m src.models.model_versions list
+    python -m src.models.model_versions promote v2
+    python -m src.models.model_versions rollback [v1]
+    python -m src.models.model_versions import      # đưa bộ model hiện có trong src/models thành một version
+"""
+import os
+import re
+import json
+import time
+import shutil
+import tempfile
+from src.models.model_bundle import _sha256, _write_json
+
+VERSIONS_DIRNAME = "versions"
+CURRENT_FILE = "current"
+VERSION_INFO_FILE = "version.json"
+
+# Thư mục versions mặc định, cạnh các file .pkl do src/training ghi ra
+DEFAULT_VERSIONS_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), VERSIONS_DIRNAME))
+
+_VERSION_RE = re.compile(r"^v(\d+)$")
+
+# Các file (và thư mục) tạo thành một bộ model hoàn chỉnh trong thư mục phẳng src/models
+FLAT_ARTIFACTS = (
+    "model_columns.pkl", "linear_regression_model.pkl", "scaler_X.pkl", "scaler_y.pkl",
+    "random_forest_model.pkl", "xgboost_model.pkl", "native_categorical_model.pkl", "category_codes.json",
+    "price_surface.json", "price_surface.npy", "price_surface_report.json", "bundle",
+)
+
+
+def data_hash(path):
+    """SHA-256 of the training data file."""
+    return _sha256(path)
+
+
+def _version_number(name):
+    match = _VERSION_RE.match(name or "")
+    return int(match.group(1)) if match else None
+
+
+def _metric_value(value):
+    if isinstance(value, (str, int)) or value is None:
+        return value
+    return float(value)
+
+
+class ModelVersionStore:
+    """Immutable model versions plus an atomically swapped `current` pointer."""
+
+    def __init__(self, root=None):
+        """
+        Args:
+            root (str): Thư mục chứa v<N>/ và file current (mặc định src/models/versions)
+        """
+        self.root = root or DEFAULT_VERSIONS_DIR
+
+    @property
+    def pointer_path(self):
+        return os.path.join(self.root, CURRENT_FILE)
+
+    def version_path(self, name):
+        if _version_number(name) is None:
+            raise ValueError(f"Invalid model version name {name!r}, expected v<N>")
+        return os.path.join(self.root, name)
+
+    def versions(self):
+        """Names of the published versions, oldest first."""
+        if not os.path.isdir(self.root):
+            return []
+        names = [
+            name for name in os.listdir(self.root)
+            if _version_number(name) is not None
+            and os.path.exists(os.path.join(self.root, name, VERSION_INFO_FILE))
+        ]
+        return sorted(names, key=_version_number)
+
+    def info(self, name):
+        """Return the version.json of a published version (metrics, data hash, files)."""
+        path = os.path.join(self.version_path(name), VERSION_INFO_FILE)
+        if not os.path.exists(path):
+            raise KeyError(f"Model version {name} does not exist")
+        with open(path, encoding="utf-8") as f:
+            info = json.load(f)
+        info["version"] = name
+        return info
+
+    def read_pointer(self):
+        """Return the `current` pointer ({'version', 'promoted_at'}) or None if nothing was promoted."""
+        try:
+            with open(self.pointer_path, encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def current(self):
+        """Name of the promoted version, or None."""
+        pointer = self.read_pointer()
+        return pointer["version"] if pointer else None
+
+    def list_versions(self):
+        """Every published version's info, newest first, with a 'current' flag."""
+        current = self.current()
+        result = []
+        for name in reversed(self.versions()):
+            info = self.info(name)
+            info.pop("files", None)
+            info["current"] = name == current
+            result.append(info)
+        return result
+
+    def begin(self):
+        """Create an empty staging folder for a training run and return its path."""
+        os.makedirs(self.root, exist_ok=True)
+        return tempfile.mkdtemp(prefix=".staging-", dir=self.root)
+
+    def discard(self, staging):
+        """Delete a staging folder that will not be published."""
+        shutil.rmtree(staging, ignore_errors=True)
+
+    def publish(self, staging, metrics=None, data_hash=None, promote=True, keep=None, **extra):
+        """
+        Turn a staging folder into the next version.
+
+        Args:
+            staging (str): Thư mục do begin() tạo, đã chứa đủ các file model
+            metrics (dict): {tên model: {mae, rmse, r2, accuracy, ...}} từ các trainer
+            data_hash (str): Hash của file dữ liệu đã dùng để train
+            promote (bool): Chuyển con trỏ current sang version mới
+            keep (int): Nếu có, xóa các version cũ chỉ giữ lại chừng này version mới nhất
+            **extra: Thông tin thêm ghi vào version.json
+
+        Returns:
+            str: Tên version mới, vd 'v4'
+        """
+        files = {}
+        for dirpath, _, filenames in os.walk(staging):
+            for filename in filenames:
+                path = os.path.join(dirpath, filename)
+                files[os.path.relpath(path, staging).replace(os.sep, "/")] = _sha256(path)
+
+        info = dict(extra)
+        info.update({
+            "created_at": time.time(),
+            "data_hash": data_hash,
+            "parent": self.current(),
+            "metrics": {
+                model: {key: _metric_value(value) for key, value in values.items()}
+                for model, values in (metrics or {}).items()
+            },
+            "files": files,
+        })
+        _write_json(os.path.join(staging, VERSION_INFO_FILE), info)
+
+        # Đổi tên cả thư mục một lần; nếu process khác vừa lấy số này thì thử số kế tiếp
+        while True:
+            numbers = [_version_number(name) for name in os.listdir(self.root)]
+            name = f"v{max([n for n in numbers if n is not None], default=0) + 1}"
+            try:
+                os.rename(staging, os.path.join(self.root, name))
+                break
+            except OSError:
+                if not os.path.exists(os.path.join(self.root, name)):
+                    raise
+
+        if promote:
+            self.promote(name)
+        if keep:
+            self.prune(keep)
+        return name
+
+    def promote(self, name):
+        """Point `current` at a published version."""
+        if name not in self.versions():
+            raise KeyError(f"Model version {name} does not exist")
+        _write_json(self.pointer_path, {"version": name, "promoted_at": time.time()})
+        return name
+
+    def rollback(self, to=None):
+        """Promote `to`, or the newest version older than the current one."""
+        if to is None:
+            current = _version_number(self.current())
+            older = [name for name in self.versions() if current is None or _version_number(name) < current]
+            if not older:
+                raise KeyError("No older model version to roll back to")
+            to = older[-1]
+        return self.promote(to)
+
+    def prune(self, keep):
+        """Delete all but the `keep` newest versions (the current one is always kept)."""
+        current = self.current()
+        removed = []
+        for name in self.versions()[:-keep]:
+            if name != current:
+                shutil.rmtree(self.version_path(name), ignore_errors=True)
+                removed.append(name)
+        return removed
+
+    def import_flat(self, model_dir, promote=True, **extra):
+        """Publish the artifacts of a flat model folder (the pre-versioning layout) as a new version."""
+        staging = self.begin()
+        try:
+            for name in FLAT_ARTIFACTS:
+                src = os.path.join(model_dir, name)
+                if os.path.isdir(src):
+                    shutil.copytree(src, os.path.join(staging, name))
+                elif os.path.exists(src):
+                    shutil.copy2(src, os.path.join(staging, name))
+            return self.publish(staging, promote=promote, imported_from=os.path.abspath(model_dir), **extra)
+        except Exception:
+            self.discard(staging)
+            raise
+
+
+if __name__ == "__main__":
+    import sys
+
+    root = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+    store = ModelVersionStore()
+    command = sys.argv[1] if len(sys.argv) > 1 else "list"
+
+    if command == "promote":
+        print(f"current -> {store.promote(sys.argv[2])}")
+    elif command == "rollback":
+        print(f"current -> {store.rollback(sys.argv[2] if len(sys.argv) > 2 else None)}")
+    elif command == "import":
+        model_dir = sys.argv[2] if len(sys.argv) > 2 else os.path.join(root, "src", "models")
+        print(f"Published {model_dir} as {store.import_flat(model_dir)}")
+    else:
+        for entry in store.list_versions():
+            scores = ", ".join(
+                f"{model} r2={values.get('r2', float('nan')):.4f}" for model, values in entry["metrics"].items()
+            )
+            created = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(entry["created_at"]))
+            print(f"{'*' if entry['current'] else ' '} {entry['version']:<5} {created}  "
+                  f"data={str(entry['data_hash'])[:12]}  {scores}")
@@ -0,0 +1,389 @@
+"""
+Precomputed price surface: LR / RF / XGBoost (and the native-categorical
+model, when the version has one) evaluated offline for every valid
+categorical combination over a year x mileage grid.
+
+Serving a car is then one dictionary lookup plus linear interpolation between
+the two nearest mileage grid points; the models are not touched. Cars outside
+the surface (unknown combination, year or mileage off the grid) fall back to
+the exact models.
+
+The surface is an approximation: against the exact models at the same
+mileage, ~1.5-2% of real cars are more than 10% off (worst cases 50-117%,
+where the trees jump between grid points). Building it also takes most of a
+full retrain (~250s of ~274s). It is therefore opt-in: PRICE_SURFACE_ENABLED
+for serving, price_surface=True / --price-surface for training.
+
+A "valid combination" is a (brand, model, car_type, fuel_type, transmission,
+origin, seats) tuple observed in the training data - the full cartesian
+product of the reference tables is ~1000x larger and mostly cars that do not
+exist.
+
+Chạy sau khi train (từ thư mục gốc project):
+    python -m src.models.price_surface [path/to/models_dir]
+"""
+import os
+import json
+import time
+import bisect
+import hashlib
+import numpy as np
+
+# Thứ tự các trường trong khóa tra cứu của surface
+SURFACE_KEY_FIELDS = ("brand", "model", "car_type", "fuel_type", "transmission", "origin", "seats")
+SURFACE_MODELS = ("lr", "rf", "xgb")
+# Model chỉ có trong các version mới; surface có thêm cột cho chúng khi được tính từ version đó
+OPTIONAL_SURFACE_MODELS = ("cat",)
+
+# Các file model mà surface được tính từ đó (để phát hiện surface cũ sau khi train lại)
+SOURCE_ARTIFACTS = (
+    "model_columns.pkl", "linear_regression_model.pkl", "scaler_X.pkl", "scaler_y.pkl",
+    "random_forest_model.pkl", "xgboost_model.pkl",
+)
+OPTIONAL_SOURCE_ARTIFACTS = ("native_categorical_model.pkl", "category_codes.json")
+
+# Lưới số km: dày ở vùng nhiều xe, thưa dần ở vùng km cao
+DEFAULT_MILEAGE_GRID = np.unique(np.concatenate([
+    np.arange(0, 100_000, 2_500),
+    np.arange(100_000, 300_000, 10_000),
+    np.arange(300_000, 500_001, 25_000),
+])).astype(np.float64)
+
+DEFAULT_MIN_YEAR = 2000
+
+# Số dòng tối đa mỗi lần gọi model khi dựng surface
+BUILD_CHUNK_ROWS = 200_000
+
+
+def _sha256(path, chunk_size=1024 * 1024):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def source_hashes(model_dir):
+    """SHA-256 of every source artifact in model_dir (optional ones only if present), keyed by filename."""
+    names = SOURCE_ARTIFACTS + tuple(
+        name for name in OPTIONAL_SOURCE_ARTIFACTS if os.path.exists(os.path.join(model_dir, name)))
+    return {name: _sha256(os.path.join(model_dir, name)) for name in names}
+
+
+def surface_key(car):
+    """Build the lookup key of a car dict."""
+    return (str(car["brand"]), str(car["model"]), str(car["car_type"]), str(car["fuel_type"]),
+            str(car["transmission"]), str(car["origin"]), int(car["seats"]))
+
+
+class PriceSurface:
+    """Grid of precomputed prices with mileage interpolation."""
+
+    def __init__(self, combos, years, mileage_grid, prices, model_hashes=None, built_at=None, models=SURFACE_MODELS):
+        """
+        Args:
+            combos (list): Các tuple khóa theo SURFACE_KEY_FIELDS
+            years (array): Các năm liên tiếp của lưới
+            mileage_grid (array): Các mốc số km tăng dần
+            prices (ndarray): float32 shape (n_combos, n_years, n_mileage, n_models) theo `models`
+            model_hashes (dict): SHA-256 các file model dùng để tính surface
+            models (tuple): Tên các model, SURFACE_MODELS cộng các model tùy chọn có trong version
+        """
+        self.models = tuple(models)
+        self.combos = [tuple(combo) for combo in combos]
+        self.years = np.asarray(years, dtype=np.int64)
+        self.mileage_grid = np.asarray(mileage_grid, dtype=np.float64)
+        self.prices = prices
+        self.model_hashes = model_hashes or {}
+        self.built_at = built_at
+
+        expected = (len(self.combos), len(self.years), len(self.mileage_grid), len(self.models))
+        if tuple(prices.shape) != expected:
+            raise ValueError(f"Price surface has shape {prices.shape}, expected {expected}")
+        if len(self.years) and not np.array_equal(self.years, np.arange(self.years[0], self.years[0] + len(self.years))):
+            raise ValueError("Price surface years must be consecutive")
+
+        self.index = {combo: i for i, combo in enumerate(self.combos)}
+        self._year_min = int(self.years[0]) if len(self.years) else 0
+        self._grid = self.mileage_grid.tolist()
+
+    def matches(self, model_hashes):
+        """True if the surface was built from artifacts with exactly these hashes ({filename: sha256})."""
+        return bool(self.model_hashes) and self.model_hashes == model_hashes
+
+    def lookup(self, car):
+        """
+        Price one car from the grid.
+
+        Returns:
+            dict hoặc None: {'lr', 'rf', 'xgb'[, 'cat']} (float, VND), None nếu xe nằm ngoài surface
+        """
+        i = self.index.get(surface_key(car))
+        if i is None:
+            return None
+        y = int(car["year"]) - self._year_min
+        if y < 0 or y >= len(self.years):
+            return None
+        mileage = float(car["mileage"])
+        grid = self._grid
+        if mileage < grid[0] or mileage > grid[-1]:
+            return None
+
+        j = bisect.bisect_right(grid, mileage) - 1
+        if j >= len(grid) - 1:
+            values = self.prices[i, y, -1].astype(np.float64)
+        else:
+            t = (mileage - grid[j]) / (grid[j + 1] - grid[j])
+            low, high = self.prices[i, y, j:j + 2].astype(np.float64)
+            values = low + t * (high - low)
+        return dict(zip(self.models, values.tolist()))
+
+    def metadata(self):
+        return {
+            "key_fields": list(SURFACE_KEY_FIELDS),
+            "models": list(self.models),
+            "combos": [list(combo) for combo in self.combos],
+            "years": self.years.tolist(),
+            "mileage_grid": self.mileage_grid.tolist(),
+            "model_hashes": self.model_hashes,
+            "built_at": self.built_at,
+        }
+
+    def save(self, directory, name="price_surface"):
+        """
+        Write ``name.npy`` (prices) and ``name.json`` (grid + combos), each to a temporary file first.
+
+        Both files are swapped in with os.replace, the JSON last, so a reader never maps a half-written array.
+        """
+        os.makedirs(directory, exist_ok=True)
+        tmp_path = os.path.join(directory, f"{name}.npy.tmp")
+        with open(tmp_path, "wb") as f:
+            np.save(f, np.asarray(self.prices, dtype=np.float32))
+        os.replace(tmp_path, os.path.join(directory, f"{name}.npy"))
+        tmp_path = os.path.join(directory, f"{name}.json.tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.metadata(), f, ensure_ascii=False)
+        os.replace(tmp_path, os.path.join(directory, f"{name}.json"))
+
+    @classmethod
+    def load(cls, directory, name="price_surface", mmap_mode="r"):
+        """Load a surface written by save(); prices are memory-mapped by default."""
+        with open(os.path.join(directory, f"{name}.json"), encoding="utf-8") as f:
+            meta = json.load(f)
+        models = tuple(meta["models"])
+        if (tuple(meta["key_fields"]) != SURFACE_KEY_FIELDS or models[:len(SURFACE_MODELS)] != SURFACE_MODELS
+                or not set(models[len(SURFACE_MODELS):]) <= set(OPTIONAL_SURFACE_MODELS)):
+            raise ValueError("Price surface was written with a different layout")
+        prices = np.load(os.path.join(directory, f"{name}.npy"), mmap_mode=mmap_mode)
+        return cls(meta["combos"], meta["years"], meta["mileage_grid"], prices,
+                   model_hashes=meta.get("model_hashes"), built_at=meta.get("built_at"), models=models)
+
+
+def observed_combos(df, encoder):
+    """Unique key tuples in a training DataFrame whose categories the encoder knows."""
+    combos = []
+    for row in df[list(SURFACE_KEY_FIELDS)].dropna().drop_duplicates().itertuples(index=False):
+        combo = (str(row[0]), str(row[1]), str(row[2]), str(row[3]), str(row[4]), str(row[5]), int(row[6]))
+        car = dict(zip(SURFACE_KEY_FIELDS, combo))
+        if all(encoder.column_for(field, car[field]) is not None for field in encoder.category_index):
+            combos.append(combo)
+    return sorted(set(combos))
+
+
+def _grid_matrix(encoder, combos, years, mileage_grid):
+    """Encoded rows for every (combo, year, mileage) point, combo-major then year then mileage."""
+    n_y, n_m = len(years), len(mileage_grid)
+    block = n_y * n_m
+    n_rows = len(combos) * block
+    X = np.zeros((n_rows, encoder.n_features), dtype=np.float64)
+
+    numeric = dict(encoder.numeric_index)
+    X[:, numeric["year"]] = np.tile(np.repeat(np.asarray(years, dtype=np.float64), n_m), len(combos))
+    X[:, numeric["mileage"]] = np.tile(mileage_grid, len(combos) * n_y)
+    X[:, numeric["seats"]] = np.repeat([combo[-1] for combo in combos], block)
+
+    rows = np.arange(n_rows)
+    for field, categories in encoder.category_index.items():
+        pos = SURFACE_KEY_FIELDS.index(field)
+        cols = np.repeat([categories[combo[pos]] for combo in combos], block)
+        X[rows, cols] = 1.0
+    return X
+
+
+def build_price_surface(encoder, predict_matrix, combos, years, mileage_grid=DEFAULT_MILEAGE_GRID,
+                        chunk_rows=BUILD_CHUNK_ROWS, models=SURFACE_MODELS):
+    """
+    Evaluate the models over the full grid.
+
+    Args:
+        encoder (FeatureEncoder): Bộ mã hóa theo model_columns
+        predict_matrix (callable): X -> {tên model: mảng giá (VND)} cho mọi tên trong `models`
+        combos (list): Các tuple khóa hợp lệ
+        years (array): Các năm liên tiếp
+
+    Returns:
+        ndarray: float32 shape (n_combos, n_years, n_mileage, len(models))
+    """
+    n_y, n_m = len(years), len(mileage_grid)
+    prices = np.empty((len(combos), n_y, n_m, len(models)), dtype=np.float32)
+    combos_per_chunk = max(1, chunk_rows // (n_y * n_m))
+    for start in range(0, len(combos), combos_per_chunk):
+        chunk = combos[start:start + combos_per_chunk]
+        preds = predict_matrix(_grid_matrix(encoder, chunk, years, mileage_grid))
+        for k, name in enumerate(models):
+            prices[start:start + len(chunk), :, :, k] = np.asarray(preds[name]).reshape(len(chunk), n_y, n_m)
+    return prices
+
+
+def interpolation_report(surface, encoder, predict_matrix, cars):
+    """
+    Compare surface lookups with the exact models on real cars.
+
+    Returns:
+        dict: Tỷ lệ xe tra được từ surface và sai số tương đối / tuyệt đối (VND) theo từng model
+    """
+    hits = []
+    looked_up = []
+    for car in cars:
+        result = surface.lookup(car)
+        if result is not None:
+            hits.append(car)
+            looked_up.append([result[name] for name in surface.models])
+
+    report = {"cars": len(cars), "covered": len(hits),
+              "coverage": len(hits) / len(cars) if cars else 0.0, "models": {}}
+    if not hits:
+        return report
+
+    approx = np.asarray(looked_up)
+    exact = predict_matrix(encoder.transform(hits))
+    for k, name in enumerate(surface.models):
+        expected = np.asarray(exact[name], dtype=np.float64)
+        abs_err = np.abs(approx[:, k] - expected)
+        rel_err = abs_err / np.maximum(np.abs(expected), 1.0)
+        report["models"][name] = {
+            "mae_vnd": float(abs_err.mean()),
+            "max_abs_vnd": float(abs_err.max()),
+            "rel_mean": float(rel_err.mean()),
+            "rel_p50": float(np.percentile(rel_err, 50)),
+            "rel_p95": float(np.percentile(rel_err, 95)),
+            "rel_max": float(rel_err.max()),
+        }
+    return report
+
+
+def _load_predictor(model_dir):
+    """Load the training artifacts and return (encoder, predict_matrix, model names)."""
+    import joblib
+    from src.models.compiled_lr import CompiledLinearRegression
+    from src.models.feature_encoder import predict_aligned
+
+    model_columns = joblib.load(os.path.join(model_dir, "model_columns.pkl"))
+    lr_scorer = CompiledLinearRegression.from_models(
+        model_columns,
+        joblib.load(os.path.join(model_dir, "linear_regression_model.pkl")),
+        joblib.load(os.path.join(model_dir, "scaler_X.pkl")),
+        joblib.load(os.path.join(model_dir, "scaler_y.pkl")),
+    )
+    rf_model = joblib.load(os.path.join(model_dir, "random_forest_model.pkl"))
+    xgb_model = joblib.load(os.path.join(model_dir, "xgboost_model.pkl"))
+
+    # Model native categorical (nếu version có): đọc mã category suy ra từ chính hàng one-hot
+    cat_model = cat_codes = None
+    if os.path.exists(os.path.join(model_dir, "native_categorical_model.pkl")):
+        from src.models.feature_encoder import CategoryCodeEncoder
+
+        cat_model = joblib.load(os.path.join(model_dir, "native_categorical_model.pkl"))
+        with open(os.path.join(model_dir, "category_codes.json"), encoding="utf-8") as f:
+            cat_codes = CategoryCodeEncoder(json.load(f), model_columns)
+
+    def predict_matrix(X):
+        preds = {
+            "lr": lr_scorer.predict_matrix(X),
+            "rf": predict_aligned(rf_model, X),
+            "xgb": predict_aligned(xgb_model, X),
+        }
+        if cat_model is not None:
+            preds["cat"] = predict_aligned(cat_model, cat_codes.from_one_hot(X))
+        return preds
+
+    models = SURFACE_MODELS + (("cat",) if cat_model is not None else ())
+    return lr_scorer.encoder, predict_matrix, models
+
+
+def generate_price_surface(model_dir, data_path, out_dir=None, min_year=DEFAULT_MIN_YEAR,
+                           mileage_grid=DEFAULT_MILEAGE_GRID, report_rows=5000):
+    """
+    Offline stage run after training: build, save and report on the price surface.
+
+    Args:
+        model_dir (str): Thư mục chứa các file .pkl của model
+        data_path (str): cleaned.csv dùng để train (lấy các tổ hợp hợp lệ và xe để đo sai số)
+        out_dir (str): Nơi ghi price_surface.* (mặc định là model_dir)
+
+    Returns:
+        dict: Báo cáo sai số nội suy (cũng được ghi ra price_surface_report.json)
+    """
+    import pandas as pd
+
+    out_dir = out_dir or model_dir
+    hashes = source_hashes(model_dir)
+    encoder, predict_matrix, models = _load_predictor(model_dir)
+
+    df = pd.read_csv(data_path)
+    combos = observed_combos(df, encoder)
+    years = np.arange(min_year, max(int(df["year"].max()), min_year) + 1)
+
+    start = time.perf_counter()
+    prices = build_price_surface(encoder, predict_matrix, combos, years, mileage_grid, models=models)
+    build_seconds = time.perf_counter() - start
+
+    surface = PriceSurface(combos, years, mileage_grid, prices, model_hashes=hashes, built_at=time.time(),
+                           models=models)
+    surface.save(out_dir)
+    # Đọc lại bản đã lưu (memory-map) để báo cáo đúng những gì sẽ được phục vụ
+    surface = PriceSurface.load(out_dir)
+
+    sample = df.drop(columns=["price"], errors="ignore").dropna(subset=list(SURFACE_KEY_FIELDS) + ["year", "mileage"])
+    sample = sample.sample(min(report_rows, len(sample)), random_state=42)
+    sample[["year", "mileage", "seats"]] = sample[["year", "mileage", "seats"]].astype(int)
+    cars = [{**car, **{f: str(car[f]) for f in encoder.category_index}} for car in sample.to_dict(orient="records")]
+    report = interpolation_report(surface, encoder, predict_matrix, cars)
+    report.update({
+        "combos": len(combos),
+        "grid_points": int(prices.size // len(models)),
+        "size_bytes": int(prices.nbytes),
+        "build_seconds": build_seconds,
+    })
+    with open(os.path.join(out_dir, "price_surface_report.json"), "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    return report
+
+
+def benchmark_lookup(surface, cars, repeat=5):
+    """Time single-car surface lookups."""
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for car in cars:
+            surface.lookup(car)
+    return (time.perf_counter() - start) / (repeat * len(cars))
+
+
+if __name__ == "__main__":
+    import sys
+
+    root = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+    model_dir = sys.argv[1] if len(sys.argv) > 1 else os.path.join(root, "src", "models")
+    data_path = os.path.join(root, "data", "preprocessing", "cleaned.csv")
+
+    report = generate_price_surface(model_dir, data_path)
+    print(f"Price surface: {report['combos']} combos, {report['grid_points']} grid points, "
+          f"{report['size_bytes'] / 1e6:.1f} MB, built in {report['build_seconds']:.1f}s")
+    print(f"Coverage on {report['cars']} training cars: {report['coverage']:.1%}")
+    for name, stats in report["models"].items():
+        print(f"  {name:<4} MAE {stats['mae_vnd']:14,.0f} VND | rel mean {stats['rel_mean']:.3%} "
+              f"| p95 {stats['rel_p95']:.3%} | max {stats['rel_max']:.3%}")
+
+    surface = PriceSurface.load(model_dir)
+    cars = [dict(zip(SURFACE_KEY_FIELDS, combo), year=2018, mileage=43_000) for combo in surface.combos[:1000]]
+    print(f"Lookup: {benchmark_lookup(surface, cars) * 1e6:.2f} µs per car")
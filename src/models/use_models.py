@@ -1,6 +1,7 @@
 import pandas as pd
 import numpy as np
 import joblib
+from feature_encoder import FeatureEncoder, predict_aligned
 
 input_data = {
     "brand": "Volvo",
@@ -55,46 +56,34 @@ def predict_price(input_data: dict):
     # Load model mẫu data
     model_columns = joblib.load("./model_columns.pkl")
 
-    # One-hot encode input
-    input_df = pd.DataFrame([input_data])
-    input_encoded = pd.get_dummies(input_df)
-
-    # Tìm các cột bị thiếu
-    missing_cols = [col for col in model_columns if col not in input_encoded.columns]
-
-    # Tạo DataFrame các cột thiếu với giá trị 0
-    missing_df = pd.DataFrame(0, index=[0], columns=missing_cols)
-
-    # Gộp lại 1 lần để tránh phân mảnh
-    input_encoded = pd.concat([input_encoded, missing_df], axis=1)
-
-    # Đảm bảo đúng thứ tự cột
-    input_encoded = input_encoded[model_columns]
+    # One-hot encode input bằng bộ mã hóa đã biên dịch (không tạo DataFrame)
+    encoder = FeatureEncoder(model_columns)
+    input_encoded = encoder.transform_one(input_data).reshape(1, -1)
 
     # ------------------ Linear Regression -----------------
     lr_model = joblib.load("./linear_regression_model.pkl")
     scaler_X = joblib.load("./scaler_X.pkl")
     scaler_y = joblib.load("./scaler_y.pkl")
     # Scale các cột số
-    numeric_cols = ["year", "mileage", "seats"]
+    numeric_idx = [i for _, i in encoder.numeric_index]
     lr_input = input_encoded.copy()
-    lr_input[numeric_cols] = scaler_X.transform(lr_input[numeric_cols])
+    lr_input[:, numeric_idx] = scaler_X.transform(lr_input[:, numeric_idx])
 
     # Dự đoán
-    y_pred_scaled = lr_model.predict(lr_input)
-    lf_pred = scaler_y.inverse_transform(y_pred_scaled)
+    y_pred_scaled = predict_aligned(lr_model, lr_input)
+    lf_pred = scaler_y.inverse_transform(y_pred_scaled.reshape(-1, 1))
     lr_result = int(round(lf_pred[0, 0]))
     print(f"Giá xe dự đoán linear regression: {lr_result:,} VND")
 
     # ------------------- Random Forest ------------------
     rf_model = joblib.load("./random_forest_model.pkl")
-    rf_pred = rf_model.predict(input_encoded)
+    rf_pred = predict_aligned(rf_model, input_encoded)
     rf_result = int(round(rf_pred[0]))
     print(f"Giá xe dự đoán random forest: {rf_result:,} VND")
 
     # -------------------- XGBoost --------------------
     xbg_model = joblib.load("./xgboost_model.pkl")
-    xgb_pred = xbg_model.predict(input_encoded)
+    xgb_pred = predict_aligned(xbg_model, input_encoded)
     xgb_result = int(round(xgb_pred[0]))
     print(f"Giá xe dự đoán xgboost: {xgb_result:,} VND")
 
@@ -0,0 +1,493 @@
+"""
+Warm-start incremental retraining on newly crawled data.
+
+Instead of retraining from scratch on the whole cleaned.csv, the models of a
+published version are updated with only the rows that version has not seen:
+
+    LR       X^T X và X^T y của tập train được lưu cạnh model (lr_stats.npz); cộng thêm
+             phần của dòng mới rồi giải lại -> đúng bằng OLS trên dữ liệu cũ + mới
+    RF       warm_start: giữ nguyên các cây cũ, thêm cây mới (số cây tỉ lệ với lượng dữ liệu mới)
+    XGBoost  boost tiếp từ booster hiện tại (xgb_model=) thêm vài vòng, learning rate nhỏ
+    cat      model native categorical (nếu version gốc có): như XGBoost, trên mã category
+
+RF and XGBoost fit on the new rows plus a replay sample of old train rows
+(REPLAY_RATIO x the new rows): trained on the new rows alone, the extra trees
+overfit a small delta and made the models worse than not updating at all.
+The work per update therefore stays proportional to the new data.
+
+The rows a version was trained on are kept as row hashes in
+training_rows.npz (written by the orchestrator), so "new" is decided by
+content, not by file position. The model vocabulary (model_columns.pkl) and
+the scalers stay those of the base version; rows with a brand/model the
+vocabulary does not know are still used but counted, and a full retrain
+(src/training/orchestrator.py) is the way to pick up new categories.
+
+Kết quả được publish thành một version mới như lần train đầy đủ, với thông tin
+"incremental" trong version.json.
+
+Chạy từ thư mục gốc project:
+    python -m src.training.incremental [--base v3] [--no-promote]
+    python -m src.training.incremental --benchmark [--delta 0.1]     # so sánh với train lại toàn bộ
+"""
+import os
+import math
+import time
+import shutil
+import argparse
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+import joblib
+from sklearn.linear_model import LinearRegression
+from sklearn.metrics import mean_absolute_error, mean_squared_error, r2_score
+from sklearn.model_selection import train_test_split
+
+from src.training.orchestrator import TrainingError
+
+LINEAR_STATS_FILE = "lr_stats.npz"
+TRAINING_ROWS_FILE = "training_rows.npz"
+
+# Mặc định số vòng boost thêm cho XGBoost mỗi lần cập nhật và learning rate của các vòng đó
+XGB_ROUNDS = 30
+XGB_LEARNING_RATE = 0.03
+# RF / XGBoost train trên dòng mới + (REPLAY_RATIO x số dòng mới) dòng train cũ lấy ngẫu nhiên
+REPLAY_RATIO = 2
+# Cảnh báo khi quá nhiều dòng mới có category model chưa biết
+UNSEEN_WARNING_FRACTION = 0.05
+
+MODEL_NAMES = {"lr": "Linear Regression", "rf": "Random Forest", "xgb": "XGBoost",
+               "cat": "XGBoost (native categorical)"}
+
+
+def linear_stats(X, y):
+    """X^T X and X^T y of [1, X] (cột đầu là intercept; X dense hoặc sparse) and the number of rows."""
+    y = np.asarray(y, dtype=np.float64).reshape(-1)
+    if sp.issparse(X):
+        Xa = sp.hstack([np.ones((X.shape[0], 1)), X], format="csr", dtype=np.float64)
+        return (Xa.T @ Xa).toarray(), np.asarray(Xa.T @ y).reshape(-1), X.shape[0]
+    X = np.asarray(X, dtype=np.float64)
+    Xa = np.hstack([np.ones((X.shape[0], 1)), X])
+    return Xa.T @ Xa, Xa.T @ y, X.shape[0]
+
+
+def save_linear_stats(model_dir, xtx, xty, n):
+    """Write the sufficient statistics of the LR train rows (from linear_stats) next to the model."""
+    np.savez(os.path.join(model_dir, LINEAR_STATS_FILE), xtx=xtx, xty=xty, n=n)
+
+
+def solve_linear_stats(xtx, xty, rcond=1e-10):
+    """
+    LinearRegression from X^T X and X^T y, solved like LinearRegression.fit.
+
+    sklearn trừ trung bình (centering) rồi lấy nghiệm bình phương tối thiểu có chuẩn nhỏ
+    nhất; ở đây làm đúng như vậy từ các thống kê (X^T X suy biến vì các cột one-hot của
+    mỗi nhóm cộng lại bằng cột intercept). Nhờ đó cả các dòng có category không có trong
+    tập train cũng được dự đoán như model sklearn.
+    """
+    n = xtx[0, 0]
+    mean_x = xtx[0, 1:] / n
+    mean_y = xty[0] / n
+    gram = xtx[1:, 1:] - n * np.outer(mean_x, mean_x)
+    cross = xty[1:] - n * mean_x * mean_y
+    coef = np.linalg.pinv(gram, rcond=rcond, hermitian=True) @ cross
+    model = LinearRegression()
+    model.coef_ = coef.reshape(1, -1)
+    model.intercept_ = np.array([mean_y - mean_x @ coef])
+    model.n_features_in_ = len(coef)
+    return model
+
+
+def save_training_rows(model_dir, row_hashes, is_test):
+    """Record which rows (by content hash) a version was trained / evaluated on."""
+    np.savez(os.path.join(model_dir, TRAINING_ROWS_FILE),
+             rows=np.asarray(row_hashes, dtype=np.uint64), test=np.asarray(is_test, dtype=bool))
+
+
+def _load_state(base_dir):
+    missing = [name for name in (LINEAR_STATS_FILE, TRAINING_ROWS_FILE)
+               if not os.path.exists(os.path.join(base_dir, name))]
+    if missing:
+        raise TrainingError(f"Model version at {base_dir} has no incremental state ({', '.join(missing)}); "
+                            f"run a full training first")
+    with np.load(os.path.join(base_dir, LINEAR_STATS_FILE)) as f:
+        stats = {"xtx": f["xtx"], "xty": f["xty"], "n": int(f["n"])}
+    with np.load(os.path.join(base_dir, TRAINING_ROWS_FILE)) as f:
+        rows = {"rows": f["rows"], "test": f["test"]}
+    return stats, rows
+
+
+def find_delta(hashes, rows, test_size=0.2, random_state=42):
+    """
+    Split the rows of a new cleaned.csv against the rows a version was trained on.
+
+    Returns:
+        (base_train_idx, base_test_idx, delta_train_idx, delta_test_idx): vị trí dòng trong file mới;
+        dòng mới được chia train/test cùng tỉ lệ như lần train đầy đủ
+    """
+    seen = np.isin(hashes, rows["rows"])
+    base_test = np.isin(hashes, rows["rows"][rows["test"]])
+    delta_idx = np.nonzero(~seen)[0]
+    if len(delta_idx) < 2:
+        delta_train, delta_test = delta_idx, delta_idx[:0]
+    else:
+        delta_train, delta_test = train_test_split(delta_idx, test_size=test_size, random_state=random_state)
+    return np.nonzero(seen & ~base_test)[0], np.nonzero(base_test)[0], np.sort(delta_train), np.sort(delta_test)
+
+
+def _evaluate(name, y_true, y_pred):
+    y_true = np.asarray(y_true, dtype=np.float64).reshape(-1)
+    y_pred = np.asarray(y_pred, dtype=np.float64).reshape(-1)
+    return {
+        "model": MODEL_NAMES[name],
+        "mae": mean_absolute_error(y_true, y_pred),
+        "rmse": np.sqrt(mean_squared_error(y_true, y_pred)),
+        "r2": r2_score(y_true, y_pred),
+        "accuracy": 100 - np.mean(100 * np.abs(y_true - y_pred) / y_true),
+    }
+
+
+def update_models(base_dir, df, model_dir, rf_new_trees=None, xgb_rounds=XGB_ROUNDS, replay_ratio=REPLAY_RATIO,
+                  n_jobs=None, random_state=42, log=print):
+    """
+    Update the models in `base_dir` with the rows of `df` they have not seen and write them to `model_dir`.
+
+    Args:
+        base_dir (str): Thư mục version gốc (các .pkl, lr_stats.npz, training_rows.npz)
+        df (DataFrame): Toàn bộ cleaned.csv mới (dữ liệu cũ + mới)
+        model_dir (str): Thư mục staging của version mới
+        rf_new_trees (int): Số cây RF thêm vào (mặc định tỉ lệ với số dòng mới / số dòng train cũ)
+        xgb_rounds (int): Số vòng boost thêm cho XGBoost
+        replay_ratio (float): Số dòng train cũ trộn thêm cho RF / XGBoost, tính theo số dòng mới
+        n_jobs (int): Số core cho RF / XGBoost
+
+    Returns:
+        dict: metrics (đánh giá trên tập test cũ + phần test của dữ liệu mới), base_metrics
+        (model cũ trên cùng các dòng đó) và thông tin về lần cập nhật
+    """
+    from src.features.feature_engineering import encode_with_columns, row_hashes
+    from src.models.compiled_trees import accepts_sparse
+    from src.models.feature_encoder import CategoryCodeEncoder
+    from src.models.model_bundle import (write_linear_regression, write_native_categorical, write_random_forest,
+                                         write_xgboost)
+    from src.training.native_categorical import (CAT_MODEL_FILE, CAT_PARAMS, CATEGORY_CODES_FILE,
+                                                  load_category_codes, save_category_codes)
+    from src.training.random_forest import RF_DENSE_MAX_MB
+    from src.training.xgboost_train import XGB_PARAMS
+    from xgboost import XGBRegressor
+
+    run_start = time.perf_counter()
+    stats, rows = _load_state(base_dir)
+    hashes = row_hashes(df)
+    base_train, base_test, delta_train, delta_test = find_delta(hashes, rows)
+    if len(delta_train) == 0:
+        raise TrainingError("No new rows since the base model version; nothing to update")
+    eval_idx = np.concatenate([base_test, delta_test])
+
+    columns = joblib.load(os.path.join(base_dir, "model_columns.pkl"))
+    X, y, unseen = encode_with_columns(df, columns)
+    n_unseen = int(unseen[delta_train].sum() + unseen[delta_test].sum())
+    n_delta = len(delta_train) + len(delta_test)
+    log(f"{n_delta} new rows ({len(delta_train)} train / {len(delta_test)} test), "
+        f"evaluating on {len(eval_idx)} rows")
+    if n_unseen > UNSEEN_WARNING_FRACTION * n_delta:
+        log(f"Warning: {n_unseen} new rows have categories the models do not know; consider a full retrain")
+
+    n_replay = min(len(base_train), int(replay_ratio * len(delta_train)))
+    replay = np.random.RandomState(random_state).choice(base_train, n_replay, replace=False)
+    fit_idx = np.concatenate([delta_train, replay])
+
+    X_new, X_fit, X_eval = X[delta_train], X[fit_idx].astype(np.float32), X[eval_idx].astype(np.float32)
+    y_new, y_fit, y_eval = y[delta_train], y[fit_idx], y[eval_idx]
+    report = {
+        "base_rows": int(len(rows["rows"])),
+        "new_rows": n_delta,
+        "new_train_rows": int(len(delta_train)),
+        "new_test_rows": int(len(delta_test)),
+        "replay_rows": int(n_replay),
+        "eval_rows": int(len(eval_idx)),
+        "unseen_category_rows": n_unseen,
+        "prepare_seconds": time.perf_counter() - run_start,
+        "models": {},
+        "metrics": {},
+        "base_metrics": {},
+    }
+    os.makedirs(model_dir, exist_ok=True)
+    joblib.dump(columns, os.path.join(model_dir, "model_columns.pkl"))
+
+    # Linear Regression: cộng thống kê của riêng dòng mới (scaler giữ nguyên của version gốc)
+    start = time.perf_counter()
+    lr_model = joblib.load(os.path.join(base_dir, "linear_regression_model.pkl"))
+    scaler_X = joblib.load(os.path.join(base_dir, "scaler_X.pkl"))
+    scaler_y = joblib.load(os.path.join(base_dir, "scaler_y.pkl"))
+    numeric_columns = list(scaler_X.feature_names_in_)
+    n_numeric = len(numeric_columns)
+
+    def scale(X_part):
+        numeric = scaler_X.transform(pd.DataFrame(X_part[:, :n_numeric].toarray(), columns=numeric_columns))
+        return sp.hstack([sp.csr_matrix(numeric), X_part[:, n_numeric:]], format="csr", dtype=np.float64)
+
+    X_eval_scaled = scale(X_eval)
+    report["base_metrics"]["lr"] = _evaluate("lr", y_eval, scaler_y.inverse_transform(lr_model.predict(X_eval_scaled)))
+    xtx, xty, n = linear_stats(scale(X_new), scaler_y.transform(pd.DataFrame({"price": y_new})))
+    xtx, xty, n = stats["xtx"] + xtx, stats["xty"] + xty, stats["n"] + n
+    lr_model = solve_linear_stats(xtx, xty)
+    save_linear_stats(model_dir, xtx, xty, n)
+    for name, obj in (("linear_regression_model.pkl", lr_model), ("scaler_X.pkl", scaler_X), ("scaler_y.pkl", scaler_y)):
+        joblib.dump(obj, os.path.join(model_dir, name))
+    write_linear_regression(
+        os.path.join(model_dir, "bundle"), columns, lr_model, scaler_X, scaler_y, numeric_columns=numeric_columns,
+        pickles=[os.path.join(model_dir, name) for name in
+                 ("linear_regression_model.pkl", "scaler_X.pkl", "scaler_y.pkl")],
+    )
+    report["metrics"]["lr"] = _evaluate("lr", y_eval, scaler_y.inverse_transform(lr_model.predict(X_eval_scaled)))
+    report["models"]["lr"] = {"seconds": time.perf_counter() - start, "train_rows": int(n)}
+
+    # Random Forest: thêm cây train trên dòng mới, giữ tỉ lệ cây / dữ liệu như lần train gốc
+    start = time.perf_counter()
+    rf_model = joblib.load(os.path.join(base_dir, "random_forest_model.pkl"))
+    report["base_metrics"]["rf"] = _evaluate("rf", y_eval, rf_model.predict(X_eval))
+    trees_before = len(rf_model.estimators_)
+    added = rf_new_trees or max(1, math.ceil(trees_before * len(delta_train) / stats["n"]))
+    rf_model.set_params(warm_start=True, n_estimators=trees_before + added, n_jobs=n_jobs)
+    # Cùng quy tắc như random_forest_training: CSR chỉ khi bản dense quá lớn
+    too_big = X_fit.shape[0] * X_fit.shape[1] * 4 / 1e6 > RF_DENSE_MAX_MB
+    rf_model.fit(X_fit if too_big else X_fit.toarray(), y_fit)
+    rf_model.set_params(warm_start=False)
+    joblib.dump(rf_model, os.path.join(model_dir, "random_forest_model.pkl"))
+    write_random_forest(
+        os.path.join(model_dir, "bundle"), columns, rf_model,
+        pickles=[os.path.join(model_dir, name) for name in ("random_forest_model.pkl", "model_columns.pkl")],
+    )
+    report["metrics"]["rf"] = _evaluate("rf", y_eval, rf_model.predict(X_eval))
+    report["models"]["rf"] = {"seconds": time.perf_counter() - start,
+                              "trees_before": trees_before, "trees_added": added}
+
+    # XGBoost: boost tiếp từ booster cũ (chỉ các cây đến best_iteration nếu model train với early stopping)
+    start = time.perf_counter()
+    xgb_model = joblib.load(os.path.join(base_dir, "xgboost_model.pkl"))
+    # Giữ nguyên cách hiểu ô trống của model gốc: version train dense cũ (missing=NaN) cần input dense
+    missing = getattr(xgb_model, "missing", np.nan)
+    if not accepts_sparse(xgb_model):
+        X_fit, X_eval = X_fit.toarray(), X_eval.toarray()
+    report["base_metrics"]["xgb"] = _evaluate("xgb", y_eval, xgb_model.predict(X_eval))
+    booster = xgb_model.get_booster()
+    best_iteration = getattr(xgb_model, "best_iteration", None)
+    if best_iteration is not None:
+        booster = booster[: best_iteration + 1]
+    rounds_before = booster.num_boosted_rounds()
+    xgb_model = XGBRegressor(**dict(XGB_PARAMS, n_estimators=xgb_rounds, learning_rate=XGB_LEARNING_RATE,
+                                    missing=missing, n_jobs=n_jobs))
+    xgb_model.fit(X_fit, y_fit, xgb_model=booster)
+    joblib.dump(xgb_model, os.path.join(model_dir, "xgboost_model.pkl"))
+    write_xgboost(
+        os.path.join(model_dir, "bundle"), columns, xgb_model,
+        pickles=[os.path.join(model_dir, "xgboost_model.pkl")],
+    )
+    report["metrics"]["xgb"] = _evaluate("xgb", y_eval, xgb_model.predict(X_eval))
+    report["models"]["xgb"] = {"seconds": time.perf_counter() - start,
+                               "rounds_before": rounds_before, "rounds_added": xgb_rounds}
+
+    # Native categorical (version train trước khi có model này thì bỏ qua): boost tiếp như XGBoost,
+    # với mapping mã category của version gốc; category mới thành missing như khi phục vụ
+    if os.path.exists(os.path.join(base_dir, CAT_MODEL_FILE)):
+        start = time.perf_counter()
+        codes = CategoryCodeEncoder(load_category_codes(base_dir), columns)
+        C_fit, C_eval = codes.from_one_hot(X[fit_idx]), codes.from_one_hot(X[eval_idx])
+        cat_model = joblib.load(os.path.join(base_dir, CAT_MODEL_FILE))
+        report["base_metrics"]["cat"] = _evaluate("cat", y_eval, cat_model.predict(C_eval))
+        booster = cat_model.get_booster()
+        rounds_before = booster.num_boosted_rounds()
+        cat_model = XGBRegressor(**dict(CAT_PARAMS, n_estimators=xgb_rounds, learning_rate=XGB_LEARNING_RATE,
+                                        n_jobs=n_jobs, feature_types=codes.feature_types))
+        cat_model.fit(C_fit, y_fit, xgb_model=booster)
+        joblib.dump(cat_model, os.path.join(model_dir, CAT_MODEL_FILE))
+        save_category_codes(model_dir, codes.mapping)
+        write_native_categorical(
+            os.path.join(model_dir, "bundle"), columns, cat_model, codes.mapping,
+            pickles=[os.path.join(model_dir, name) for name in (CAT_MODEL_FILE, CATEGORY_CODES_FILE)],
+        )
+        report["metrics"]["cat"] = _evaluate("cat", y_eval, cat_model.predict(C_eval))
+        report["models"]["cat"] = {"seconds": time.perf_counter() - start,
+                                   "rounds_before": rounds_before, "rounds_added": xgb_rounds}
+
+    is_test = np.zeros(len(hashes), dtype=bool)
+    is_test[delta_test] = True
+    new_idx = np.concatenate([delta_train, delta_test])
+    save_training_rows(model_dir, np.concatenate([rows["rows"], hashes[new_idx]]),
+                       np.concatenate([rows["test"], is_test[new_idx]]))
+    report["seconds"] = time.perf_counter() - run_start
+    return report
+
+
+def incremental_retrain(data_path=None, store=None, base=None, rf_new_trees=None, xgb_rounds=XGB_ROUNDS,
+                        replay_ratio=REPLAY_RATIO, n_jobs=None, promote=True, keep=None, price_surface=False, log=print, **extra):
+    """
+    Update a published version with the new rows of cleaned.csv and publish the result as a new version.
+
+    Args:
+        data_path (str): cleaned.csv (mặc định data/preprocessing/cleaned.csv theo thư mục hiện tại)
+        store (ModelVersionStore): Kho version (mặc định src/models/versions)
+        base (str): Version gốc (mặc định version current)
+        rf_new_trees, xgb_rounds, replay_ratio, n_jobs: như update_models
+        promote, keep, price_surface, log, **extra: như orchestrator.train_models
+
+    Returns:
+        (version, report)
+
+    Raises:
+        TrainingError: Version gốc không có trạng thái incremental, hoặc không có dòng mới
+    """
+    from src.features.feature_engineering import default_data_path, file_hash
+    from src.models.model_versions import ModelVersionStore
+
+    data_path = data_path or default_data_path()
+    store = store or ModelVersionStore()
+    base = base or store.current()
+    if base is None:
+        raise TrainingError("No current model version to update; run a full training first")
+    base_dir = store.version_path(base)
+    store.info(base)
+
+    df = pd.read_csv(data_path)
+    staging = store.begin()
+    try:
+        report = update_models(base_dir, df, staging, rf_new_trees=rf_new_trees, xgb_rounds=xgb_rounds,
+                               replay_ratio=replay_ratio, n_jobs=n_jobs, log=log)
+        report["base"] = base
+
+        if price_surface:
+            try:
+                from src.models.price_surface import generate_price_surface
+                surface_start = time.perf_counter()
+                surface = generate_price_surface(staging, data_path)
+                report["price_surface_seconds"] = time.perf_counter() - surface_start
+                log(f"Price surface: {surface['combos']} combos, coverage {surface['coverage']:.1%}")
+            except Exception as e:
+                log(f"Price surface failed, publishing without it: {e}")
+
+        version = store.publish(
+            staging,
+            metrics=report["metrics"],
+            data_hash=file_hash(data_path),
+            promote=promote,
+            keep=keep,
+            incremental={key: value for key, value in report.items() if key != "metrics"},
+            **extra,
+        )
+    except BaseException:
+        store.discard(staging)
+        raise
+
+    log(format_report(report, version))
+    return version, report
+
+
+def format_report(report, version=None):
+    """Human-readable summary of an incremental update."""
+    lines = [f"Incremental update{f' {version}' if version else ''} from {report.get('base', '?')}: "
+             f"{report['new_train_rows']} new train rows (+{report['replay_rows']} replayed) on top of "
+             f"{report['base_rows']} "
+             f"({report['unseen_category_rows']} with unseen categories), {report['seconds']:.1f}s"]
+    lines.append(f"  {'model':<5} {'seconds':>8} {'MAE before':>14} {'MAE after':>14} {'R2 before':>10} {'R2 after':>10}")
+    for name, entry in report["models"].items():
+        before = report["base_metrics"][name]
+        after = report.get("metrics", {}).get(name) or before
+        lines.append(f"  {name:<5} {entry['seconds']:8.2f} {before['mae']:14,.0f} {after['mae']:14,.0f} "
+                     f"{before['r2']:10.4f} {after['r2']:10.4f}")
+    return "\n".join(lines)
+
+
+def compare_with_full_retrain(data_path, delta_fraction=0.1, workdir=None, xgb_rounds=XGB_ROUNDS, random_state=0):
+    """
+    Simulate a crawl: train on (1 - delta_fraction) of the rows, then add the rest either
+    incrementally or by a full retrain, and compare time and accuracy on the same eval rows.
+    """
+    import io
+    import tempfile
+    import contextlib
+    from src.features.feature_engineering import FeatureSet, build_features, encode_frame, row_hashes
+    from src.training.orchestrator import TRAINERS
+    import importlib
+
+    workdir = workdir or tempfile.mkdtemp(prefix="incremental-bench-")
+    df = pd.read_csv(data_path)
+    order = np.random.RandomState(random_state).permutation(len(df))
+    n_base = len(df) - int(len(df) * delta_fraction)
+    base_df = df.iloc[order[:n_base]].reset_index(drop=True)
+    full_df = df.iloc[order].reset_index(drop=True)
+    base_path = os.path.join(workdir, "base", "cleaned.csv")
+    os.makedirs(os.path.dirname(base_path), exist_ok=True)
+    base_df.to_csv(base_path, index=False)
+
+    def train_all(features, model_dir):
+        seconds = {}
+        metrics = {}
+        for name, (module_name, function_name) in TRAINERS.items():
+            trainer = getattr(importlib.import_module(f"src.training.{module_name}"), function_name)
+            start = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()):
+                metrics[name] = trainer(model_dir=model_dir, features=features)
+            seconds[name] = time.perf_counter() - start
+        return seconds, metrics
+
+    # Version gốc
+    base_features = build_features(base_path, cache_dir=os.path.join(workdir, "features"))
+    base_dir = os.path.join(workdir, "base_models")
+    train_all(base_features, base_dir)
+    save_training_rows(base_dir, base_features.row_hashes, base_features.test_mask)
+
+    # Cập nhật incremental
+    inc_dir = os.path.join(workdir, "incremental_models")
+    report = update_models(base_dir, full_df, inc_dir, xgb_rounds=xgb_rounds, log=lambda message: None)
+
+    # Train lại toàn bộ, đánh giá trên đúng các dòng đó
+    start = time.perf_counter()
+    X, columns, numeric_columns, y = encode_frame(full_df)
+    base_train, base_test, delta_train, delta_test = find_delta(
+        row_hashes(full_df), {"rows": base_features.row_hashes, "test": base_features.test_mask})
+    full_features = FeatureSet(X, y, columns, numeric_columns, np.concatenate([base_train, delta_train]),
+                               np.concatenate([base_test, delta_test]))
+    encode_seconds = time.perf_counter() - start
+    full_seconds, full_metrics = train_all(full_features, os.path.join(workdir, "full_models"))
+
+    print(f"{len(df)} rows: base {n_base}, new {len(df) - n_base} ({report['new_train_rows']} train), "
+          f"eval on {report['eval_rows']} rows (old test + new test)")
+    print(f"  {'model':<5} {'':<12} {'seconds':>8} {'MAE':>14} {'RMSE':>14} {'R2':>8}")
+    for name in TRAINERS:
+        rows = [
+            ("no update", None, report["base_metrics"][name]),
+            ("incremental", report["models"][name]["seconds"], report["metrics"][name]),
+            ("full retrain", full_seconds[name], full_metrics[name]),
+        ]
+        for label, seconds, m in rows:
+            print(f"  {name:<5} {label:<12} {'' if seconds is None else f'{seconds:8.2f}':>8} "
+                  f"{m['mae']:14,.0f} {m['rmse']:14,.0f} {m['r2']:8.4f}")
+    print(f"  total: incremental {report['seconds']:.1f}s (incl. {report['prepare_seconds']:.1f}s hashing/encoding) "
+          f"vs full retrain {encode_seconds + sum(full_seconds.values()):.1f}s")
+    shutil.rmtree(workdir, ignore_errors=True)
+    return report, full_seconds, full_metrics
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Update the current model version with newly crawled rows")
+    parser.add_argument("--data", help="path to cleaned.csv")
+    parser.add_argument("--base", help="version to update (default: current)")
+    parser.add_argument("--xgb-rounds", type=int, default=XGB_ROUNDS, help="boosting rounds to add")
+    parser.add_argument("--rf-trees", type=int, help="trees to add to the random forest")
+    parser.add_argument("--replay", type=float, default=REPLAY_RATIO, help="old train rows mixed in, per new row")
+    parser.add_argument("--no-promote", action="store_true", help="publish without moving the current pointer")
+    parser.add_argument("--keep", type=int, help="number of versions to keep")
+    parser.add_argument("--price-surface", action="store_true", help="also build the price surface (slow)")
+    parser.add_argument("--benchmark", action="store_true", help="compare against a full retrain on a simulated crawl")
+    parser.add_argument("--delta", type=float, default=0.1, help="fraction of rows treated as new in --benchmark")
+    args = parser.parse_args()
+
+    if args.benchmark:
+        from src.features.feature_engineering import default_data_path
+        compare_with_full_retrain(args.data or default_data_path(), args.delta, xgb_rounds=args.xgb_rounds)
+    else:
+        incremental_retrain(
+            data_path=args.data, base=args.base, rf_new_trees=args.rf_trees, xgb_rounds=args.xgb_rounds,
+            replay_ratio=args.replay,
+            promote=not args.no_promote, keep=args.keep, price_surface=args.price_surface,
+        )
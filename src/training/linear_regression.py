@@ -1,63 +1,48 @@
 import pandas as pd
 import numpy as np
+import scipy.sparse as sp
 import warnings
 import matplotlib.pyplot as plt
 from sklearn.preprocessing import StandardScaler
 from sklearn.linear_model import LinearRegression
-from sklearn.model_selection import train_test_split
 from sklearn.metrics import mean_squared_error, mean_absolute_error, r2_score
 import joblib
 import os
 
-def linear_regression_training():
-    # df = pd.read_csv("../../data/preprocessing/cleaned.csv")
+def linear_regression_training(model_dir=None, features=None):
+    # Ma trận đặc trưng dùng chung cho cả 3 trainer: cleaned.csv chỉ được đọc và
+    # one-hot một lần, cache theo hash nội dung (src/features/feature_engineering.py)
+    if features is None:
+        from src.features.feature_engineering import build_features
+        features = build_features()
 
-    # Xác định đường dẫn tuyệt đối tới cleaned.csv
-    cleaned_path = os.path.abspath(os.path.join(os.getcwd(), "data", "preprocessing", "cleaned.csv"))
+    numeric_cols = features.numeric_columns
+    n_numeric = len(numeric_cols)
 
-    # Đọc file
-    df = pd.read_csv(cleaned_path)
-
-
-    # One-hot encoding
-    df_encoded = pd.get_dummies(
-        df,
-        columns=[
-            "brand",
-            "model",
-            "fuel_type",
-            "transmission",
-            "origin",
-            "car_type",
-        ],
-    )
-
-    numeric_cols = ["year", "mileage", "seats"]
-
-    # Tách đặc trưng và target
-    X = df_encoded.drop("price", axis=1)
-    y = df_encoded[["price"]]
-
-    # Scale các cột số trong X
+    # Chỉ scale các cột số (luôn đứng đầu ma trận, vài cột dense); phần one-hot giữ nguyên CSR
     scaler_X = StandardScaler()
-    X_scaled = X.copy()
-    X_scaled[numeric_cols] = scaler_X.fit_transform(X_scaled[numeric_cols])
+    numeric_scaled = scaler_X.fit_transform(
+        pd.DataFrame(features.X[:, :n_numeric].toarray(), columns=numeric_cols))
+    X_scaled = sp.hstack([sp.csr_matrix(numeric_scaled), features.X[:, n_numeric:]], format="csr")
 
     # Scale nhãn (giá xe)
     scaler_y = StandardScaler()
-    y_scaled = scaler_y.fit_transform(y)
+    y_scaled = scaler_y.fit_transform(pd.DataFrame({"price": features.y}))
 
-    X_train, X_test, y_train, y_test = train_test_split(
-        X_scaled, y_scaled, test_size=0.2, random_state=42
-    )
+    X_train, X_test, y_train, y_test = features.split(X_scaled, y_scaled)
 
     print("--------------Linear Regression------------------")
     print("Bắt đầu training model Linear Regression")
-    lr_model = LinearRegression()
-    lr_model.fit(X_train, y_train)
+    # Giải từ X^T X, X^T y (cỡ số cột x số cột) tính trên ma trận sparse, cùng nghiệm như
+    # LinearRegression.fit trên bản dense (fit với input sparse của sklearn dùng lsqr, cho hệ số khác).
+    # Các thống kê này được lưu lại để train incremental (src/training/incremental.py)
+    from src.training.incremental import linear_stats, solve_linear_stats, save_linear_stats
+    stats = linear_stats(X_train, y_train)
+    lr_model = solve_linear_stats(*stats[:2])
     print("Training model Linear Regression đã hoàn tất")
 
-    model_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'models'))
+    # model_dir: thư mục staging của một version mới (mặc định ghi thẳng vào src/models)
+    model_dir = model_dir or os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'models'))
     os.makedirs(model_dir, exist_ok=True)
     # Lưu model vào file
     # joblib.dump(lr_model, "../models/linear_regression_model.pkl")
@@ -66,6 +51,16 @@ def linear_regression_training():
     joblib.dump(lr_model, os.path.join(model_dir, "linear_regression_model.pkl"))
     joblib.dump(scaler_X, os.path.join(model_dir, "scaler_X.pkl"))
     joblib.dump(scaler_y, os.path.join(model_dir, "scaler_y.pkl"))
+    save_linear_stats(model_dir, *stats)
+
+    # Ghi thêm hệ số + tham số scaler vào bundle định dạng gốc (nạp nhanh khi phục vụ)
+    from src.models.model_bundle import write_linear_regression
+    write_linear_regression(
+        os.path.join(model_dir, "bundle"), features.columns, lr_model, scaler_X, scaler_y,
+        numeric_columns=numeric_cols,
+        pickles=[os.path.join(model_dir, name) for name in
+                 ("linear_regression_model.pkl", "scaler_X.pkl", "scaler_y.pkl")],
+    )
 
     print("Đã lưu model Linear Regression")
 
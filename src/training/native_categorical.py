@@ -0,0 +1,201 @@
+"""
+Native-categorical gradient boosting: the fourth model engine.
+
+LR, RF and XGBoost all read the one-hot matrix, whose width grows with every
+new model name (~540 columns today, most of them `model_*`). This engine
+reads 9 columns instead - year, mileage, seats and one integer code per
+categorical field - and lets XGBoost split on the categories directly
+(enable_categorical, partition-based splits over the codes).
+
+XGBoost rather than sklearn's HistGradientBoostingRegressor: HGB caps the
+cardinality of a categorical feature at max_bins (255) and `model` already
+has 162 values; XGBoost has no such limit and is a dependency already.
+
+The code mapping (category -> code, cùng thứ tự cột one-hot) is saved next to
+the model as category_codes.json and loaded with it when serving; a category
+the mapping does not know is encoded as missing.
+
+Chạy benchmark so với 3 model hiện có (từ thư mục gốc project):
+    python -m src.training.native_categorical [path/to/cleaned.csv]
+"""
+import os
+import io
+import json
+import time
+import shutil
+import tempfile
+import contextlib
+import numpy as np
+from xgboost import XGBRegressor
+from sklearn.metrics import mean_absolute_error, mean_squared_error, r2_score
+import joblib
+
+CAT_MODEL_FILE = "native_categorical_model.pkl"
+CATEGORY_CODES_FILE = "category_codes.json"
+
+# max_cat_to_onehot=1: mọi trường category chia theo nhóm category (partition), không one-hot từng giá trị.
+# learning_rate 0.05 cho R2 tốt hơn 0.1 một chút với cùng 1000 vòng
+CAT_PARAMS = dict(n_estimators=1000, learning_rate=0.05, max_depth=6, random_state=42,
+                  tree_method="hist", enable_categorical=True, max_cat_to_onehot=1)
+
+
+def category_code_matrix(features):
+    """(CategoryCodeEncoder, float32 code matrix) for a FeatureSet, derived from its one-hot vocabulary."""
+    from src.models.feature_encoder import CategoryCodeEncoder, category_codes_from_columns
+
+    encoder = CategoryCodeEncoder(category_codes_from_columns(features.columns), features.columns)
+    return encoder, encoder.from_one_hot(features.X)
+
+
+def save_category_codes(model_dir, mapping):
+    with open(os.path.join(model_dir, CATEGORY_CODES_FILE), "w", encoding="utf-8") as f:
+        json.dump(mapping, f, ensure_ascii=False)
+
+
+def load_category_codes(model_dir):
+    with open(os.path.join(model_dir, CATEGORY_CODES_FILE), encoding="utf-8") as f:
+        return json.load(f)
+
+
+def native_categorical_training(model_dir=None, features=None, n_jobs=-1):
+    # Ma trận đặc trưng dùng chung; mã category được suy ra từ các cột one-hot của nó
+    if features is None:
+        from src.features.feature_engineering import build_features
+        features = build_features()
+
+    encoder, X = category_code_matrix(features)
+    X_train, X_test, y_train, y_test = features.split(X)
+
+    print("--------------Native categorical (XGBoost)------------------")
+    print(f"Bắt đầu training model native categorical ({X.shape[1]} cột thay vì {len(features.columns)})")
+    cat_model = XGBRegressor(**dict(CAT_PARAMS, n_jobs=n_jobs, feature_types=encoder.feature_types))
+    cat_model.fit(X_train, y_train)
+    print("Training model native categorical đã hoàn tất")
+
+    # model_dir: thư mục staging của một version mới (mặc định ghi thẳng vào src/models)
+    model_dir = model_dir or os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'models'))
+    os.makedirs(model_dir, exist_ok=True)
+    joblib.dump(cat_model, os.path.join(model_dir, CAT_MODEL_FILE))
+    save_category_codes(model_dir, encoder.mapping)
+
+    from src.models.model_bundle import write_native_categorical
+    write_native_categorical(
+        os.path.join(model_dir, "bundle"), features.columns, cat_model, encoder.mapping,
+        pickles=[os.path.join(model_dir, name) for name in (CAT_MODEL_FILE, CATEGORY_CODES_FILE)],
+    )
+    print("Đã lưu model native categorical")
+
+    y_pred = cat_model.predict(X_test)
+
+    def Accuracy_Score(orig, pred):
+        mape = np.mean(100 * np.abs(orig - pred) / orig)
+        return 100 - mape
+
+    mae = mean_absolute_error(y_test, y_pred)
+    rmse = np.sqrt(mean_squared_error(y_test, y_pred))
+    r2 = r2_score(y_test, y_pred)
+    accuracy = Accuracy_Score(y_test, y_pred)
+
+    print(f"MAE of native categorical: {mae}")
+    print(f"RMSE of native categorical: {rmse}")
+    print(f"R2 of native categorical: {r2}")
+    print(f"Accuracy (100 - MAPE): {accuracy}%")
+
+    return {
+        "model": "XGBoost (native categorical)",
+        "mae": mae,
+        "rmse": rmse,
+        "r2": r2,
+        "accuracy": accuracy,
+        "n_features": int(X.shape[1]),
+    }
+
+
+def _median_ms(fn, repeat):
+    fn()
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return float(np.median(timings)) * 1e3
+
+
+def benchmark_engines(features, n_jobs=-1, n_latency=200, batch_rows=1000):
+    """
+    Train the four engines on the shared split and compare train time, size of the
+    saved model files, input width, encode + predict latency (1 row / `batch_rows`
+    rows, native predict of each model) and test MAE / R2.
+    """
+    import pandas as pd
+    from functools import partial
+    from src.models.feature_encoder import FeatureEncoder, CategoryCodeEncoder, predict_aligned
+    from src.models.compiled_lr import CompiledLinearRegression
+    from src.training.orchestrator import TRAINERS
+    import importlib
+
+    # Các file model của từng engine (không tính model_columns.pkl dùng chung)
+    model_files = {
+        "lr": ("linear_regression_model.pkl", "scaler_X.pkl", "scaler_y.pkl"),
+        "rf": ("random_forest_model.pkl",),
+        "xgb": ("xgboost_model.pkl",),
+        "cat": (CAT_MODEL_FILE, CATEGORY_CODES_FILE),
+    }
+    workdir = tempfile.mkdtemp(prefix="engines-")
+    try:
+        results = {}
+        for name, (module_name, function_name) in TRAINERS.items():
+            trainer = getattr(importlib.import_module(f"src.training.{module_name}"), function_name)
+            kwargs = {"model_dir": workdir, "features": features}
+            if name != "lr":
+                kwargs["n_jobs"] = n_jobs
+            start = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()):
+                metrics = trainer(**kwargs)
+            results[name] = {
+                "train_seconds": time.perf_counter() - start,
+                "size_mb": sum(os.path.getsize(os.path.join(workdir, f)) for f in model_files[name]) / 1e6,
+                "mae": float(metrics["mae"]),
+                "r2": float(metrics["r2"]),
+            }
+
+        # Xe thật từ tập test, dạng dict như khi phục vụ
+        source = pd.read_csv(features.meta["data_path"]).iloc[features.test_idx[:batch_rows]]
+        cars = source.drop(columns=["price"]).to_dict(orient="records")
+        one_hot = FeatureEncoder(joblib.load(os.path.join(workdir, "model_columns.pkl")))
+        codes = CategoryCodeEncoder(load_category_codes(workdir))
+
+        lr_scorer = CompiledLinearRegression.from_models(
+            one_hot.columns, *(joblib.load(os.path.join(workdir, f)) for f in model_files["lr"]))
+        rf_model = joblib.load(os.path.join(workdir, "random_forest_model.pkl"))
+        xgb_model = joblib.load(os.path.join(workdir, "xgboost_model.pkl"))
+        cat_model = joblib.load(os.path.join(workdir, CAT_MODEL_FILE))
+        predictors = {
+            "lr": (one_hot, lr_scorer.predict_matrix),
+            "rf": (one_hot, partial(predict_aligned, rf_model)),
+            "xgb": (one_hot, partial(predict_aligned, xgb_model)),
+            "cat": (codes, partial(predict_aligned, cat_model)),
+        }
+        for name, (encoder, predict) in predictors.items():
+            results[name]["n_features"] = encoder.n_features
+            results[name]["predict_1_ms"] = _median_ms(lambda: predict(encoder.transform(cars[:1])), n_latency)
+            results[name]["predict_batch_ms"] = _median_ms(lambda: predict(encoder.transform(cars)), 5)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    print(f"Model engines ({len(features.train_idx)} train / {len(features.test_idx)} test rows, "
+          f"latency = encode + native predict)")
+    print(f"  {'engine':<6} {'train s':>8} {'size MB':>8} {'columns':>8} {'1 row ms':>9} "
+          f"{f'{len(cars)} rows ms':>12} {'MAE':>14} {'R2':>7}")
+    for name, r in results.items():
+        print(f"  {name:<6} {r['train_seconds']:8.2f} {r['size_mb']:8.2f} {r['n_features']:8d} "
+              f"{r['predict_1_ms']:9.3f} {r['predict_batch_ms']:12.2f} {r['mae']:14,.0f} {r['r2']:7.4f}")
+    return results
+
+
+if __name__ == "__main__":
+    import sys
+
+    from src.features.feature_engineering import build_features
+
+    benchmark_engines(build_features(sys.argv[1] if len(sys.argv) > 1 else None))
@@ -0,0 +1,352 @@
+"""
+Parallel training orchestrator.
+
+LR, RF, XGBoost and the native-categorical XGBoost are trained at the same
+time, each in its own Python process with an explicit core budget (n_jobs
+plus the BLAS/OpenMP thread limits of that process). Every trainer writes
+into a private part folder of one staging version; only when all of them
+succeed are the parts merged and the version published
+(src/models/model_versions.py). If one trainer fails the others are stopped
+and nothing is published.
+
+Each run reports wall-clock time, CPU time and peak RSS per model, which is
+also saved in the version's version.json under "training".
+
+Chạy từ thư mục gốc project:
+    python -m src.training.orchestrator [--cores lr=1,rf=4,xgb=2,cat=1] [--sequential] [--no-promote]
+                                        [--xgb-mode early-stopping]
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import importlib
+import subprocess
+
+# Tên model -> (module trong src/training, hàm train)
+TRAINERS = {
+    "lr": ("linear_regression", "linear_regression_training"),
+    "rf": ("random_forest", "random_forest_training"),
+    "xgb": ("xgboost_train", "xgboost_training"),
+    "cat": ("native_categorical", "native_categorical_training"),
+}
+
+# Giới hạn số thread của các thư viện tính toán trong process con
+THREAD_ENV_VARS = ("OMP_NUM_THREADS", "OPENBLAS_NUM_THREADS", "MKL_NUM_THREADS", "NUMEXPR_NUM_THREADS")
+
+PARTS_DIRNAME = ".parts"
+RESULT_FILE = "result.json"
+LOG_FILE = "train.log"
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+
+
+class TrainingError(RuntimeError):
+    """A trainer failed; nothing was published. `report` holds what was measured."""
+
+    def __init__(self, message, report=None):
+        super().__init__(message)
+        self.report = report
+
+
+def default_core_budgets(total=None):
+    """Split the machine's cores: LR is fast and gets one, RF half of the rest, the two boosters the others."""
+    total = total or os.cpu_count() or 1
+    rest = max(total - 1, 1)
+    rf = max(rest // 2, 1)
+    xgb = max((rest - rf + 1) // 2, 1)
+    return {"lr": 1, "rf": rf, "xgb": xgb, "cat": max(rest - rf - xgb, 1)}
+
+
+def parse_core_budgets(value):
+    """Parse 'lr=1,rf=4,xgb=3' (or a dict) into {name: cores}, filling missing models with defaults."""
+    budgets = default_core_budgets()
+    if isinstance(value, dict):
+        items = value.items()
+    else:
+        items = (part.split("=", 1) for part in (value or "").split(",") if part.strip())
+    for name, cores in items:
+        name = name.strip()
+        if name not in TRAINERS:
+            raise ValueError(f"Unknown model {name!r}, expected one of {tuple(TRAINERS)}")
+        budgets[name] = max(1, int(cores))
+    return budgets
+
+
+def _cpu_seconds():
+    """User + system CPU time of this process, its threads and finished child processes."""
+    try:
+        import resource
+    except ImportError:
+        return time.process_time()
+    total = 0.0
+    for who in (resource.RUSAGE_SELF, resource.RUSAGE_CHILDREN):
+        usage = resource.getrusage(who)
+        total += usage.ru_utime + usage.ru_stime
+    return total
+
+
+def _peak_rss_mb():
+    """Peak resident set size of this process in MB (None where the OS does not report it)."""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux trả về KB, macOS trả về byte
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def _run_worker(name, model_dir, features_dir, cores, result_path, options=None):
+    """Process entry point: train one model into model_dir and write its metrics and usage."""
+    from src.features.feature_engineering import FeatureSet
+
+    start = time.perf_counter()
+    module_name, function_name = TRAINERS[name]
+    trainer = getattr(importlib.import_module(f"src.training.{module_name}"), function_name)
+    kwargs = {"model_dir": model_dir, "features": FeatureSet.load(features_dir)}
+    if name != "lr":
+        kwargs["n_jobs"] = cores
+    kwargs.update(options or {})
+    metrics = trainer(**kwargs)
+
+    result = {
+        "metrics": {key: value if isinstance(value, (str, int, type(None))) else float(value)
+                    for key, value in metrics.items()},
+        "train_seconds": time.perf_counter() - start,
+        "cpu_seconds": _cpu_seconds(),
+        "peak_rss_mb": _peak_rss_mb(),
+    }
+    with open(result_path, "w", encoding="utf-8") as f:
+        json.dump(result, f)
+
+
+def _start_worker(name, part_dir, features_dir, cores, options=None):
+    os.makedirs(part_dir, exist_ok=True)
+    env = dict(os.environ)
+    env.update({var: str(cores) for var in THREAD_ENV_VARS})
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [PROJECT_ROOT, env.get("PYTHONPATH")]))
+    env["MPLBACKEND"] = "Agg"
+    command = [
+        sys.executable, "-m", "src.training.orchestrator", "--worker", name,
+        "--model-dir", part_dir, "--features", features_dir, "--cores", str(cores),
+        "--result", os.path.join(part_dir, RESULT_FILE), "--options", json.dumps(options or {}),
+    ]
+    log = open(os.path.join(part_dir, LOG_FILE), "w", encoding="utf-8")
+    # cwd giữ nguyên: các trainer vẫn tìm data/ theo thư mục hiện tại
+    process = subprocess.Popen(command, env=env, stdout=log, stderr=subprocess.STDOUT)
+    return process, log
+
+
+def _log_tail(part_dir, lines=20):
+    try:
+        with open(os.path.join(part_dir, LOG_FILE), encoding="utf-8", errors="replace") as f:
+            return "".join(f.readlines()[-lines:])
+    except OSError:
+        return ""
+
+
+def _merge_parts(staging, parts_dir, names):
+    """Move every part's artifacts into the staging version; bundle components are merged."""
+    from src.models.model_bundle import merge_bundles
+
+    bundle_parts = []
+    for name in names:
+        part_dir = os.path.join(parts_dir, name)
+        for filename in os.listdir(part_dir):
+            path = os.path.join(part_dir, filename)
+            if filename == "bundle":
+                bundle_parts.append(path)
+            elif filename not in (RESULT_FILE, LOG_FILE) and os.path.isfile(path):
+                os.replace(path, os.path.join(staging, filename))
+    if bundle_parts:
+        merge_bundles(os.path.join(staging, "bundle"), bundle_parts)
+    shutil.rmtree(parts_dir, ignore_errors=True)
+
+
+def train_models(data_path=None, store=None, cores=None, max_parallel=None, promote=True, keep=None,
+                 price_surface=False, options=None, log=print, **extra):
+    """
+    Train every model in parallel processes and publish them together as one version.
+
+    Args:
+        data_path (str): cleaned.csv (mặc định data/preprocessing/cleaned.csv theo thư mục hiện tại)
+        store (ModelVersionStore): Kho version để publish (mặc định src/models/versions)
+        cores (dict | str): Số core cho từng model, vd {'rf': 4} hoặc 'rf=4,xgb=3'
+        max_parallel (int): Số trainer chạy cùng lúc (mặc định tất cả; 1 = lần lượt)
+        options (dict): Tham số thêm cho từng trainer, vd {'xgb': {'mode': 'early-stopping'}}
+        promote (bool): Chuyển con trỏ current sang version mới
+        keep (int): Số version giữ lại sau khi publish
+        price_surface (bool): Tính price surface cho version mới (lỗi ở bước này chỉ được ghi log); tắt mặc định
+                              vì chiếm phần lớn thời gian train (~250s trong ~274s) và chỉ dùng khi
+                              PRICE_SURFACE_ENABLED
+        log (callable): Hàm ghi log tiến trình
+        **extra: Thông tin thêm ghi vào version.json
+
+    Returns:
+        (version, report)
+
+    Raises:
+        TrainingError: Một trainer lỗi; không version nào được publish
+    """
+    from src.features.feature_engineering import build_features, default_data_path
+    from src.models.model_versions import ModelVersionStore
+
+    data_path = data_path or default_data_path()
+    store = store or ModelVersionStore()
+    budgets = parse_core_budgets(cores)
+    options = options or {}
+    names = list(TRAINERS)
+    max_parallel = max_parallel or len(names)
+
+    run_start = time.perf_counter()
+    features = build_features(data_path)
+    log(f"Feature set {features.key}: {features.X.shape[0]} rows x {features.X.shape[1]} columns "
+        f"({time.perf_counter() - run_start:.1f}s)")
+
+    staging = store.begin()
+    parts_dir = os.path.join(staging, PARTS_DIRNAME)
+    report = {
+        "cpu_count": os.cpu_count(),
+        "max_parallel": max_parallel,
+        "feature_seconds": time.perf_counter() - run_start,
+        "models": {name: {"cores": budgets[name], "options": options.get(name, {}), "status": "pending"}
+                   for name in names},
+    }
+    running = {}
+    pending = list(names)
+    failed = None
+    try:
+        while (pending or running) and failed is None:
+            while pending and len(running) < max_parallel:
+                name = pending.pop(0)
+                process, log_file = _start_worker(name, os.path.join(parts_dir, name), features.directory,
+                                                  budgets[name], options.get(name))
+                running[name] = (process, log_file, time.perf_counter())
+                report["models"][name]["status"] = "running"
+                log(f"Training {name} ({budgets[name]} cores, pid {process.pid})")
+
+            time.sleep(0.2)
+            for name, (process, log_file, started) in list(running.items()):
+                if process.poll() is None:
+                    continue
+                log_file.close()
+                del running[name]
+                entry = report["models"][name]
+                entry["wall_seconds"] = time.perf_counter() - started
+                result_path = os.path.join(parts_dir, name, RESULT_FILE)
+                if process.returncode != 0 or not os.path.exists(result_path):
+                    entry["status"] = "failed"
+                    entry["returncode"] = process.returncode
+                    failed = (name, _log_tail(os.path.join(parts_dir, name)))
+                    break
+                with open(result_path, encoding="utf-8") as f:
+                    entry.update(json.load(f))
+                entry["status"] = "ok"
+                log(f"{name} done in {entry['wall_seconds']:.1f}s (cpu {entry['cpu_seconds']:.1f}s, "
+                    f"peak RSS {entry['peak_rss_mb'] or 0:.0f} MB)")
+
+        if failed is not None:
+            # Một model lỗi: dừng các trainer còn lại, không publish gì cả
+            for name, (process, log_file, _) in running.items():
+                process.kill()
+                process.wait()
+                log_file.close()
+                report["models"][name]["status"] = "cancelled"
+            running = {}
+            name, tail = failed
+            raise TrainingError(f"Training {name} failed (exit code {report['models'][name]['returncode']}):\n{tail}",
+                                report)
+
+        report["train_seconds"] = time.perf_counter() - run_start - report["feature_seconds"]
+        report["sequential_seconds"] = sum(report["models"][name]["wall_seconds"] for name in names)
+        _merge_parts(staging, parts_dir, names)
+        # Hash các dòng đã dùng (và dòng nào thuộc tập test) để train incremental sau này chỉ lấy dòng mới
+        from src.training.incremental import save_training_rows
+        save_training_rows(staging, features.row_hashes, features.test_mask)
+
+        if price_surface:
+            try:
+                from src.models.price_surface import generate_price_surface
+                surface_start = time.perf_counter()
+                surface = generate_price_surface(staging, data_path)
+                report["price_surface_seconds"] = time.perf_counter() - surface_start
+                log(f"Price surface: {surface['combos']} combos, coverage {surface['coverage']:.1%}")
+            except Exception as e:
+                log(f"Price surface failed, publishing without it: {e}")
+
+        report["wall_seconds"] = time.perf_counter() - run_start
+        version = store.publish(
+            staging,
+            metrics={name: report["models"][name].pop("metrics") for name in names},
+            data_hash=features.data_hash,
+            promote=promote,
+            keep=keep,
+            features=features.key,
+            training=report,
+            **extra,
+        )
+    except BaseException:
+        for process, log_file, _ in running.values():
+            process.kill()
+            process.wait()
+            log_file.close()
+        store.discard(staging)
+        raise
+
+    log(format_report(report, version))
+    return version, report
+
+
+def format_report(report, version=None):
+    """Human-readable per-model resource table of a training run."""
+    lines = [f"Training report{f' for {version}' if version else ''} "
+             f"({report['cpu_count']} CPUs, up to {report['max_parallel']} trainers at once)"]
+    lines.append(f"  {'model':<5} {'cores':>5} {'wall s':>8} {'cpu s':>8} {'cpu/wall':>8} {'peak RSS MB':>12}")
+    for name, entry in report["models"].items():
+        wall = entry.get("wall_seconds")
+        cpu = entry.get("cpu_seconds")
+        if wall is None or cpu is None:
+            lines.append(f"  {name:<5} {entry['cores']:>5} {entry['status']:>8}")
+            continue
+        lines.append(f"  {name:<5} {entry['cores']:>5} {wall:8.1f} {cpu:8.1f} {cpu / wall:8.2f} "
+                     f"{entry['peak_rss_mb'] or 0:12.0f}")
+    if "train_seconds" in report:
+        lines.append(f"  training wall {report['train_seconds']:.1f}s vs {report['sequential_seconds']:.1f}s "
+                     f"if run one after another; total incl. features/surface {report.get('wall_seconds', 0):.1f}s")
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Train LR / RF / XGBoost / native categorical in parallel "
+                                                 "and publish a model version")
+    parser.add_argument("--cores", help="core budget per model, e.g. lr=1,rf=4,xgb=2,cat=1")
+    parser.add_argument("--sequential", action="store_true", help="run the trainers one at a time")
+    parser.add_argument("--no-promote", action="store_true", help="publish without moving the current pointer")
+    parser.add_argument("--keep", type=int, help="number of versions to keep")
+    parser.add_argument("--data", help="path to cleaned.csv")
+    parser.add_argument("--xgb-mode", choices=("full", "early-stopping"), help="XGBoost training mode")
+    parser.add_argument("--price-surface", action="store_true", help="also build the price surface (slow)")
+    # Chế độ process con (do orchestrator tự gọi)
+    parser.add_argument("--worker", choices=tuple(TRAINERS), help=argparse.SUPPRESS)
+    parser.add_argument("--model-dir", help=argparse.SUPPRESS)
+    parser.add_argument("--features", help=argparse.SUPPRESS)
+    parser.add_argument("--result", help=argparse.SUPPRESS)
+    parser.add_argument("--options", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        _run_worker(args.worker, args.model_dir, args.features, int(args.cores), args.result,
+                    json.loads(args.options or "{}"))
+    else:
+        train_models(
+            data_path=args.data,
+            cores=args.cores,
+            max_parallel=1 if args.sequential else None,
+            promote=not args.no_promote,
+            keep=args.keep,
+            price_surface=args.price_surface,
+            options={"xgb": {"mode": args.xgb_mode}} if args.xgb_mode else None,
+        )
@@ -1,61 +1,41 @@
 import pandas as pd
 import numpy as np
 from sklearn.ensemble import RandomForestRegressor
-from sklearn.model_selection import train_test_split
 from sklearn.metrics import mean_squared_error, mean_absolute_error, r2_score
 from sklearn.preprocessing import StandardScaler
 import joblib
 import matplotlib.pyplot as plt
 import os
 
-def random_forest_training():
-    # Đọc dữ liệu đã one-hot encode
-    # df = pd.read_csv("../../data/preprocessing/cleaned.csv")
-    # Xác định đường dẫn tuyệt đối tới cleaned.csv
-    cleaned_path = os.path.abspath(os.path.join(os.getcwd(), "data", "preprocessing", "cleaned.csv"))
-
-    # Đọc file
-    df = pd.read_csv(cleaned_path)
-
-    # One-hot encoding các cột categorical
-    df_encoded = pd.get_dummies(
-        df,
-        columns=[
-            "brand",
-            "model",
-            "fuel_type",
-            "transmission",
-            "origin",
-            "car_type",
-        ],
-    )
+# Khi bản dense float32 của ma trận đặc trưng lớn hơn ngưỡng này (MB), RF train thẳng trên CSR
+RF_DENSE_MAX_MB = 1024
 
-    # joblib.dump(
-    #     df_encoded.drop("price", axis=1).columns.tolist(), "../models/model_columns.pkl"
-    # )
 
-    model_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'models'))
-    os.makedirs(model_dir, exist_ok=True)
-
-    joblib.dump(
-        df_encoded.drop("price", axis=1).columns.tolist(),
-        os.path.join(model_dir, "model_columns.pkl")
-    )
+def random_forest_training(model_dir=None, features=None, n_jobs=None, sparse=None):
+    # Ma trận đặc trưng dùng chung (đọc + one-hot cleaned.csv một lần, cache theo hash nội dung)
+    if features is None:
+        from src.features.feature_engineering import build_features
+        features = build_features()
 
+    # model_dir: thư mục staging của một version mới (mặc định ghi thẳng vào src/models)
+    model_dir = model_dir or os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'models'))
+    os.makedirs(model_dir, exist_ok=True)
 
-    # Tách đặc trưng và target
-    X = df_encoded.drop("price", axis=1)
-    y = df_encoded["price"]
+    joblib.dump(features.columns, os.path.join(model_dir, "model_columns.pkl"))
 
-    # Chia dữ liệu train/test
-    X_train, X_test, y_train, y_test = train_test_split(
-        X, y, test_size=0.2, random_state=42
-    )
+    # sparse=True: train thẳng trên CSR (sklearn chuyển sang CSC float32, ô trống là 0), không
+    # cần bản dense n_rows x n_cột. Splitter sparse chậm hơn ~3 lần ở cỡ dữ liệu hiện tại và
+    # cho cây hơi khác, nên mặc định (None) chỉ dùng CSR khi bản dense vượt RF_DENSE_MAX_MB
+    if sparse is None:
+        sparse = features.X.shape[0] * features.X.shape[1] * 4 / 1e6 > RF_DENSE_MAX_MB
+    X = features.X.astype(np.float32) if sparse else features.dense()
+    X_train, X_test, y_train, y_test = features.split(X)
 
     # Khởi tạo và train Random Forest
     print("--------------Random Forest------------------")
     print("Bắt đầu training model Random Forest")
-    rf_model = RandomForestRegressor(n_estimators=100, random_state=42)
+    # n_jobs: số core được cấp (orchestrator chạy song song nhiều trainer); None = 1 core như trước
+    rf_model = RandomForestRegressor(n_estimators=100, random_state=42, n_jobs=n_jobs)
     rf_model.fit(X_train, y_train)
     print("Training model Random Forest đã hoàn tất")
 
@@ -63,6 +43,13 @@ def random_forest_training():
     # Lưu model
     # joblib.dump(rf_model, "../models/random_forest_model.pkl")
     joblib.dump(rf_model, os.path.join(model_dir, "random_forest_model.pkl"))
+
+    # Ghi thêm các mảng nút cây vào bundle (np.load mmap_mode='r' khi phục vụ)
+    from src.models.model_bundle import write_random_forest
+    write_random_forest(
+        os.path.join(model_dir, "bundle"), features.columns, rf_model,
+        pickles=[os.path.join(model_dir, name) for name in ("random_forest_model.pkl", "model_columns.pkl")],
+    )
     print("Đã lưu model Random Forest")
 
     # Dự đoán
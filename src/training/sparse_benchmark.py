@@ -0,0 +1,203 @@
+"""
+Dense vs sparse training benchmark on synthetic data.
+
+The one-hot design matrix is ~9 non-zeros per row over hundreds of columns,
+and the number of columns grows with every crawl (new model names). This
+compares, per model and data size, the old dense path (pd.get_dummies ->
+dense ndarray) with the sparse path the trainers use now (encode_frame ->
+CSR):
+
+    LR       dense: LinearRegression.fit (lstsq)    sparse: X^T X / X^T y từ CSR
+    RF       dense: ndarray float32                 sparse: CSR (sklearn dùng CSC)
+    XGBoost  dense: ndarray float32, missing=0      sparse: CSR, missing=0
+
+Every (size, path, model) runs in its own process so peak RSS is measured
+cleanly. A dense run that would not fit in the available memory is skipped
+and reported with the size it would have needed.
+
+Synthetic rows are resampled from cleaned.csv with jittered year, mileage
+and price; model names get variants so the vocabulary grows with sqrt(rows),
+as it does when more listings are crawled.
+
+Chạy từ thư mục gốc project:
+    python -m src.training.sparse_benchmark [--sizes 10000,100000,1000000] [--models lr,rf,xgb]
+                                            [--rf-trees 10] [--xgb-rounds 100] [--data path/to/cleaned.csv]
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import subprocess
+import numpy as np
+import pandas as pd
+
+from src.features.feature_engineering import CATEGORICAL_COLUMNS, TARGET_COLUMN, default_data_path, encode_frame
+
+DEFAULT_SIZES = (10_000, 100_000, 1_000_000)
+MODELS = ("lr", "rf", "xgb")
+PATHS = ("dense", "sparse")
+
+
+def synthetic_cars(n_rows, source=None, seed=0):
+    """Resample cleaned.csv into `n_rows` synthetic listings with a vocabulary that grows with the data."""
+    df = pd.read_csv(source or default_data_path())
+    rng = np.random.RandomState(seed)
+    cars = df.iloc[rng.randint(0, len(df), n_rows)].reset_index(drop=True)
+
+    # Biến thể tên dòng xe: số cột one-hot tăng theo căn bậc hai lượng dữ liệu
+    variants = max(1, int(round(np.sqrt(n_rows / len(df)))))
+    suffix = pd.Series(rng.randint(0, variants, n_rows))
+    cars["model"] = cars["model"].astype(str).where(suffix == 0, cars["model"].astype(str) + " v" + suffix.astype(str))
+    cars["year"] = np.clip(cars["year"] + rng.randint(-1, 2, n_rows), df["year"].min(), df["year"].max())
+    cars["mileage"] = (cars["mileage"] * rng.uniform(0.8, 1.2, n_rows)).round()
+    cars["price"] = (cars["price"] * rng.lognormal(0.0, 0.05, n_rows)).round()
+    return cars
+
+
+def _available_mb():
+    """MemAvailable from /proc/meminfo (None where it is not available)."""
+    try:
+        with open("/proc/meminfo") as f:
+            for line in f:
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        return None
+    return None
+
+
+def _matrix_mb(X):
+    if hasattr(X, "indptr"):
+        return (X.data.nbytes + X.indices.nbytes + X.indptr.nbytes) / 1e6
+    return X.nbytes / 1e6
+
+
+def _run_case(n_rows, path, model, source, rf_trees, xgb_rounds):
+    """Worker: build the matrix the way `path` does, fit `model`, return timings and memory."""
+    from sklearn.model_selection import train_test_split
+    from src.training.orchestrator import _peak_rss_mb
+
+    cars = synthetic_cars(n_rows, source)
+    baseline_mb = _peak_rss_mb()
+
+    start = time.perf_counter()
+    if path == "dense":
+        # Đường cũ: get_dummies rồi ma trận dense (float64 cho LR như trước, float32 cho cây)
+        encoded = pd.get_dummies(cars, columns=CATEGORICAL_COLUMNS)
+        X = encoded.drop(TARGET_COLUMN, axis=1).to_numpy(dtype=np.float64 if model == "lr" else np.float32)
+        y = encoded[TARGET_COLUMN].to_numpy(dtype=np.float64)
+        del encoded
+    else:
+        X, _, _, y = encode_frame(cars)
+        if model != "lr":
+            X = X.astype(np.float32)
+    encode_seconds = time.perf_counter() - start
+    del cars
+
+    train_idx, _ = train_test_split(np.arange(X.shape[0]), test_size=0.2, random_state=42)
+    X_train, y_train = X[train_idx], y[train_idx]
+
+    start = time.perf_counter()
+    if model == "lr":
+        from sklearn.preprocessing import StandardScaler
+        scaler = StandardScaler()
+        if path == "dense":
+            from sklearn.linear_model import LinearRegression
+            X_train[:, :3] = scaler.fit_transform(X_train[:, :3])
+            LinearRegression().fit(X_train, y_train)
+        else:
+            import scipy.sparse as sp
+            from src.training.incremental import linear_stats, solve_linear_stats
+            numeric = scaler.fit_transform(X_train[:, :3].toarray())
+            X_train = sp.hstack([sp.csr_matrix(numeric), X_train[:, 3:]], format="csr")
+            solve_linear_stats(*linear_stats(X_train, y_train)[:2])
+    elif model == "rf":
+        from sklearn.ensemble import RandomForestRegressor
+        RandomForestRegressor(n_estimators=rf_trees, random_state=42).fit(X_train, y_train)
+    else:
+        from xgboost import XGBRegressor
+        from src.training.xgboost_train import XGB_PARAMS
+        XGBRegressor(**dict(XGB_PARAMS, n_estimators=xgb_rounds)).fit(X_train, y_train)
+    fit_seconds = time.perf_counter() - start
+
+    return {
+        "rows": int(X.shape[0]),
+        "columns": int(X.shape[1]),
+        "matrix_mb": _matrix_mb(X),
+        "encode_seconds": encode_seconds,
+        "fit_seconds": fit_seconds,
+        "peak_rss_mb": _peak_rss_mb(),
+        "data_rss_mb": baseline_mb,
+    }
+
+
+def _estimate_dense_mb(n_rows, model, source):
+    """Rough size of the dense design matrix (plus get_dummies and the train copy) for n_rows."""
+    df = pd.read_csv(source or default_data_path())
+    variants = max(1, int(round(np.sqrt(n_rows / len(df)))))
+    n_columns = 3 + sum(df[name].nunique() for name in CATEGORICAL_COLUMNS) + df["model"].nunique() * (variants - 1)
+    itemsize = 8 if model == "lr" else 4
+    return n_rows * n_columns * (itemsize * 1.8 + 1) / 1e6
+
+
+def benchmark(sizes=DEFAULT_SIZES, models=MODELS, source=None, rf_trees=10, xgb_rounds=100, log=print):
+    """Run every (size, path, model) case in a child process and print a comparison table."""
+    source = os.path.abspath(source or default_data_path())
+    env = dict(os.environ)
+    root = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [root, env.get("PYTHONPATH")]))
+
+    results = []
+    for n_rows in sizes:
+        for model in models:
+            for path in PATHS:
+                entry = {"size": n_rows, "model": model, "path": path}
+                available = _available_mb()
+                needed = _estimate_dense_mb(n_rows, model, source)
+                if path == "dense" and available is not None and needed > 0.8 * available:
+                    entry["skipped"] = f"needs ~{needed / 1024:.1f} GB, {available / 1024:.1f} GB available"
+                else:
+                    command = [sys.executable, "-m", "src.training.sparse_benchmark", "--case",
+                               json.dumps([n_rows, path, model, source, rf_trees, xgb_rounds])]
+                    completed = subprocess.run(command, env=env, capture_output=True, text=True)
+                    if completed.returncode != 0:
+                        tail = (completed.stderr or "").strip().splitlines()[-1:] or [f"exit {completed.returncode}"]
+                        entry["skipped"] = f"failed: {tail[0]}"
+                    else:
+                        entry.update(json.loads(completed.stdout.strip().splitlines()[-1]))
+                results.append(entry)
+                log(format_row(entry))
+    return results
+
+
+def format_row(entry):
+    head = f"{entry['size']:>9,} {entry['model']:<4} {entry['path']:<6}"
+    if "skipped" in entry:
+        return f"{head} skipped ({entry['skipped']})"
+    return (f"{head} {entry['columns']:>6} {entry['matrix_mb']:10.1f} {entry['encode_seconds']:9.2f} "
+            f"{entry['fit_seconds']:9.2f} {entry['peak_rss_mb']:10.0f} {entry['peak_rss_mb'] - entry['data_rss_mb']:10.0f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Dense vs sparse training: memory and fit time on synthetic data")
+    parser.add_argument("--sizes", default=",".join(str(n) for n in DEFAULT_SIZES), help="row counts")
+    parser.add_argument("--models", default=",".join(MODELS), help="subset of lr,rf,xgb")
+    parser.add_argument("--rf-trees", type=int, default=10, help="trees per random forest")
+    parser.add_argument("--xgb-rounds", type=int, default=100, help="boosting rounds")
+    parser.add_argument("--data", help="cleaned.csv to resample")
+    parser.add_argument("--case", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.case:
+        print(json.dumps(_run_case(*json.loads(args.case))))
+    else:
+        print(f"{'rows':>9} {'model':<4} {'path':<6} {'cols':>6} {'matrix MB':>10} {'encode s':>9} "
+              f"{'fit s':>9} {'peak RSS MB':>10} {'+ over data':>10}")
+        benchmark(
+            sizes=[int(n) for n in args.sizes.split(",")],
+            models=[m for m in args.models.split(",") if m],
+            source=args.data,
+            rf_trees=args.rf_trees,
+            xgb_rounds=args.xgb_rounds,
+        )
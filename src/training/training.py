@@ -1,12 +1,20 @@
-from linear_regression import linear_regression_training
-from random_forest import random_forest_training
-from xgboost_train import xgboost_training
+import os
+import sys
 
+# Cho phép import src.* khi chạy file này trực tiếp
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
 
-def training_models():
-    lr = linear_regression_training()
-    rf = random_forest_training()
-    xgb = xgboost_training()
+from src.training.orchestrator import train_models
 
 
-training_models()
+def training_models(promote=True, cores=None):
+    # LR / RF / XGBoost / native categorical được train song song trong các process riêng
+    # (src/training/orchestrator.py), dùng chung ma trận đặc trưng, và chỉ được publish thành
+    # version mới khi tất cả thành công
+    version, report = train_models(promote=promote, cores=cores)
+    print(f"Đã publish model version {version}" + (" (current)" if promote else ""))
+    return version
+
+
+if __name__ == "__main__":
+    training_models()
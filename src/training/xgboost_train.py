@@ -1,56 +1,73 @@
 import pandas as pd
 import numpy as np
 from xgboost import XGBRegressor
-from sklearn.model_selection import train_test_split
 from sklearn.metrics import mean_absolute_error, mean_squared_error, r2_score
 import joblib
 import os
 
-def xgboost_training():
-    # Đọc dữ liệu
-    # df = pd.read_csv("../../data/preprocessing/cleaned.csv")
-    # Xác định đường dẫn tuyệt đối tới cleaned.csv
-    cleaned_path = os.path.abspath(os.path.join(os.getcwd(), "data", "preprocessing", "cleaned.csv"))
-
-    # Đọc file
-    df = pd.read_csv(cleaned_path)
-
-    # One-hot encoding các cột phân loại
-    df_encoded = pd.get_dummies(
-        df,
-        columns=[
-            "brand",
-            "model",
-            "fuel_type",
-            "transmission",
-            "origin",
-            "car_type",
-        ],
-    )
+# Chế độ train: 'full' = đủ 1000 vòng như trước; 'early-stopping' = tree_method='hist',
+# giữ lại một phần tập train làm validation và dừng khi RMSE validation không giảm nữa
+XGB_MODES = ("full", "early-stopping")
+# missing=0: XGBoost train thẳng trên ma trận CSR, nơi ô trống (one-hot = 0) được coi là
+# "missing"; với missing=0 input dense (có số 0) cũng được hiểu y hệt, nên model cho cùng
+# kết quả dù nhận CSR hay dense, kể cả bản biên dịch (compiled_trees) và bundle
+XGB_PARAMS = dict(n_estimators=1000, learning_rate=0.1, max_depth=6, random_state=42, missing=0.0)
+EARLY_STOPPING_ROUNDS = 50
+VALIDATION_FRACTION = 0.1
 
-    # Tách X và y
-    X = df_encoded.drop("price", axis=1)
-    y = df_encoded["price"]
 
-    # Chia train/test
-    X_train, X_test, y_train, y_test = train_test_split(
-        X, y, test_size=0.2, random_state=42
-    )
+def fit_xgboost(features, X, mode="full", n_jobs=-1, **params):
+    """
+    Fit XGBoost on the shared train rows of `features` (X: features.X dạng CSR hoặc bản dense).
+
+    Với 'early-stopping', model giữ best_iteration; predict() của XGBRegressor, bundle và
+    bản biên dịch (compile_xgboost) chỉ dùng các cây đến vòng đó.
+    """
+    if mode not in XGB_MODES:
+        raise ValueError(f"Unknown XGBoost training mode {mode!r}, expected one of {XGB_MODES}")
+    if mode == "early-stopping":
+        fit_idx, val_idx = features.validation_split(VALIDATION_FRACTION)
+        model = XGBRegressor(**dict(XGB_PARAMS, tree_method="hist", eval_metric="rmse",
+                                    early_stopping_rounds=EARLY_STOPPING_ROUNDS, n_jobs=n_jobs, **params))
+        model.fit(X[fit_idx], features.y[fit_idx], eval_set=[(X[val_idx], features.y[val_idx])], verbose=False)
+    else:
+        model = XGBRegressor(**dict(XGB_PARAMS, n_jobs=n_jobs, **params))
+        model.fit(X[features.train_idx], features.y[features.train_idx])
+    return model
+
+
+def xgboost_training(model_dir=None, features=None, n_jobs=-1, mode="full"):
+    # Ma trận đặc trưng dùng chung (đọc + one-hot cleaned.csv một lần, cache theo hash nội dung)
+    if features is None:
+        from src.features.feature_engineering import build_features
+        features = build_features()
+
+    # Train và đánh giá thẳng trên CSR (missing=0, xem XGB_PARAMS)
+    X = features.X
+    X_train, X_test, y_train, y_test = features.split(X)
 
     # Khởi tạo và train mô hình XGBoost
     print("--------------XGBoost------------------")
-    print("Bắt đầu training model XGBoost")
-    xgb_model = XGBRegressor(
-        n_estimators=1000, learning_rate=0.1, max_depth=6, random_state=42, n_jobs=-1
-    )
-    xgb_model.fit(X_train, y_train)
+    print(f"Bắt đầu training model XGBoost (mode={mode})")
+    xgb_model = fit_xgboost(features, X, mode=mode, n_jobs=n_jobs)
+    best_iteration = getattr(xgb_model, "best_iteration", None) if mode == "early-stopping" else None
+    if best_iteration is not None:
+        print(f"Early stopping: dùng {best_iteration + 1} / {xgb_model.get_booster().num_boosted_rounds()} cây")
     print("Training model XGBoost đã hoàn tất")
 
-    model_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'models'))
+    # model_dir: thư mục staging của một version mới (mặc định ghi thẳng vào src/models)
+    model_dir = model_dir or os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'models'))
     os.makedirs(model_dir, exist_ok=True)
     # Lưu model
     # joblib.dump(xgb_model, "../models/xgboost_model.pkl")
     joblib.dump(xgb_model, os.path.join(model_dir, "xgboost_model.pkl"))
+
+    # Ghi thêm model định dạng UBJSON gốc của XGBoost vào bundle
+    from src.models.model_bundle import write_xgboost
+    write_xgboost(
+        os.path.join(model_dir, "bundle"), features.columns, xgb_model,
+        pickles=[os.path.join(model_dir, "xgboost_model.pkl")],
+    )
     print("Đã lưu model XGBoost")
 
     # Dự đoán
@@ -77,4 +94,70 @@ def xgboost_training():
         "rmse": rmse,
         "r2": r2,
         "accuracy": accuracy,
+        "mode": mode,
+        "best_iteration": best_iteration,
+        "n_trees": best_iteration + 1 if best_iteration is not None else xgb_model.get_booster().num_boosted_rounds(),
     }
+
+
+def benchmark_modes(features, n_jobs=-1, n_latency=200):
+    """
+    Compare the training configurations on the shared split: fit time, model size,
+    predict latency (1 row and 1000 rows) and test MAE / RMSE.
+    """
+    import pickle
+    import time
+
+    X = features.X
+    X_test, y_test = X[features.test_idx], features.y[features.test_idx]
+    configs = [
+        # tree_method mặc định của xgboost < 2.0 với dữ liệu cỡ này
+        ("exact, 1000 rounds", "full", {"tree_method": "exact"}),
+        ("hist, 1000 rounds", "full", {"tree_method": "hist"}),
+        ("hist + early stopping", "early-stopping", {}),
+    ]
+    results = {}
+    for label, mode, params in configs:
+        start = time.perf_counter()
+        model = fit_xgboost(features, X, mode=mode, n_jobs=n_jobs, **params)
+        fit_seconds = time.perf_counter() - start
+
+        one_row = X_test[:1]
+        model.predict(one_row)
+        timings = []
+        for _ in range(n_latency):
+            start = time.perf_counter()
+            model.predict(one_row)
+            timings.append(time.perf_counter() - start)
+        start = time.perf_counter()
+        y_pred = model.predict(X_test[:1000])
+        batch_seconds = time.perf_counter() - start
+
+        y_pred = model.predict(X_test)
+        best_iteration = getattr(model, "best_iteration", None) if mode == "early-stopping" else None
+        results[label] = {
+            "fit_seconds": fit_seconds,
+            "trees": best_iteration + 1 if best_iteration is not None else model.get_booster().num_boosted_rounds(),
+            "size_mb": len(pickle.dumps(model)) / 1e6,
+            "predict_1_ms": float(np.median(timings)) * 1e3,
+            "predict_1000_ms": batch_seconds * 1e3,
+            "mae": mean_absolute_error(y_test, y_pred),
+            "rmse": float(np.sqrt(mean_squared_error(y_test, y_pred))),
+        }
+
+    print(f"XGBoost training modes ({len(features.train_idx)} train / {len(features.test_idx)} test rows)")
+    print(f"  {'config':<22} {'fit s':>7} {'trees':>6} {'size MB':>8} {'1 row ms':>9} {'1000 ms':>8} "
+          f"{'MAE':>14} {'RMSE':>14}")
+    for label, r in results.items():
+        print(f"  {label:<22} {r['fit_seconds']:7.2f} {r['trees']:6d} {r['size_mb']:8.2f} {r['predict_1_ms']:9.3f} "
+              f"{r['predict_1000_ms']:8.2f} {r['mae']:14,.0f} {r['rmse']:14,.0f}")
+    return results
+
+
+if __name__ == "__main__":
+    import sys
+
+    # Từ thư mục gốc project: python -m src.training.xgboost_train [path/to/cleaned.csv]
+    from src.features.feature_engineering import build_features
+
+    benchmark_modes(build_features(sys.argv[1] if len(sys.argv) > 1 else None))
@@ -0,0 +1,84 @@
+import contextlib
+import csv
+import io
+import json
+import os
+
+import pytest
+
+from app.utils.api_crawler import ApiChototXeCrawler, _serve_fixtures, ad_to_car, missing_fields
+from app.utils.http_pool import HttpPool
+
+FIXTURE_DIR = os.path.join(os.path.dirname(__file__), "fixtures")
+
+
+def _load_json(name):
+    with open(os.path.join(FIXTURE_DIR, name), encoding="utf-8") as f:
+        return json.load(f)
+
+
+@pytest.fixture(scope="module")
+def ads():
+    return _load_json("chotot_ad_listing.json")["ads"]
+
+
+@pytest.fixture(scope="module")
+def expected():
+    return {row["id"]: row for row in _load_json("chotot_ad_listing_expected.json")}
+
+
+def _csv_value(value):
+    # CSV đọc lại như preprocessor: ô trống là thiếu
+    return "" if value is None else str(value)
+
+
+def test_complete_ads_are_mapped_from_the_api_alone(ads, expected):
+    complete = 0
+    for ad in ads:
+        car = ad_to_car(ad, crawl_time="2025-01-01 00:00:00")
+        if missing_fields(car):
+            continue
+        complete += 1
+        assert {field: car.get(field) for field in expected[car["id"]]} == expected[car["id"]]
+    assert complete == 3
+
+
+def test_only_ads_missing_required_fields_need_the_detail_page(ads):
+    missing = {car["id"]: missing_fields(car) for car in (ad_to_car(ad) for ad in ads)}
+    assert missing == {
+        "125061589": [],
+        "125056816": [],
+        "124877986": [],
+        "124902474": ["brand", "model", "fuel_type", "transmission", "origin", "car_type"],
+        "125061671": ["seats"],
+    }
+
+
+def test_ad_without_list_id_is_skipped():
+    assert ad_to_car({"subject": "no id"}) is None
+
+
+def test_api_crawl_matches_expected_rows(tmp_path, monkeypatch, expected):
+    server = _serve_fixtures(FIXTURE_DIR)
+    host = f"http://127.0.0.1:{server.server_address[1]}"
+    monkeypatch.chdir(tmp_path)
+    try:
+        crawler = ApiChototXeCrawler(1, 2, concurrency=2, http=HttpPool(max_retries=1))
+        crawler.api_url = f"{host}/v1/public/ad-listing"
+        crawler.base_url = f"{host}/mua-ban-oto"
+        with contextlib.redirect_stdout(io.StringIO()):
+            crawler.crawl_pages()
+    finally:
+        server.shutdown()
+
+    with open(crawler.csv_path, encoding="utf-8-sig", newline="") as f:
+        rows = {row[0]: dict(zip(crawler.csv_writer.fieldnames, row)) for row in csv.reader(f)}
+
+    assert set(rows) == set(expected)
+    for car_id, want in expected.items():
+        assert {field: rows[car_id][field] for field in want} == \
+            {field: _csv_value(value) for field, value in want.items()}, car_id
+
+    # Chỉ 2 tin thiếu trường mới tải trang chi tiết; 125061671 không có trang (404) nên giữ dữ liệu API
+    assert (crawler.api_only, crawler.detail_needed, crawler.details_fetched) == (3, 2, 2)
+    assert rows["125061671"]["seats"] == ""
@@ -0,0 +1,55 @@
+import glob
+import os
+
+import pytest
+
+from app.utils.html_parser import DETAIL_FIELDS, PARSER_BACKENDS, _pad_page, get_parser
+
+FIXTURE_DIR = os.path.join(os.path.dirname(__file__), "fixtures")
+HTML_FIXTURES = sorted(os.path.basename(path) for path in glob.glob(os.path.join(FIXTURE_DIR, "*.html")))
+
+
+def _read(name):
+    with open(os.path.join(FIXTURE_DIR, name), encoding="utf-8") as f:
+        return f.read()
+
+
+@pytest.fixture(scope="module")
+def backends():
+    return {name: get_parser(name) for name in PARSER_BACKENDS}
+
+
+def test_fixtures_cover_listing_and_detail_pages():
+    assert "chotot_listing_page.html" in HTML_FIXTURES
+    assert len([name for name in HTML_FIXTURES if name.startswith("chotot_ad_detail_")]) >= 2
+
+
+@pytest.mark.parametrize("name", HTML_FIXTURES)
+@pytest.mark.parametrize("pad_kb", [0, 50])
+def test_backends_agree_on_every_fixture(backends, name, pad_kb):
+    html_content = _read(name)
+    if pad_kb:
+        # Trang thật có thêm nhiều markup không liên quan quanh dữ liệu
+        html_content = _pad_page(html_content, pad_kb)
+
+    lxml, bs4 = backends["lxml"], backends["bs4"]
+    assert lxml.listing_urls(html_content) == bs4.listing_urls(html_content)
+    assert lxml.car_details(html_content) == bs4.car_details(html_content)
+
+
+def test_listing_page_urls(backends):
+    urls = backends["lxml"].listing_urls(_read("chotot_listing_page.html"))
+    assert len(urls) == 20
+    assert len(set(urls)) == len(urls)
+    assert all(url.startswith("https://xe.chotot.com/mua-ban-oto-") and "#" not in url for url in urls)
+
+
+@pytest.mark.parametrize("name", [name for name in HTML_FIXTURES if name.startswith("chotot_ad_detail_")])
+def test_detail_page_fields(backends, name):
+    car = backends["lxml"].car_details(_read(name))
+    assert car.get("title")
+    assert isinstance(car.get("price"), int)
+    assert {"brand", "model", "year", "mileage", "seats"} <= set(car)
+    # Ngoài tiêu đề/giá/vị trí/thời gian đăng, mọi cột đều lấy từ bảng thông số (DETAIL_FIELDS)
+    spec_columns = {column for _, column, _ in DETAIL_FIELDS}
+    assert set(car) - {"title", "price", "location", "post_time"} <= spec_columns
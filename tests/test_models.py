@@ -0,0 +1,73 @@
+import numpy as np
+import pytest
+from scipy import sparse
+from sklearn.ensemble import RandomForestRegressor
+from xgboost import XGBRegressor
+
+from src.models.compiled_trees import CompiledTreeEnsemble, compile_random_forest, compile_xgboost
+
+
+def _design_matrix(n_rows=400, n_categories=30, seed=0):
+    """Synthetic rows shaped like the model input: year, mileage, seats + one-hot category columns."""
+    rng = np.random.default_rng(seed)
+    numeric = np.column_stack([
+        rng.integers(2005, 2025, n_rows),
+        rng.integers(0, 300_000, n_rows),
+        rng.choice([4, 5, 7, 16], n_rows),
+    ]).astype(np.float64)
+    one_hot = np.zeros((n_rows, n_categories))
+    one_hot[np.arange(n_rows), rng.integers(0, n_categories, n_rows)] = 1.0
+    X = np.hstack([numeric, one_hot])
+    y = (numeric[:, 0] - 2000) * 3e7 - numeric[:, 1] * 500 + one_hot @ rng.uniform(1e8, 2e9, n_categories)
+    return X, y
+
+
+@pytest.fixture(scope="module")
+def data():
+    X, y = _design_matrix()
+    X_test, _ = _design_matrix(n_rows=200, seed=1)
+    return X, y, X_test
+
+
+def test_random_forest_matches_predict_dense_and_csr(data):
+    X, y, X_test = data
+    model = RandomForestRegressor(n_estimators=20, max_depth=12, random_state=0).fit(X, y)
+    compiled = compile_random_forest(model)
+
+    assert isinstance(compiled, CompiledTreeEnsemble)
+    expected = model.predict(X_test)
+    np.testing.assert_allclose(compiled.predict(X_test), expected, rtol=1e-12)
+    np.testing.assert_allclose(compiled.predict(sparse.csr_matrix(X_test)), expected, rtol=1e-12)
+
+
+def test_xgboost_matches_predict_dense_and_csr(data):
+    X, y, X_test = data
+    model = XGBRegressor(n_estimators=30, max_depth=6, learning_rate=0.3, random_state=0).fit(X, y)
+    compiled = compile_xgboost(model)
+
+    # Model train dense (missing=NaN): ô 0 của CSR là giá trị 0, như input dense
+    expected = model.predict(X_test).astype(np.float64)
+    np.testing.assert_array_equal(compiled.predict(X_test), expected)
+    np.testing.assert_array_equal(compiled.predict(sparse.csr_matrix(X_test)), expected)
+
+
+def test_sparse_trained_xgboost_matches_predict_dense_and_csr(data):
+    X, y, X_test = data
+    model = XGBRegressor(n_estimators=30, max_depth=6, learning_rate=0.3, missing=0, random_state=0)
+    model.fit(sparse.csr_matrix(X), y)
+    compiled = compile_xgboost(model)
+
+    # missing=0: giá trị 0 đi theo nhánh mặc định của mỗi nút
+    X_csr = sparse.csr_matrix(X_test)
+    expected = model.predict(X_csr).astype(np.float64)
+    np.testing.assert_array_equal(compiled.predict(X_csr), expected)
+    np.testing.assert_array_equal(compiled.predict(X_test), expected)
+
+
+def test_compiled_ensemble_round_trips_through_save(tmp_path, data):
+    X, y, X_test = data
+    compiled = compile_random_forest(RandomForestRegressor(n_estimators=5, random_state=0).fit(X, y))
+    compiled.save(str(tmp_path), "rf")
+
+    loaded = CompiledTreeEnsemble.load(str(tmp_path), "rf")
+    np.testing.assert_array_equal(loaded.predict(X_test), compiled.predict(X_test))
@@ -0,0 +1,161 @@
+import csv
+import os
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.utils.crawler import ChototXeCrawler
+from app.utils.http_pool import HttpPool
+from app.utils.seen_index import CHANGED, NEW, UNCHANGED, SeenListingIndex, content_hash
+
+CAR = {
+    "id": "125061589", "title": "Mercedes Benz GLC 200 2022", "brand": "Mercedes Benz", "model": "GLC Class",
+    "year": 2022, "price": 1300000000, "mileage": 38000, "seats": 5,
+    "post_time": "Đăng 5 phút trước", "crawl_time": "2025-01-01 10:00:00",
+}
+
+
+@pytest.fixture
+def index(tmp_path):
+    index = SeenListingIndex(str(tmp_path / "seen_listings.db"), ttl_days=30)
+    yield index
+    index.close()
+
+
+@pytest.fixture
+def crawler(tmp_path, monkeypatch, index):
+    monkeypatch.chdir(tmp_path)
+    crawler = ChototXeCrawler(1, 3, http=HttpPool(), seen_index=index)
+    yield crawler
+    crawler.close()
+
+
+def test_fresh_within_ttl_and_stale_after(index):
+    now = datetime(2025, 3, 1, 12, 0, 0)
+    index.mark("1", "h1", crawled_at=now - timedelta(days=29))
+    index.mark("2", "h2", crawled_at=now - timedelta(days=31))
+
+    assert index.known(["1", "2", "3"]) == {"1", "2"}
+    assert index.fresh(["1", "2", "3"], now=now) == {"1"}
+    assert len(index) == 2
+
+
+def test_classify_new_changed_unchanged(index):
+    status, digest = index.classify(CAR)
+    assert status == NEW
+    index.mark(CAR["id"], digest)
+
+    # Thời điểm crawl và "Đăng x phút trước" không làm đổi hash
+    recrawled = dict(CAR, crawl_time="2025-02-01 08:00:00", post_time="Đăng 3 ngày trước")
+    assert index.classify(recrawled) == (UNCHANGED, digest)
+
+    status, new_digest = index.classify(dict(CAR, price=1250000000))
+    assert status == CHANGED
+    assert new_digest != digest
+
+
+def test_content_hash_compares_values_as_strings_and_ignores_empty():
+    # Dòng đọc lại từ CSV (chuỗi, ô trống) cho cùng hash với dòng vừa crawl
+    from_csv = {key: str(value) for key, value in CAR.items()}
+    from_csv["owners"] = ""
+    assert content_hash(from_csv) == content_hash(dict(CAR, owners=None))
+
+
+def test_seed_from_csv(tmp_path, index):
+    fieldnames = ["id", "title", "price", "post_time", "crawl_time"]
+    path = tmp_path / "raw.csv"
+    with open(path, "w", encoding="utf-8-sig", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["1", "Xe A", "100", "Đăng hôm qua", "2025-01-01 10:00:00"])
+        writer.writerow(["2", "Xe B", "200", "", "not a date"])
+        # Tin crawl lại sau đó: dòng mới hơn ghi đè
+        writer.writerow(["1", "Xe A", "90", "", "2025-01-15 10:00:00"])
+
+    assert index.seed_from_csv(str(path), fieldnames) == 3
+    assert index.known(["1", "2", "3"]) == {"1", "2"}
+    assert index.fresh(["1"], now=datetime(2025, 2, 10)) == {"1"}
+    status, _ = index.classify({"id": "1", "title": "Xe A", "price": 90, "crawl_time": "2025-03-01 00:00:00"})
+    assert status == UNCHANGED
+
+    # Chỉ seed khi index còn trống
+    assert index.seed_from_csv(str(path), fieldnames) == 0
+
+
+def test_seed_from_missing_csv(tmp_path, index):
+    assert index.seed_from_csv(str(tmp_path / "missing.csv"), ["id"]) == 0
+
+
+@pytest.mark.parametrize("url, expected", [
+    ("https://xe.chotot.com/mua-ban-oto-ha-noi-125061589.htm", "125061589"),
+    ("https://xe.chotot.com/mua-ban-oto-ha-noi-125061589.htm#px=SR-stickyad-[PO-1][PL-top]", "125061589"),
+    ("https://xe.chotot.com/mua-ban-oto/124902474.htm", "124902474"),
+    ("https://xe.chotot.com/mua-ban-oto", None),
+])
+def test_extract_car_id(tmp_path, monkeypatch, url, expected):
+    monkeypatch.chdir(tmp_path)
+    crawler = ChototXeCrawler(http=HttpPool())
+    try:
+        assert crawler.extract_car_id(url) == expected
+    finally:
+        crawler.close()
+
+
+def test_skip_fresh_urls(crawler, index):
+    base = "https://xe.chotot.com/mua-ban-oto-ha-noi"
+    index.mark("1", "h")
+    index.mark("2", "h", crawled_at=datetime.now() - timedelta(days=40))
+
+    urls, all_known = crawler.skip_fresh_urls([f"{base}-1.htm", f"{base}-2.htm", f"{base}-3.htm"])
+    # 1 còn mới: bỏ qua; 2 quá TTL: tải lại; 3 chưa biết
+    assert urls == [f"{base}-2.htm", f"{base}-3.htm"]
+    assert not all_known
+    assert crawler.skipped_known == 1
+
+    urls, all_known = crawler.skip_fresh_urls([f"{base}-1.htm", f"{base}-2.htm"])
+    assert urls == [f"{base}-2.htm"]
+    assert all_known
+
+    # URL không lấy được ID: luôn tải, và trang không được coi là toàn tin đã biết
+    urls, all_known = crawler.skip_fresh_urls([f"{base}-1.htm", "https://xe.chotot.com/mua-ban-oto"])
+    assert urls == ["https://xe.chotot.com/mua-ban-oto"]
+    assert not all_known
+
+
+def test_check_seen_without_index(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    crawler = ChototXeCrawler(http=HttpPool())
+    try:
+        assert crawler.check_seen(["1", "2"]) == (set(), False)
+        assert crawler.seen_before_write(CAR) == ""
+    finally:
+        crawler.close()
+
+
+def test_should_stop_after_consecutive_known_pages(crawler):
+    crawler.stop_after_known_pages = 2
+    assert not crawler.should_stop_after(True)
+    assert not crawler.should_stop_after(False)
+    assert not crawler.should_stop_after(True)
+    assert crawler.should_stop_after(True)
+
+    crawler.stop_after_known_pages = 0
+    crawler.known_pages = 0
+    assert not any(crawler.should_stop_after(True) for _ in range(3))
+
+
+def test_save_car_writes_new_and_changed_rows_only(crawler, index):
+    assert crawler.save_car_to_csv(dict(CAR))
+    assert index.known([CAR["id"]]) == {CAR["id"]}
+
+    # Crawl lại không đổi: không ghi thêm dòng, chỉ cập nhật last_crawled
+    assert not crawler.save_car_to_csv(dict(CAR, crawl_time="2025-02-01 08:00:00"))
+    assert crawler.unchanged == 1
+
+    # Giá đổi: ghi dòng mới
+    assert crawler.save_car_to_csv(dict(CAR, price=1250000000))
+    assert crawler.cars_count == 2
+
+    crawler.csv_file.flush()
+    with open(os.path.join("data", "raw", "raw.csv"), encoding="utf-8-sig", newline="") as f:
+        prices = [row[crawler.csv_writer.fieldnames.index("price")] for row in csv.reader(f)]
+    assert prices == ["1300000000", "1250000000"]